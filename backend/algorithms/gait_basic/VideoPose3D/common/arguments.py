@@ -73,6 +73,10 @@ def parse_args():
     parser.add_argument('--viz-limit', type=int, default=-1, metavar='N', help='only render first N frames')
     parser.add_argument('--viz-downsample', type=int, default=1, metavar='N', help='downsample FPS by a factor N')
     parser.add_argument('--viz-size', type=int, default=5, metavar='N', help='image size')
+    parser.add_argument('--chunk-size', type=int, default=0, metavar='N',
+                        help='predict at most N frames at a time when rendering (0 = whole sequence)')
+    parser.add_argument('--max-memory', type=int, default=0, metavar='MB',
+                        help='derive --chunk-size from a memory ceiling for the model activations')
     
     parser.set_defaults(bone_length_term=True)
     parser.set_defaults(data_augmentation=True)
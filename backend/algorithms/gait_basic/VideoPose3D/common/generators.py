@@ -238,4 +238,84 @@ class UnchunkedGenerator:
                 batch_2d[1, :, :, 0] *= -1
                 batch_2d[1, :, self.kps_left + self.kps_right] = batch_2d[1, :, self.kps_right + self.kps_left]
 
-            yield batch_cam, batch_3d, batch_2d
\ No newline at end of file
+            yield batch_cam, batch_3d, batch_2d
+
+class StreamingGenerator(UnchunkedGenerator):
+    """
+    Memory-bounded variant of UnchunkedGenerator, used for testing on long sequences.
+    Each sequence is padded once and then split into consecutive tiles of about `chunk_size`
+    output frames; every tile carries the 2*pad context frames it needs, so the model never
+    sees more than chunk_size + receptive_field - 1 frames at a time.
+    Concatenating the predictions of the tiles of a sequence along the time axis gives the
+    output of UnchunkedGenerator.
+    
+    Tiles are never shorter than `min_chunk_size` output frames (a short tail is merged into
+    the previous tile): very short inputs select different convolution kernels, which breaks
+    bit-for-bit equality with the unchunked output.
+    
+    Arguments: as UnchunkedGenerator, plus
+    chunk_size -- number of output frames per tile
+    min_chunk_size -- minimum number of output frames per tile (defaults to the receptive field)
+    """
+    
+    def __init__(self, cameras, poses_3d, poses_2d, chunk_size, pad=0, causal_shift=0,
+                 augment=False, kps_left=None, kps_right=None, joints_left=None, joints_right=None,
+                 min_chunk_size=None):
+        super().__init__(cameras, poses_3d, poses_2d, pad=pad, causal_shift=causal_shift,
+                         augment=augment, kps_left=kps_left, kps_right=kps_right,
+                         joints_left=joints_left, joints_right=joints_right)
+        if min_chunk_size is None:
+            min_chunk_size = 2*pad + 1
+        self.chunk_size = max(chunk_size, min_chunk_size, 1)
+        self.min_chunk_size = min_chunk_size
+        
+    def chunk_bounds(self, n_frames):
+        """
+        Return the list of (start, end) output frames of each tile of a sequence.
+        """
+        starts = list(range(0, n_frames, self.chunk_size))
+        if len(starts) > 1 and n_frames - starts[-1] < self.min_chunk_size:
+            starts.pop()
+        ends = starts[1:] + [n_frames]
+        return list(zip(starts, ends))
+    
+    def next_epoch(self):
+        for seq_cam, seq_3d, seq_2d in zip_longest(self.cameras, self.poses_3d, self.poses_2d):
+            padded_2d = np.pad(seq_2d,
+                               ((self.pad + self.causal_shift, self.pad - self.causal_shift), (0, 0), (0, 0)),
+                               'edge')
+            for start, end in self.chunk_bounds(seq_2d.shape[0]):
+                batch_cam = None if seq_cam is None else np.expand_dims(seq_cam, axis=0)
+                batch_3d = None if seq_3d is None else np.expand_dims(seq_3d[start:end], axis=0)
+                batch_2d = np.expand_dims(padded_2d[start:end + 2*self.pad], axis=0)
+                if self.augment:
+                    # Append flipped version
+                    if batch_cam is not None:
+                        batch_cam = np.concatenate((batch_cam, batch_cam), axis=0)
+                        batch_cam[1, 2] *= -1
+                        batch_cam[1, 7] *= -1
+                    
+                    if batch_3d is not None:
+                        batch_3d = np.concatenate((batch_3d, batch_3d), axis=0)
+                        batch_3d[1, :, :, 0] *= -1
+                        batch_3d[1, :, self.joints_left + self.joints_right] = batch_3d[1, :, self.joints_right + self.joints_left]
+
+                    batch_2d = np.concatenate((batch_2d, batch_2d), axis=0)
+                    batch_2d[1, :, :, 0] *= -1
+                    batch_2d[1, :, self.kps_left + self.kps_right] = batch_2d[1, :, self.kps_right + self.kps_left]
+
+                yield batch_cam, batch_3d, batch_2d
+
+
+def chunk_size_for_memory(max_memory, channels, receptive_field, augment=True, live_tensors=4.5):
+    """
+    Largest number of output frames per tile such that the activations of a TemporalModel
+    forward pass stay below `max_memory` bytes.
+    About `live_tensors` float32 activations of shape (batch, channels, frames) are alive at
+    the same time inside a residual block; batch is 2 with test-time augmentation.
+    The peak RSS of a forward pass on CPU (1024 channels, 2000 to 20000 frames) is measured
+    at 34-36 KB per frame with augmentation, i.e. 4.2-4.4 tensors; 4.5 leaves a margin.
+    """
+    batch_size = 2 if augment else 1
+    bytes_per_frame = live_tensors * batch_size * channels * 4
+    return max(int(max_memory // bytes_per_frame) - (receptive_field - 1), 1)
@@ -63,8 +63,9 @@ def get_resolution(filename):
         w, h = line.decode().strip().split(',')
         return int(w), int(h)
 
-def read_video(filename):
-    w, h = get_resolution(filename)
+def read_video(filename, resolution=None):
+    # resolution: (w, h) of the decoded frames when already known, to skip probing the video
+    w, h = resolution if resolution is not None else get_resolution(filename)
 
     command = ['ffmpeg',
             '-i', filename,
@@ -81,13 +82,74 @@ def read_video(filename):
         yield np.frombuffer(data, dtype='uint8').reshape((h, w, 3))
 
 
+def build_predictor(cfg_name, score_thresh=0.7):
+    cfg = get_cfg()
+    cfg.merge_from_file(model_zoo.get_config_file(cfg_name))
+    cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = score_thresh
+    cfg.MODEL.WEIGHTS = model_zoo.get_checkpoint_url(cfg_name)
+    return DefaultPredictor(cfg)
+
+
+def infer_video(predictor, video_name, resolution=None):
+    """Run the keypoint detector on every frame of a video.
+
+    Returns a dict with the same fields as the exported .npz
+    (boxes, segments, keypoints and metadata) in Detectron1 format.
+    """
+    boxes = []
+    segments = []
+    keypoints = []
+
+    for frame_i, im in enumerate(read_video(video_name, resolution=resolution)):
+        t = time.time()
+        outputs = predictor(im)['instances'].to('cpu')
+        
+        print('Frame {} processed in {:.3f}s'.format(frame_i, time.time() - t))
+
+        has_bbox = False
+        if outputs.has('pred_boxes'):
+            bbox_tensor = outputs.pred_boxes.tensor.numpy()
+            if len(bbox_tensor) > 0:
+                has_bbox = True
+                scores = outputs.scores.numpy()[:, None]
+                bbox_tensor = np.concatenate((bbox_tensor, scores), axis=1)
+        if has_bbox:
+            kps = outputs.pred_keypoints.numpy()
+            kps_xy = kps[:, :, :2]
+            kps_prob = kps[:, :, 2:3]
+            kps_logit = np.zeros_like(kps_prob) # Dummy
+            kps = np.concatenate((kps_xy, kps_logit, kps_prob), axis=2)
+            kps = kps.transpose(0, 2, 1)
+        else:
+            kps = []
+            bbox_tensor = []
+            
+        # Mimic Detectron1 format
+        cls_boxes = [[], bbox_tensor]
+        cls_keyps = [[], kps]
+        
+        boxes.append(cls_boxes)
+        segments.append(None)
+        keypoints.append(cls_keyps)
+
+    
+    # Video resolution
+    metadata = {
+        'w': im.shape[1],
+        'h': im.shape[0],
+    }
+
+    return {
+        'boxes': boxes,
+        'segments': segments,
+        'keypoints': keypoints,
+        'metadata': metadata,
+    }
+
+
 def main(args):
 
-    cfg = get_cfg()
-    cfg.merge_from_file(model_zoo.get_config_file(args.cfg))
-    cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = 0.7
-    cfg.MODEL.WEIGHTS = model_zoo.get_checkpoint_url(args.cfg)
-    predictor = DefaultPredictor(cfg)
+    predictor = build_predictor(args.cfg)
     
 
     if os.path.isdir(args.im_or_folder):
@@ -101,50 +163,7 @@ def main(args):
             )
         print('Processing {}'.format(video_name))
 
-        boxes = []
-        segments = []
-        keypoints = []
-
-        for frame_i, im in enumerate(read_video(video_name)):
-            t = time.time()
-            outputs = predictor(im)['instances'].to('cpu')
-            
-            print('Frame {} processed in {:.3f}s'.format(frame_i, time.time() - t))
-
-            has_bbox = False
-            if outputs.has('pred_boxes'):
-                bbox_tensor = outputs.pred_boxes.tensor.numpy()
-                if len(bbox_tensor) > 0:
-                    has_bbox = True
-                    scores = outputs.scores.numpy()[:, None]
-                    bbox_tensor = np.concatenate((bbox_tensor, scores), axis=1)
-            if has_bbox:
-                kps = outputs.pred_keypoints.numpy()
-                kps_xy = kps[:, :, :2]
-                kps_prob = kps[:, :, 2:3]
-                kps_logit = np.zeros_like(kps_prob) # Dummy
-                kps = np.concatenate((kps_xy, kps_logit, kps_prob), axis=2)
-                kps = kps.transpose(0, 2, 1)
-            else:
-                kps = []
-                bbox_tensor = []
-                
-            # Mimic Detectron1 format
-            cls_boxes = [[], bbox_tensor]
-            cls_keyps = [[], kps]
-            
-            boxes.append(cls_boxes)
-            segments.append(None)
-            keypoints.append(cls_keyps)
-
-        
-        # Video resolution
-        metadata = {
-            'w': im.shape[1],
-            'h': im.shape[0],
-        }
-        
-        np.savez_compressed(out_name, boxes=boxes, segments=segments, keypoints=keypoints, metadata=metadata)
+        np.savez_compressed(out_name, **infer_video(predictor, video_name))
 
 
 if __name__ == '__main__':
@@ -17,7 +17,7 @@ import torch.nn.functional as F
 import torch.optim as optim
 from common.arguments import parse_args
 from common.camera import *
-from common.generators import ChunkedGenerator, UnchunkedGenerator
+from common.generators import ChunkedGenerator, StreamingGenerator, UnchunkedGenerator, chunk_size_for_memory
 from common.loss import *
 from common.model import *
 from common.utils import deterministic_random
@@ -666,6 +666,7 @@ def evaluate(test_generator, action=None, return_predictions=False, use_trajecto
         else:
             model_traj.eval()
         N = 0
+        predictions = []
         for _, batch, batch_2d in test_generator.next_epoch():
             inputs_2d = torch.from_numpy(batch_2d.astype('float32'))
             if torch.cuda.is_available():
@@ -686,7 +687,8 @@ def evaluate(test_generator, action=None, return_predictions=False, use_trajecto
                 predicted_3d_pos = torch.mean(predicted_3d_pos, dim=0, keepdim=True)
                 
             if return_predictions:
-                return predicted_3d_pos.squeeze(0).cpu().numpy()
+                predictions.append(predicted_3d_pos.squeeze(0).cpu().numpy())
+                continue
                 
             inputs_3d = torch.from_numpy(batch.astype('float32'))
             if torch.cuda.is_available():
@@ -709,6 +711,10 @@ def evaluate(test_generator, action=None, return_predictions=False, use_trajecto
             # Compute velocity error
             epoch_loss_3d_vel += inputs_3d.shape[0]*inputs_3d.shape[1] * mean_velocity_error(predicted_3d_pos, inputs)
             
+    if return_predictions:
+        # Stitch the tiles of a StreamingGenerator (a single array for UnchunkedGenerator)
+        return np.concatenate(predictions, axis=0)
+
     if action is None:
         print('----------')
     else:
@@ -738,9 +744,18 @@ if args.render:
     if ground_truth is None:
         print('INFO: this action is unlabeled. Ground truth will not be rendered.')
         
-    gen = UnchunkedGenerator(None, None, [input_keypoints],
-                             pad=pad, causal_shift=causal_shift, augment=args.test_time_augmentation,
-                             kps_left=kps_left, kps_right=kps_right, joints_left=joints_left, joints_right=joints_right)
+    chunk_size = args.chunk_size
+    if args.max_memory > 0:
+        chunk_size = chunk_size_for_memory(args.max_memory * 2**20, args.channels, receptive_field,
+                                           augment=args.test_time_augmentation)
+    if chunk_size > 0:
+        gen = StreamingGenerator(None, None, [input_keypoints], chunk_size,
+                                 pad=pad, causal_shift=causal_shift, augment=args.test_time_augmentation,
+                                 kps_left=kps_left, kps_right=kps_right, joints_left=joints_left, joints_right=joints_right)
+    else:
+        gen = UnchunkedGenerator(None, None, [input_keypoints],
+                                 pad=pad, causal_shift=causal_shift, augment=args.test_time_augmentation,
+                                 kps_left=kps_left, kps_right=kps_right, joints_left=joints_left, joints_right=joints_right)
     prediction = evaluate(gen, return_predictions=True)
     if model_traj is not None and ground_truth is None:
         prediction_traj = evaluate(gen, return_predictions=True, use_trajectory_model=True)
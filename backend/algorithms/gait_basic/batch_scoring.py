@@ -0,0 +1,365 @@
+"""
+Score many trials with the turn-time and depth models in one process, without the Celery
+round-trip per request. The sliding windows of all trials are packed into shared mini-batches.
+
+Usage (from `backend/`):
+    python3 -m algorithms.gait_basic.batch_scoring --data-root /data --height 170 \
+        --output scores.jsonl
+
+Every `<data-root>/<request_uuid>/out/3d/<file_id>.mp4.npy` is scored; the depth model also
+needs `<data-root>/<request_uuid>/out/<file_id>-custom-dataset.npz` and a height, either from
+`--height` or from a `--meta-csv` with the columns request_uuid, file_id, height and
+(optionally) focal_length.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import typing as t
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from .depth_alg.dataset import InferenceTrialData
+from .depth_alg.inference import DEPTH_OUTPUT_SCALE, compute_gait_parameters, get_depth_model
+from .depth_alg.utils import summarize_gait_parameters
+from .gait_study_semi_turn_time.inference import (
+    DEFAULT_BATCH_SIZE, get_turn_time_model, postprocess_turn_predictions, signal_verifier,
+)
+from .gait_study_semi_turn_time.src.datasets import GaitTrialInstanceSimple
+from .utils.model_variants import FLOAT32, MODEL_VARIANTS
+
+
+DEFAULT_TURN_TIME_PRETRAINED_PATH = 'algorithms/gait_basic/gait_study_semi_turn_time/weights/semi_vanilla_v2/gait-turn-time.pth'  # noqa
+DEFAULT_DEPTH_PRETRAINED_PATH = 'algorithms/gait_basic/depth_alg/weights/gait-depth-weight.pth'
+DEFAULT_MODEL_FOCAL_LENGTH = 1392.0
+
+
+class Trial:
+    def __init__(
+        self,
+        trial_id: str,
+        keypoints_3d_path: str,
+        custom_dataset_path: t.Optional[str] = None,
+        height: t.Optional[float] = None,
+        focal_length: t.Optional[float] = None,
+    ):
+        self.trial_id = trial_id
+        self.keypoints_3d_path = keypoints_3d_path
+        self.custom_dataset_path = custom_dataset_path
+        self.height = height
+        self.focal_length = focal_length
+
+
+def iterate_packed_batches(
+    windows_list: t.List[np.ndarray],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> t.Iterator[np.ndarray]:
+    """
+    Yield float32 mini-batches of `batch_size` windows taken in order from all window arrays
+    (N_i, C, L); a batch can span several trials and only one batch is materialized at a time
+    """
+    parts = []
+    num_windows = 0
+    for windows in windows_list:
+        start = 0
+        while start < len(windows):
+            end = min(start + batch_size - num_windows, len(windows))
+            parts.append(windows[start:end])
+            num_windows += end - start
+            start = end
+            if num_windows == batch_size:
+                yield np.concatenate(parts).astype(np.float32)
+                parts = []
+                num_windows = 0
+    if num_windows > 0:
+        yield np.concatenate(parts).astype(np.float32)
+
+
+def predict_packed(
+    model: nn.Module,
+    windows_list: t.List[np.ndarray],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    device: str = 'cpu',
+) -> t.List[np.ndarray]:
+    """
+    Run the model over the windows of several trials and return the outputs of every trial
+    """
+    outs = []
+    with torch.no_grad():
+        for batch in iterate_packed_batches(windows_list, batch_size=batch_size):
+            outs.append(model(torch.from_numpy(batch).to(device)).cpu().numpy())
+    if not outs:
+        return [np.empty((0,)) for _ in windows_list]
+    out = np.concatenate(outs)
+    return np.split(out, np.cumsum([len(windows) for windows in windows_list])[:-1])
+
+
+def _record_error(
+    errors: t.Optional[t.Dict[str, str]],
+    trial: Trial,
+    error: Exception,
+) -> None:
+    if errors is None:
+        raise error
+    print(f'Trial {trial.trial_id} not scored: {error!r}', file=sys.stderr)
+    errors[trial.trial_id] = f'{type(error).__name__}: {error}'
+
+
+def score_turn_time(
+    trials: t.List[Trial],
+    turn_time_pretrained_path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    device: str = 'cpu',
+    variant: str = FLOAT32,
+    errors: t.Optional[t.Dict[str, str]] = None,
+) -> t.List[t.Tuple[float, t.Optional[np.ndarray]]]:
+    """
+    Return (turn time, post-processed turn mask) of every trial; (-1, None) if the 3D keypoints
+    contain NaN, as turn_time_simple_inference does. With `errors`, a trial that cannot be
+    scored also gets (-1, None) and its error is recorded by trial id instead of raised
+    """
+    model = get_turn_time_model(turn_time_pretrained_path, device=device, variant=variant)
+    results = [(-1, None)] * len(trials)
+    valid_indices = []
+    windows_list = []
+    for idx, trial in enumerate(trials):
+        try:
+            gait_instance = GaitTrialInstanceSimple(
+                trial_id='', path_to_npz=trial.keypoints_3d_path,
+            )
+            if signal_verifier(gait_instance.signals):
+                continue
+            windows = gait_instance.get_all_signal_windows()
+        except Exception as e:
+            _record_error(errors, trial, e)
+            continue
+        valid_indices.append(idx)
+        windows_list.append(windows)
+
+    logits_list = predict_packed(model, windows_list, batch_size=batch_size, device=device)
+    for idx, logits in zip(valid_indices, logits_list):
+        try:
+            results[idx] = postprocess_turn_predictions(np.argmax(logits, axis=1))
+        except Exception as e:
+            _record_error(errors, trials[idx], e)
+    return results
+
+
+def score_depth(
+    trials: t.List[Trial],
+    turn_time_masks: t.List[np.ndarray],
+    depth_pretrained_path: str,
+    model_focal_length: float = DEFAULT_MODEL_FOCAL_LENGTH,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    device: str = 'cpu',
+    variant: str = FLOAT32,
+    errors: t.Optional[t.Dict[str, str]] = None,
+) -> t.List[t.Optional[t.Tuple[t.Dict[str, float], t.List[t.Dict[str, t.Any]]]]]:
+    """
+    Return (final_output, gait_parameters) of every trial, as depth_simple_inference does. With
+    `errors`, a trial that cannot be scored gets None and its error is recorded by trial id
+    """
+    model = get_depth_model(depth_pretrained_path, device=device, variant=variant)
+    results = [None] * len(trials)
+    valid_indices = []
+    windows_list = []
+    for idx, trial in enumerate(trials):
+        try:
+            trial_data = InferenceTrialData(
+                detectron_2d_single_person_keypoints_path=trial.custom_dataset_path,
+                rendered_3d_single_person_keypoints_path=trial.keypoints_3d_path,
+                height=trial.height,
+                use_height=True,
+                signal_type='2d+3d',
+            )
+            windows = trial_data.get_all_signal_windows()
+        except Exception as e:
+            _record_error(errors, trial, e)
+            continue
+        valid_indices.append(idx)
+        windows_list.append(windows)
+
+    outs = predict_packed(model, windows_list, batch_size=batch_size, device=device)
+    for idx, out in zip(valid_indices, outs):
+        trial = trials[idx]
+        focal_length = trial.focal_length if trial.focal_length is not None else model_focal_length
+        try:
+            gait_parameters = compute_gait_parameters(
+                out * DEPTH_OUTPUT_SCALE,
+                np.asarray(turn_time_masks[idx], dtype=bool),
+                sl_adjust=focal_length / model_focal_length,
+            )
+            results[idx] = (summarize_gait_parameters(gait_parameters), gait_parameters)
+        except Exception as e:
+            _record_error(errors, trial, e)
+    return results
+
+
+def score_trials(
+    trials: t.List[Trial],
+    turn_time_pretrained_path: str = DEFAULT_TURN_TIME_PRETRAINED_PATH,
+    depth_pretrained_path: str = DEFAULT_DEPTH_PRETRAINED_PATH,
+    model_focal_length: float = DEFAULT_MODEL_FOCAL_LENGTH,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    device: str = 'cpu',
+    variant: str = FLOAT32,
+) -> t.List[t.Dict[str, t.Any]]:
+    """
+    Score the turn time of every trial and the gait parameters of the trials with a custom
+    dataset and a height. A trial without gait parameters gets an empty `final_output`, and a
+    trial that cannot be scored (e.g. 2D and 3D keypoints of different lengths) gets a
+    {'trial_id', 'error'} record without failing the others
+    """
+    errors = {}
+    turn_time_results = score_turn_time(
+        trials,
+        turn_time_pretrained_path,
+        batch_size=batch_size,
+        device=device,
+        variant=variant,
+        errors=errors,
+    )
+    depth_indices = [
+        idx for idx, (trial, (_, turn_time_mask)) in enumerate(zip(trials, turn_time_results))
+        if turn_time_mask is not None
+        and trial.trial_id not in errors
+        and trial.custom_dataset_path is not None
+        and trial.height is not None
+    ]
+    depth_results = score_depth(
+        [trials[idx] for idx in depth_indices],
+        [turn_time_results[idx][1] for idx in depth_indices],
+        depth_pretrained_path,
+        model_focal_length=model_focal_length,
+        batch_size=batch_size,
+        device=device,
+        variant=variant,
+        errors=errors,
+    )
+    depth_results = dict(zip(depth_indices, depth_results))
+
+    results = []
+    for idx, (trial, (turn_time, _)) in enumerate(zip(trials, turn_time_results)):
+        if trial.trial_id in errors:
+            results.append({'trial_id': trial.trial_id, 'error': errors[trial.trial_id]})
+            continue
+        final_output, gait_parameters = depth_results.get(idx, ({}, []))
+        results.append(
+            {
+                'trial_id': trial.trial_id,
+                'tt': float(turn_time),
+                'final_output': {k: float(v) for k, v in final_output.items()},
+                'gait_parameters': gait_parameters,
+            },
+        )
+    return results
+
+
+def find_trials(
+    data_root: str,
+    height: t.Optional[float] = None,
+    focal_length: t.Optional[float] = None,
+    meta: t.Optional[t.Dict[t.Tuple[str, str], t.Dict[str, str]]] = None,
+) -> t.List[Trial]:
+    trials = []
+    for keypoints_3d_path in sorted(glob.glob(os.path.join(data_root, '*', 'out', '3d', '*.mp4.npy'))):  # noqa
+        request_uuid = keypoints_3d_path.split(os.sep)[-4]
+        file_id = os.path.basename(keypoints_3d_path)[:-len('.mp4.npy')]
+        custom_dataset_path = os.path.join(
+            data_root, request_uuid, 'out', f'{file_id}-custom-dataset.npz',
+        )
+        trial_meta = (meta or {}).get((request_uuid, file_id), {})
+        trial_height = float(trial_meta['height']) if trial_meta.get('height') else height
+        trial_focal_length = (
+            float(trial_meta['focal_length']) if trial_meta.get('focal_length') else focal_length
+        )
+        trials.append(
+            Trial(
+                trial_id=f'{request_uuid}/{file_id}',
+                keypoints_3d_path=keypoints_3d_path,
+                custom_dataset_path=(
+                    custom_dataset_path if os.path.exists(custom_dataset_path) else None
+                ),
+                height=trial_height,
+                focal_length=trial_focal_length,
+            ),
+        )
+    return trials
+
+
+def load_meta_csv(meta_csv_path: str) -> t.Dict[t.Tuple[str, str], t.Dict[str, str]]:
+    with open(meta_csv_path, newline='') as f:
+        return {(row['request_uuid'], row['file_id']): row for row in csv.DictReader(f)}
+
+
+def _init_worker(num_threads: int) -> None:
+    torch.set_num_threads(num_threads)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-root', default='/data', type=str)
+    parser.add_argument('--turn-time-pretrained-path', default=DEFAULT_TURN_TIME_PRETRAINED_PATH, type=str)  # noqa
+    parser.add_argument('--depth-pretrained-path', default=DEFAULT_DEPTH_PRETRAINED_PATH, type=str)  # noqa
+    parser.add_argument('--model-focal-length', default=DEFAULT_MODEL_FOCAL_LENGTH, type=float)
+    parser.add_argument('--height', default=None, help='height in cm of every subject', type=float)  # noqa
+    parser.add_argument('--focal-length', default=None, help='camera focal length (defaults to the model focal length)', type=float)  # noqa
+    parser.add_argument('--meta-csv', default=None, help='per-trial height and focal_length', type=str)  # noqa
+    parser.add_argument('--batch-size', default=DEFAULT_BATCH_SIZE, type=int)
+    parser.add_argument('--variant', default=FLOAT32, choices=MODEL_VARIANTS, type=str)
+    parser.add_argument('--workers', default=os.cpu_count() or 1, type=int)
+    parser.add_argument('--trials-per-worker-task', default=8, type=int)
+    parser.add_argument('--output', default='-', help='output jsonl path (- for stdout)', type=str)  # noqa
+    args = parser.parse_args()
+
+    meta = load_meta_csv(args.meta_csv) if args.meta_csv is not None else None
+    trials = find_trials(
+        args.data_root, height=args.height, focal_length=args.focal_length, meta=meta,
+    )
+    print(f'{len(trials)} trials found in {args.data_root}', file=sys.stderr)
+
+    shards = [
+        trials[start: start + args.trials_per_worker_task]
+        for start in range(0, len(trials), args.trials_per_worker_task)
+    ]
+    kwargs = {
+        'turn_time_pretrained_path': args.turn_time_pretrained_path,
+        'depth_pretrained_path': args.depth_pretrained_path,
+        'model_focal_length': args.model_focal_length,
+        'batch_size': args.batch_size,
+        'variant': args.variant,
+    }
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        # every worker process loads the models once and keeps them in its model registry
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=_init_worker,
+            initargs=(max((os.cpu_count() or 1) // args.workers, 1),),
+        ) as executor:
+            futures = [executor.submit(score_trials, shard, **kwargs) for shard in shards]
+            for idx, (shard, future) in enumerate(zip(shards, futures)):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    # e.g. a worker killed out of memory; the other shards go on
+                    print(f'Shard {idx} failed: {e!r}', file=sys.stderr)
+                    error = f'{type(e).__name__}: {e}'
+                    results = [{'trial_id': trial.trial_id, 'error': error} for trial in shard]
+                for result in results:
+                    output.write(json.dumps(result) + '\n')
+                output.flush()
+                print(f'[{idx + 1} / {len(futures)}] shards scored', file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Micro-benchmark of the IoU matching: the former scalar `calculate_iou` loops against the
+vectorized `utils/matching.py`, at 10 and 50 people per frame.
+
+Usage (from `backend/`):
+    python3 -m algorithms.gait_basic.benchmarks.iou_matching --num-frames 3000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from algorithms.gait_basic.utils.matching import (
+    calculate_iou, match_target, match_targets, pack_frames, targets_to_array, xyxy_to_xywh,
+)
+
+
+def synthetic_frames(num_frames: int, num_people: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(num_frames):
+        left_top = rng.random((num_people, 2)) * 1000
+        width_height = rng.random((num_people, 2)) * 300 + 50
+        scores = rng.random((num_people, 1))
+        frames.append(
+            np.concatenate((left_top, left_top + width_height, scores), axis=1).astype(np.float32),
+        )
+    targets = [
+        tuple(int(x) for x in xyxy_to_xywh(frame[0]) + rng.integers(-20, 20, 4))
+        for frame in frames
+    ]
+    return frames, targets
+
+
+def scalar_match(frames, targets):
+    # the former per-candidate loops (utils/track.py, utils/make_video.py, decode)
+    best_matches = []
+    for frame, target in zip(frames, targets):
+        max_iou = 0
+        best_match = None
+        for idx, (left, top, right, bottom, _) in enumerate(frame):
+            iou = calculate_iou(target, (left, top, right - left, bottom - top))
+            if iou > max_iou:
+                max_iou = iou
+                best_match = idx
+        best_matches.append(-1 if max_iou < 0.5 or best_match is None else best_match)
+    return np.array(best_matches)
+
+
+def per_frame_match(frames, targets):
+    best_matches = []
+    for frame, target in zip(frames, targets):
+        best_match = match_target(target, xyxy_to_xywh(frame))
+        best_matches.append(-1 if best_match is None else best_match)
+    return np.array(best_matches)
+
+
+def batch_match(frames, targets):
+    detections, offsets = pack_frames(frames)
+    return match_targets(targets_to_array(targets), xyxy_to_xywh(detections), offsets)
+
+
+def timeit(fn, repeat: int):
+    elapsed = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed.append(time.perf_counter() - start)
+    return result, min(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-frames', default=3000, type=int)
+    parser.add_argument('--people-per-frame', default='10,50', type=str)
+    parser.add_argument('--repeat', default=3, type=int)
+    args = parser.parse_args()
+
+    for num_people in [int(x) for x in args.people_per_frame.split(',')]:
+        frames, targets = synthetic_frames(args.num_frames, num_people)
+        reference, reference_elapsed = timeit(lambda: scalar_match(frames, targets), args.repeat)
+        print(f'{num_people} people x {args.num_frames} frames')
+        print(f'  {"scalar loop":<16} {reference_elapsed:8.4f}s')
+        for name, fn in [('per frame', per_frame_match), ('all frames', batch_match)]:
+            best_matches, elapsed = timeit(lambda: fn(frames, targets), args.repeat)
+            mismatch = int((best_matches != reference).sum())
+            print(
+                f'  {name:<16} {elapsed:8.4f}s  speedup={reference_elapsed / elapsed:6.1f}x  '
+                f'mismatched frames={mismatch}',
+            )
+
+
+if __name__ == '__main__':
+    main()
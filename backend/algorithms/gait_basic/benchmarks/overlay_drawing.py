@@ -0,0 +1,98 @@
+"""
+Micro-benchmark of the overlays of the rendered videos: the former per-frame `draw_target` /
+`draw_skeleton` and `draw_frame_type` against the precomputed overlays of `utils/render.py`,
+in frames per second (decode and encode excluded).
+
+Usage (from `backend/`):
+    python3 -m algorithms.gait_basic.benchmarks.overlay_drawing --num-frames 900
+"""
+import argparse
+import time
+
+import numpy as np
+
+from algorithms.gait_basic.utils.render import (
+    RED, WHITE, SkeletonOverlay, TargetOverlay, draw_frame_type, draw_skeleton, draw_target,
+)
+
+
+def synthetic_trial(num_frames: int, size, seed: int = 0):
+    width, height = size
+    rng = np.random.default_rng(seed)
+    keypoints = []
+    bboxes = []
+    for _ in range(num_frames):
+        points = rng.random((17, 2)) * [width, height]
+        scores = rng.random((17, 1)) * 0.5 + 0.5
+        keypoints.append(np.concatenate((points, scores), axis=1))
+        left_top = points.min(axis=0).astype(int)
+        bboxes.append(tuple(left_top) + tuple(points.max(axis=0).astype(int) - left_top))
+    raw_tt = (np.arange(num_frames) // 60 % 2).tolist()
+    return keypoints, bboxes, raw_tt
+
+
+def draw_loop(size, num_frames, draw):
+    # drawn over each other, so that the last frame is the same only if every frame is
+    width, height = size
+    canvas = np.zeros((height, width, 3), dtype=np.uint8)
+    for frame_id in range(num_frames):
+        draw(canvas, frame_id)
+    return canvas
+
+
+def timeit(fn, repeat: int):
+    elapsed = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed.append(time.perf_counter() - start)
+    return result, min(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-frames', default=900, type=int)
+    parser.add_argument('--width', default=1080, type=int)
+    parser.add_argument('--height', default=1920, type=int)
+    parser.add_argument('--repeat', default=3, type=int)
+    args = parser.parse_args()
+
+    size = (args.width, args.height)
+    keypoints, bboxes, raw_tt = synthetic_trial(args.num_frames, size)
+
+    def former_target(frame, frame_id):
+        draw_target(frame, bboxes[frame_id], keypoints[frame_id], RED)
+        draw_frame_type(frame, raw_tt[frame_id] == 1)
+
+    def former_skeleton(frame, frame_id):
+        draw_skeleton(frame, keypoints[frame_id], WHITE)
+        draw_frame_type(frame, raw_tt[frame_id] == 1)
+
+    def overlay_target():
+        overlay = TargetOverlay(keypoints, bboxes, raw_tt)
+        return draw_loop(size, args.num_frames, lambda frame, idx: overlay.draw(frame, idx, RED))
+
+    def overlay_skeleton():
+        overlay = SkeletonOverlay(np.stack(keypoints)[:, :, :2], raw_tt, draw_keypoint=True)
+        return draw_loop(
+            size, args.num_frames, lambda frame, idx: overlay.draw(frame, idx, WHITE),
+        )
+
+    print(f'{args.num_frames} frames of {args.width}x{args.height}')
+    for name, former, overlay in [
+        ('target', lambda: draw_loop(size, args.num_frames, former_target), overlay_target),
+        ('skeleton', lambda: draw_loop(size, args.num_frames, former_skeleton), overlay_skeleton),
+    ]:
+        reference, reference_elapsed = timeit(former, args.repeat)
+        last_frame, elapsed = timeit(overlay, args.repeat)
+        print(
+            f'  {name:<10} former={args.num_frames / reference_elapsed:8.0f} fps  '
+            f'overlay={args.num_frames / elapsed:8.0f} fps  '
+            f'speedup={reference_elapsed / elapsed:5.1f}x  '
+            f'same last frame={np.array_equal(reference, last_frame)}',
+        )
+
+
+if __name__ == '__main__':
+    main()
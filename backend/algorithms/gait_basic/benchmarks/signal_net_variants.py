@@ -0,0 +1,130 @@
+"""
+Accuracy / latency report of the SignalNet variants (float32, torchscript, int8) on one trial:
+turn time, turn mask agreement and the summarized gait parameters are compared with float32.
+
+Usage (from `backend/`):
+    python3 -m algorithms.gait_basic.benchmarks.signal_net_variants \
+        --turn-time-pretrained-path <path to gait-turn-time.pth> \
+        --depth-pretrained-path <path to gait-depth-weight.pth> \
+        --keypoints-3d-path /data/<request_uuid>/out/3d/<file_id>.mp4.npy \
+        --custom-dataset-path /data/<request_uuid>/out/<file_id>-custom-dataset.npz \
+        --height 170
+
+Without the trial paths a synthetic trial of `--num-frames` frames is used and without the
+pretrained paths the models keep their random initialization.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from algorithms.gait_basic.depth_alg.inference import turn_time_depth_inference
+from algorithms.gait_basic.depth_alg.model import SignalNet as DepthSignalNet
+from algorithms.gait_basic.gait_study_semi_turn_time.src.models import SignalNet
+from algorithms.gait_basic.utils.model_variants import FLOAT32, MODEL_VARIANTS
+
+
+METRICS = ['sl', 'sw', 'st', 'v', 'c']
+
+
+def save_synthetic_trial(folder: str, num_frames: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    keypoints_3d_path = os.path.join(folder, 'synthetic.mp4.npy')
+    custom_dataset_path = os.path.join(folder, 'synthetic-custom-dataset.npz')
+    np.save(keypoints_3d_path, rng.normal(size=(num_frames, 17, 3)).astype('float32'))
+    keypoints_2d = (rng.random((num_frames, 17, 2)) * [1080, 1920]).astype('float32')
+    np.savez_compressed(
+        custom_dataset_path,
+        positions_2d={'synthetic.mp4': {'custom': [keypoints_2d]}},
+    )
+    return keypoints_3d_path, custom_dataset_path
+
+
+def save_random_weights(folder: str):
+    torch.manual_seed(0)
+    turn_time_pretrained_path = os.path.join(folder, 'gait-turn-time.pth')
+    depth_pretrained_path = os.path.join(folder, 'gait-depth-weight.pth')
+    torch.save(SignalNet(num_of_class=2).state_dict(), turn_time_pretrained_path)
+    torch.save(DepthSignalNet(in_channels=86, num_of_class=6).state_dict(), depth_pretrained_path)
+    return turn_time_pretrained_path, depth_pretrained_path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turn-time-pretrained-path', default=None, type=str)
+    parser.add_argument('--depth-pretrained-path', default=None, type=str)
+    parser.add_argument('--keypoints-3d-path', default=None, type=str)
+    parser.add_argument('--custom-dataset-path', default=None, type=str)
+    parser.add_argument('--height', default=170, type=float)
+    parser.add_argument('--num-frames', default=3000, type=int)
+    parser.add_argument('--variants', default=','.join(MODEL_VARIANTS), type=str)
+    parser.add_argument('--repeat', default=3, type=int)
+    args = parser.parse_args()
+
+    variants = args.variants.split(',')
+    if FLOAT32 not in variants:
+        variants = [FLOAT32] + variants
+
+    with tempfile.TemporaryDirectory() as folder:
+        if args.turn_time_pretrained_path is None or args.depth_pretrained_path is None:
+            turn_time_pretrained_path, depth_pretrained_path = save_random_weights(folder)
+        else:
+            turn_time_pretrained_path = args.turn_time_pretrained_path
+            depth_pretrained_path = args.depth_pretrained_path
+        if args.keypoints_3d_path is None or args.custom_dataset_path is None:
+            keypoints_3d_path, custom_dataset_path = save_synthetic_trial(folder, args.num_frames)
+        else:
+            keypoints_3d_path = args.keypoints_3d_path
+            custom_dataset_path = args.custom_dataset_path
+
+        def run(variant):
+            return turn_time_depth_inference(
+                detectron_2d_single_person_keypoints_path=custom_dataset_path,
+                rendered_3d_single_person_keypoints_path=keypoints_3d_path,
+                height=args.height,
+                model_focal_length=1392.0,
+                used_camera_focal_length=1392.0,
+                turn_time_pretrained_path=turn_time_pretrained_path,
+                depth_pretrained_path=depth_pretrained_path,
+                variant=variant,
+            )
+
+        results = {}
+        for variant in variants:
+            start = time.perf_counter()
+            run(variant)  # the first call also loads (or builds) the variant
+            load_seconds = time.perf_counter() - start
+            elapsed = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = run(variant)
+                elapsed.append(time.perf_counter() - start)
+            results[variant] = (result, load_seconds, min(elapsed))
+
+    print(f'frames: {len(results[FLOAT32][0][1])}, threads: {torch.get_num_threads()}')
+    reference, _, reference_elapsed = results[FLOAT32]
+    reference_tt, reference_mask, reference_final_output, _ = reference
+    for variant, (result, load_seconds, elapsed) in results.items():
+        tt, mask, final_output, gait_parameters = result
+        mismatch = int((np.array(mask) != np.array(reference_mask)).sum())
+        print(
+            f'{variant:<12} {elapsed:8.3f}s  speedup={reference_elapsed / elapsed:5.2f}x  '
+            f'first call={load_seconds:6.3f}s',
+        )
+        print(
+            f'{"":<12} turn time={tt:.3f}s (diff {abs(tt - reference_tt):.3f}s)  '
+            f'mismatched frames={mismatch}  strides={len(gait_parameters)}',
+        )
+        print(
+            f'{"":<12} ' + '  '.join(
+                f'{k}={final_output[k]:.3f} (diff {abs(final_output[k] - reference_final_output[k]):.3f})'  # noqa
+                for k in METRICS
+            ),
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Compare the batched turn-time inference with the former per-frame loop.
+
+Usage (from `backend/`):
+    python3 -m algorithms.gait_basic.benchmarks.turn_time_inference \
+        --pretrained-path <path to gait-turn-time.pth> \
+        --npz-file-path /data/<request_uuid>/out/3d/<file_id>.mp4.npy
+
+Without `--npz-file-path` a synthetic trial of `--num-frames` frames is used and without
+`--pretrained-path` the model keeps its random initialization.
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from algorithms.gait_basic.gait_study_semi_turn_time.inference import (
+    postprocess_turn_predictions, predict_signal_windows,
+)
+from algorithms.gait_basic.gait_study_semi_turn_time.src.datasets import (
+    GaitTrialInstance, GaitTrialInstanceSimple,
+)
+from algorithms.gait_basic.gait_study_semi_turn_time.src.models import SignalNet
+
+
+class SyntheticGaitTrialInstance(GaitTrialInstance):
+    def __init__(self, num_frames: int, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.signals = rng.normal(size=(num_frames, 51))  # L, C
+        self.signal_length = self.signals.shape[0]
+
+
+def per_frame_predict(model, gait_instance) -> np.ndarray:
+    # the former implementation: one forward pass per frame
+    preds = []
+    with torch.no_grad():
+        for signal in gait_instance.generate_all_signal_segments_without_answer():
+            signal = torch.FloatTensor(signal[None, :, :])
+            logit = model(signal)
+            pred = torch.argmax(logit, dim=1)
+            preds += list(pred.numpy())
+    return np.array(preds)
+
+
+def timeit(fn, repeat: int):
+    elapsed = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed.append(time.perf_counter() - start)
+    return result, min(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pretrained-path', default=None, type=str)
+    parser.add_argument('--npz-file-path', default=None, type=str)
+    parser.add_argument('--num-frames', default=3000, type=int)
+    parser.add_argument('--batch-sizes', default='64,256,1024', type=str)
+    parser.add_argument('--repeat', default=3, type=int)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = SignalNet(num_of_class=2)
+    if args.pretrained_path is not None:
+        model.load_state_dict(torch.load(args.pretrained_path))
+    model.eval()
+
+    if args.npz_file_path is not None:
+        gait_instance = GaitTrialInstanceSimple(trial_id='', path_to_npz=args.npz_file_path)
+    else:
+        gait_instance = SyntheticGaitTrialInstance(args.num_frames)
+
+    print(f'frames: {gait_instance.signal_length}, threads: {torch.get_num_threads()}')
+
+    reference_preds, reference_elapsed = timeit(
+        lambda: per_frame_predict(model, gait_instance),
+        args.repeat,
+    )
+    reference_tt, _ = postprocess_turn_predictions(reference_preds)
+    print(f'{"per-frame":<16} {reference_elapsed:8.3f}s  turn time={reference_tt:.3f}s')
+
+    for batch_size in [int(x) for x in args.batch_sizes.split(',')]:
+        preds, elapsed = timeit(
+            lambda: predict_signal_windows(
+                model,
+                gait_instance.get_all_signal_windows(),
+                batch_size=batch_size,
+            ),
+            args.repeat,
+        )
+        tt, _ = postprocess_turn_predictions(preds)
+        mismatch = int((preds != reference_preds).sum())
+        print(
+            f'{f"batch={batch_size}":<16} {elapsed:8.3f}s  turn time={tt:.3f}s  '
+            f'speedup={reference_elapsed / elapsed:6.1f}x  mismatched frames={mismatch}',
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,13 @@
 import typing as t
-from functools import lru_cache
 
 import numpy as np
 import torch
 import torch.nn as nn
 
 
+DEFAULT_BATCH_SIZE = 256
+
+
 class InferenceTrialData:
 
     signal_types = {'2d', '3d', '2d+3d'}
@@ -25,6 +27,7 @@ class InferenceTrialData:
         self.signal_size = signal_size
         self.height = height
         self.use_height = use_height
+        self._pad_signal_cache = {}
 
         self.detectron_2d_single_person_keypoints_path = detectron_2d_single_person_keypoints_path
         self.rendered_3d_single_person_keypoints_path = rendered_3d_single_person_keypoints_path
@@ -63,9 +66,14 @@ class InferenceTrialData:
 
         self.signal_length = self.signals.shape[0]
 
-    @lru_cache(maxsize=None)
     def pad_signal(self, pad_size):
-        return np.pad(self.signals, ((pad_size, pad_size), (0, 0)), mode='constant')
+        # cached on the instance (not with lru_cache on the method, which keeps every
+        # instance alive), so the padded signal is freed together with the trial
+        if pad_size not in self._pad_signal_cache:
+            self._pad_signal_cache[pad_size] = np.pad(
+                self.signals, ((pad_size, pad_size), (0, 0)), mode='constant',
+            )
+        return self._pad_signal_cache[pad_size]
 
     def crop_signal_from_one_point(self, timestamp: int):
         # signal_size must be odd
@@ -78,20 +86,28 @@ class InferenceTrialData:
         for i in range(self.signal_length):
             yield self.crop_signal_from_one_point(i)
 
+    def get_all_signal_windows(self) -> np.ndarray:
+        # zero-copy strided view over the padded signal; window i equals
+        # crop_signal_from_one_point(i) and the whole view is T, C, L
+        half_size = self.signal_size // 2
+        pad_signal = self.pad_signal(half_size)
+        return np.lib.stride_tricks.sliding_window_view(pad_signal, self.signal_size, axis=0)
+
 
 def inference_one_trial(
     trial_data: InferenceTrialData,
     model: nn.Module,
     device: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
 ):
-    signals = []
-    for signal in trial_data.generate_all_signal_segments_without_answer():
-        signals.append(signal)
-    signals = np.stack(signals)
-    signals = torch.FloatTensor(signals)
-    signals = signals.to(device)
+    windows = trial_data.get_all_signal_windows()  # T, C, L
     model.eval()
+    outs = []
     with torch.no_grad():
-        out = model(signals)
-    out = out.cpu().numpy()
-    return out
+        for start in range(0, len(windows), batch_size):
+            # only one batch of windows is materialized at a time
+            batch = torch.from_numpy(
+                np.ascontiguousarray(windows[start: start + batch_size], dtype=np.float32),
+            )
+            outs.append(model(batch.to(device)).cpu().numpy())
+    return np.concatenate(outs, axis=0)
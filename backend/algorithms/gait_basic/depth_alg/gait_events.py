@@ -0,0 +1,116 @@
+"""
+NumPy versions of the gait-event post-processing in `utils.py`.
+
+Indices are passed around as int64 arrays and intervals as [K, 2] arrays; the results are the
+same as the list-based functions in `utils.py`.
+"""
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+
+
+FPS = 30
+
+
+def compute_first_idx_in_positive_intervals(arr: npt.ArrayLike) -> npt.NDArray[np.int64]:
+    positive = np.asarray(arr) > 0
+    # rising edges: positive frames whose previous frame is not positive
+    rising = positive.copy()
+    rising[1:] &= ~positive[:-1]
+    return np.flatnonzero(rising)
+
+
+def filter_indices(
+    original_indices: npt.ArrayLike,
+    turn_mask: npt.NDArray[bool],
+) -> npt.NDArray[np.int64]:
+    indices = np.asarray(original_indices, dtype=np.int64)
+    return indices[~np.asarray(turn_mask, dtype=bool)[indices]]
+
+
+def find_true_index_pair(arr: npt.NDArray[bool]) -> t.Tuple[t.Optional[int], t.Optional[int]]:
+    true_indices = np.flatnonzero(arr)
+    if true_indices.size == 0:
+        return (None, None)
+    return (int(true_indices[0]), int(true_indices[-1]))
+
+
+def split_indices(
+    original_indices: npt.ArrayLike,
+    before_criteria: int,
+    after_criteria: int,
+) -> t.Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    indices = np.asarray(original_indices, dtype=np.int64)
+    return indices[indices < before_criteria], indices[indices > after_criteria]
+
+
+def filter_indices_by_depth(
+    indices: npt.ArrayLike,
+    depth: npt.NDArray,
+    depth_min: float,
+) -> npt.NDArray[np.int64]:
+    indices = np.asarray(indices, dtype=np.int64)
+    # written as ~(< depth_min) so that NaN depths are kept, as in utils.py
+    return indices[~(np.asarray(depth)[indices] < depth_min)]
+
+
+def indices_to_intervals(indices: npt.ArrayLike) -> npt.NDArray[np.int64]:
+    """
+    Pair consecutive indices into [start, end] intervals and drop the ones whose length is
+    not within 70% - 130% of the median length
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    intervals = np.stack((indices[:-1], indices[1:]), axis=1).reshape(-1, 2)
+    if len(intervals) == 0:
+        return intervals
+    intervals_diff = intervals[:, 1] - intervals[:, 0]
+    interval_median = np.median(intervals_diff)
+    keep = ~(intervals_diff < interval_median * 0.7) & ~(intervals_diff > interval_median * 1.3)
+    return intervals[keep]
+
+
+def compute_stride_width(signals: npt.NDArray) -> npt.NDArray:
+    return np.abs(signals[:, 1] - signals[:, 4]) / 10  # cm
+
+
+def get_gait_parameter(
+    intervals: npt.ArrayLike,
+    signals: npt.NDArray,
+    leg: str = 'left',
+    sl_adjust: float = 1.0,
+    stride_width: t.Optional[npt.NDArray] = None,
+) -> t.List[t.Dict[str, t.Any]]:
+    """
+    Compute the gait parameters of every interval; `stride_width` can be precomputed with
+    `compute_stride_width(signals)` and shared between both legs.
+    The values are Python scalars so that the result is JSON serializable
+    """
+    idx = 2 if leg == 'left' else 5
+    if stride_width is None:
+        stride_width = compute_stride_width(signals)
+    intervals = np.asarray(intervals, dtype=np.int64).reshape(-1, 2)
+    starts, ends = intervals[:, 0], intervals[:, 1]
+
+    sl = np.abs(signals[ends, idx] - signals[starts, idx]) / 10 * sl_adjust  # cm
+    sw = stride_width[starts]  # cm
+    st = (ends - starts) / FPS  # s
+    v = sl / 100 / st  # m/s
+    c = 1 / st * 60  # 1/s
+
+    return [
+        {
+            'start': start,
+            'end': end,
+            'leg': leg,
+            'sl': _sl,
+            'sw': _sw,
+            'st': _st,
+            'v': _v,
+            'c': _c,
+        }
+        for start, end, _sl, _sw, _st, _v, _c in zip(
+            starts.tolist(), ends.tolist(),
+            sl.tolist(), sw.tolist(), st.tolist(), v.tolist(), c.tolist(),
+        )
+    ]
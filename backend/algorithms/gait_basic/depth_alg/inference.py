@@ -1,47 +1,76 @@
+import functools
 import pickle
 import typing as t
 
 import numpy as np
 import torch
+import torch.nn as nn
 
-from .dataset import InferenceTrialData, inference_one_trial
-from .model import SignalNet
-from .utils import (
-    compute_first_idx_in_positive_intervals, filter_indices,
+from ..gait_study_semi_turn_time.inference import (
+    get_turn_time_model, postprocess_turn_predictions, signal_verifier,
+)
+from ..utils.model_registry import model_registry
+from ..utils.model_variants import FLOAT32, get_variant_name, load_model_variant
+from .dataset import DEFAULT_BATCH_SIZE, InferenceTrialData, inference_one_trial
+from .gait_events import (
+    compute_first_idx_in_positive_intervals, compute_stride_width, filter_indices,
     filter_indices_by_depth, find_true_index_pair, get_gait_parameter,
-    indices_to_intervals, split_indices, summarize_gait_parameters,
+    indices_to_intervals, split_indices,
 )
+from .model import SignalNet
+from .utils import summarize_gait_parameters
 
 
-def depth_simple_inference(
-    detectron_2d_single_person_keypoints_path: str,
-    rendered_3d_single_person_keypoints_path: str,
-    height: float,
-    model_focal_length: float,
-    used_camera_focal_length: float,
-    depth_pretrained_path: str,
-    turn_time_mask_path: str,
-    device: str = 'cpu',
-) -> t.Tuple[t.Dict[str, float], t.List[t.Dict[str, t.Any]]]:
+# the model predicts the depth signals divided by these factors
+DEPTH_OUTPUT_SCALE = np.array([1000, 500, 10000, 1000, 500, 10000])
+# the 3D keypoints (the turn-time model input) in the 2D (34) + 3D (51) + height (1) signals
+TURN_TIME_CHANNELS = slice(34, 85)
+DEPTH_INPUT_SHAPE = (1, 86, 129)
+
+
+def build_depth_model(depth_pretrained_path: str) -> nn.Module:
     model = SignalNet(in_channels=86, num_of_class=6)
     model.load_state_dict(torch.load(depth_pretrained_path))
-    model.to(device)
     model.eval()
+    return model
 
-    trial_data = InferenceTrialData(
-        detectron_2d_single_person_keypoints_path=detectron_2d_single_person_keypoints_path,
-        rendered_3d_single_person_keypoints_path=rendered_3d_single_person_keypoints_path,
-        height=height,
-        use_height=True,
-        signal_type='2d+3d',
+
+def load_depth_model(
+    depth_pretrained_path: str,
+    device: str = 'cpu',
+    variant: str = FLOAT32,
+) -> nn.Module:
+    return load_model_variant(
+        depth_pretrained_path,
+        build_depth_model,
+        DEPTH_INPUT_SHAPE,
+        device=device,
+        variant=variant,
     )
 
-    out = inference_one_trial(trial_data, model, device)
-    out_re = out * np.array([1000, 500, 10000, 1000, 500, 10000])
 
-    with open(turn_time_mask_path, 'rb') as f:
-        turn_time_mask = np.array(pickle.load(f), dtype=bool)
+def get_depth_model(
+    depth_pretrained_path: str,
+    device: str = 'cpu',
+    variant: str = FLOAT32,
+) -> nn.Module:
+    return model_registry.get(
+        get_variant_name('depth', variant),
+        depth_pretrained_path,
+        functools.partial(load_depth_model, variant=variant),
+        device=device,
+    )
 
+
+def compute_gait_parameters(
+    out_re: np.ndarray,
+    turn_time_mask: np.ndarray,
+    sl_adjust: float = 1.0,
+) -> t.List[t.Dict[str, t.Any]]:
+    """
+    Detect the steps in the rescaled depth model output [T, 6] outside of the turn and
+    compute the gait parameters of every step
+    """
     positive_max_indices = compute_first_idx_in_positive_intervals(
         out_re[:, 2] - out_re[:, 5],
     )  # right
@@ -86,21 +115,112 @@ def depth_simple_inference(
         depth_min=1500,
     )
 
-    right_intervals = indices_to_intervals(right_forward_indices) + indices_to_intervals(right_backward_indices)  # noqa
-    left_intervals = indices_to_intervals(left_forward_indices) + indices_to_intervals(left_backward_indices)  # noqa
+    right_intervals = np.concatenate((
+        indices_to_intervals(right_forward_indices), indices_to_intervals(right_backward_indices),
+    ))
+    left_intervals = np.concatenate((
+        indices_to_intervals(left_forward_indices), indices_to_intervals(left_backward_indices),
+    ))
+    stride_width = compute_stride_width(out_re)
 
-    sl_adjust = used_camera_focal_length / model_focal_length
-    gait_parameters = get_gait_parameter(
+    return get_gait_parameter(
         right_intervals,
         out_re,
         leg='right',
         sl_adjust=sl_adjust,
+        stride_width=stride_width,
     ) + get_gait_parameter(
         left_intervals,
         out_re,
         leg='left',
         sl_adjust=sl_adjust,
+        stride_width=stride_width,
+    )
+
+
+def depth_simple_inference(
+    detectron_2d_single_person_keypoints_path: str,
+    rendered_3d_single_person_keypoints_path: str,
+    height: float,
+    model_focal_length: float,
+    used_camera_focal_length: float,
+    depth_pretrained_path: str,
+    turn_time_mask_path: str,
+    device: str = 'cpu',
+    variant: str = FLOAT32,
+) -> t.Tuple[t.Dict[str, float], t.List[t.Dict[str, t.Any]]]:
+    model = get_depth_model(depth_pretrained_path, device=device, variant=variant)
+
+    trial_data = InferenceTrialData(
+        detectron_2d_single_person_keypoints_path=detectron_2d_single_person_keypoints_path,
+        rendered_3d_single_person_keypoints_path=rendered_3d_single_person_keypoints_path,
+        height=height,
+        use_height=True,
+        signal_type='2d+3d',
     )
+
+    out = inference_one_trial(trial_data, model, device)
+    out_re = out * DEPTH_OUTPUT_SCALE
+
+    with open(turn_time_mask_path, 'rb') as f:
+        turn_time_mask = np.array(pickle.load(f), dtype=bool)
+
+    sl_adjust = used_camera_focal_length / model_focal_length
+    gait_parameters = compute_gait_parameters(out_re, turn_time_mask, sl_adjust=sl_adjust)
     final_output = summarize_gait_parameters(gait_parameters)
 
     return final_output, gait_parameters
+
+
+def turn_time_depth_inference(
+    detectron_2d_single_person_keypoints_path: str,
+    rendered_3d_single_person_keypoints_path: str,
+    height: float,
+    model_focal_length: float,
+    used_camera_focal_length: float,
+    turn_time_pretrained_path: str,
+    depth_pretrained_path: str,
+    device: str = 'cpu',
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    variant: str = FLOAT32,
+) -> t.Tuple[float, np.ndarray, t.Dict[str, float], t.List[t.Dict[str, t.Any]]]:
+    """
+    Turn time and depth inference on one shared window tensor: the turn-time model reads the
+    3D channels (34:85) of the 2D+3D+height windows of the depth model.
+    Return the same values as turn_time_simple_inference(return_raw_prediction=True)
+    followed by depth_simple_inference
+    """
+    turn_time_model = get_turn_time_model(
+        turn_time_pretrained_path, device=device, variant=variant,
+    )
+    depth_model = get_depth_model(depth_pretrained_path, device=device, variant=variant)
+
+    trial_data = InferenceTrialData(
+        detectron_2d_single_person_keypoints_path=detectron_2d_single_person_keypoints_path,
+        rendered_3d_single_person_keypoints_path=rendered_3d_single_person_keypoints_path,
+        height=height,
+        use_height=True,
+        signal_type='2d+3d',
+    )
+    if signal_verifier(trial_data.rendered_3d_keypoints):
+        raise ValueError('3D keypoints contain NaN')
+
+    windows = trial_data.get_all_signal_windows()  # T, 86, L
+    preds = np.empty(len(windows), dtype=np.int64)
+    outs = []
+    with torch.no_grad():
+        for start in range(0, len(windows), batch_size):
+            batch = torch.from_numpy(
+                np.ascontiguousarray(windows[start: start + batch_size], dtype=np.float32),
+            ).to(device)
+            outs.append(depth_model(batch).cpu().numpy())
+            logit = turn_time_model(batch[:, TURN_TIME_CHANNELS].contiguous())
+            preds[start: start + len(batch)] = torch.argmax(logit, dim=1).cpu().numpy()
+
+    turn_time, preds_postprocess = postprocess_turn_predictions(preds)
+    out_re = np.concatenate(outs, axis=0) * DEPTH_OUTPUT_SCALE
+    sl_adjust = used_camera_focal_length / model_focal_length
+    gait_parameters = compute_gait_parameters(out_re, preds_postprocess, sl_adjust=sl_adjust)
+    final_output = summarize_gait_parameters(gait_parameters)
+
+    return turn_time, preds_postprocess, final_output, gait_parameters
@@ -0,0 +1,49 @@
+import gc
+import weakref
+
+import numpy as np
+import torch
+
+from ..dataset import InferenceTrialData, inference_one_trial
+from ..model import SignalNet
+
+
+def make_trial_data(tmp_path, num_frames: int = 300) -> InferenceTrialData:
+    rng = np.random.default_rng(0)
+    detectron_2d_path = str(tmp_path / 'custom-dataset.npz')
+    rendered_3d_path = str(tmp_path / 'keypoints.mp4.npy')
+    positions_2d = {'a.mp4': {'custom': [rng.random((num_frames, 17, 2)).astype('float32')]}}
+    np.savez_compressed(detectron_2d_path, positions_2d=positions_2d)
+    np.save(rendered_3d_path, rng.normal(size=(num_frames, 17, 3)).astype('float32'))
+    return InferenceTrialData(
+        detectron_2d_single_person_keypoints_path=detectron_2d_path,
+        rendered_3d_single_person_keypoints_path=rendered_3d_path,
+        height=170,
+        use_height=True,
+    )
+
+
+def test_signal_windows_match_crops(tmp_path):
+    trial_data = make_trial_data(tmp_path)
+    windows = trial_data.get_all_signal_windows()
+    assert windows.shape == (300, 86, 129)
+    for i in (0, 64, 150, 299):
+        np.testing.assert_array_equal(windows[i], trial_data.crop_signal_from_one_point(i))
+
+    # the padded signal is cached per instance and released with it
+    trial_data_ref = weakref.ref(trial_data)
+    del trial_data, windows
+    gc.collect()
+    assert trial_data_ref() is None
+
+
+def test_inference_one_trial_in_batches(tmp_path):
+    trial_data = make_trial_data(tmp_path)
+    torch.manual_seed(0)
+    model = SignalNet(in_channels=86, num_of_class=6).eval()
+
+    windows = np.stack(list(trial_data.generate_all_signal_segments_without_answer()))
+    with torch.no_grad():
+        expected = model(torch.FloatTensor(windows)).numpy()
+    out = inference_one_trial(trial_data, model, 'cpu', batch_size=64)
+    np.testing.assert_array_equal(out, expected)
@@ -0,0 +1,70 @@
+import numpy as np
+
+from .. import gait_events, utils
+
+
+NUM_CASES = 200
+
+
+def random_signal(rng: np.random.Generator) -> np.ndarray:
+    # runs of positive / non-positive values with occasional zeros and NaNs
+    num_runs = int(rng.integers(0, 60))
+    signal = np.repeat(rng.normal(size=num_runs), rng.integers(1, 10, size=num_runs))
+    length = len(signal)
+    signal[rng.random(length) < 0.05] = 0
+    signal[rng.random(length) < 0.02] = np.nan
+    return signal
+
+
+def test_gait_events_match_reference():
+    rng = np.random.default_rng(0)
+    for _ in range(NUM_CASES):
+        signal = random_signal(rng)
+        turn_mask = rng.random(len(signal)) < 0.3
+        depth = rng.normal(1500, 500, size=len(signal))
+
+        expected = utils.compute_first_idx_in_positive_intervals(signal)
+        indices = gait_events.compute_first_idx_in_positive_intervals(signal)
+        assert indices.tolist() == expected
+
+        expected = utils.filter_indices(expected, turn_mask)
+        indices = gait_events.filter_indices(indices, turn_mask)
+        assert indices.tolist() == expected
+
+        before, after = sorted(rng.integers(0, len(signal) + 1, size=2).tolist())
+        expected_split = utils.split_indices(expected, before, after)
+        split = gait_events.split_indices(indices, before, after)
+        assert [x.tolist() for x in split] == list(expected_split)
+
+        for expected_part, part in zip(expected_split, split):
+            expected_part = utils.filter_indices_by_depth(expected_part, depth, depth_min=1500)
+            part = gait_events.filter_indices_by_depth(part, depth, depth_min=1500)
+            assert part.tolist() == expected_part
+
+            if len(expected_part) > 1:
+                expected_intervals = utils.indices_to_intervals(expected_part)
+                assert gait_events.indices_to_intervals(part).tolist() == expected_intervals
+            assert gait_events.indices_to_intervals(part).shape[1] == 2
+
+        assert gait_events.find_true_index_pair(turn_mask) == utils.find_true_index_pair(turn_mask)
+
+
+def test_gait_parameters_match_reference():
+    rng = np.random.default_rng(1)
+    for _ in range(NUM_CASES):
+        length = int(rng.integers(2, 500))
+        signals = rng.normal(size=(length, 6)) * np.array([1000, 500, 10000, 1000, 500, 10000])
+        indices = np.unique(rng.integers(0, length, size=rng.integers(2, 30)))
+        intervals = np.stack((indices[:-1], indices[1:]), axis=1)
+        sl_adjust = float(rng.uniform(0.5, 2))
+        for leg in ('left', 'right'):
+            expected = utils.get_gait_parameter(
+                intervals.tolist(), signals, leg=leg, sl_adjust=sl_adjust,
+            )
+            assert gait_events.get_gait_parameter(
+                intervals, signals, leg=leg, sl_adjust=sl_adjust,
+            ) == expected
+            assert gait_events.get_gait_parameter(
+                intervals, signals, leg=leg, sl_adjust=sl_adjust,
+                stride_width=gait_events.compute_stride_width(signals),
+            ) == expected
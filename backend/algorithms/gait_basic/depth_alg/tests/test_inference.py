@@ -0,0 +1,56 @@
+import pickle
+
+import numpy as np
+import torch
+
+from ...gait_study_semi_turn_time.inference import turn_time_simple_inference
+from ...gait_study_semi_turn_time.src.models import SignalNet as TurnTimeSignalNet
+from ..inference import depth_simple_inference, turn_time_depth_inference
+from ..model import SignalNet
+
+
+def test_turn_time_depth_inference_matches_separate_stages(tmp_path):
+    torch.manual_seed(0)
+    turn_time_pretrained_path = str(tmp_path / 'turn-time.pth')
+    depth_pretrained_path = str(tmp_path / 'depth.pth')
+    torch.save(TurnTimeSignalNet(num_of_class=2).state_dict(), turn_time_pretrained_path)
+    torch.save(SignalNet(in_channels=86, num_of_class=6).state_dict(), depth_pretrained_path)
+
+    rng = np.random.default_rng(0)
+    keypoints_3d_path = str(tmp_path / 'trial.mp4.npy')
+    custom_dataset_path = str(tmp_path / 'trial-custom-dataset.npz')
+    np.save(keypoints_3d_path, rng.normal(size=(400, 17, 3)).astype('float32'))
+    keypoints_2d = rng.random((400, 17, 2)).astype('float32')
+    np.savez_compressed(custom_dataset_path, positions_2d={'trial.mp4': {'custom': [keypoints_2d]}})
+
+    tt, raw_tt_prediction, final_output, gait_parameters = turn_time_depth_inference(
+        detectron_2d_single_person_keypoints_path=custom_dataset_path,
+        rendered_3d_single_person_keypoints_path=keypoints_3d_path,
+        height=170,
+        model_focal_length=1392.0,
+        used_camera_focal_length=1392.0,
+        turn_time_pretrained_path=turn_time_pretrained_path,
+        depth_pretrained_path=depth_pretrained_path,
+        batch_size=100,
+    )
+
+    expected_tt, expected_raw_tt_prediction = turn_time_simple_inference(
+        turn_time_pretrained_path, keypoints_3d_path, return_raw_prediction=True,
+    )
+    assert tt == expected_tt
+    np.testing.assert_array_equal(raw_tt_prediction, expected_raw_tt_prediction)
+
+    turn_time_mask_path = str(tmp_path / 'trial-tt.pickle')
+    with open(turn_time_mask_path, 'wb') as handle:
+        pickle.dump(expected_raw_tt_prediction, handle)
+    expected_final_output, expected_gait_parameters = depth_simple_inference(
+        detectron_2d_single_person_keypoints_path=custom_dataset_path,
+        rendered_3d_single_person_keypoints_path=keypoints_3d_path,
+        height=170,
+        model_focal_length=1392.0,
+        used_camera_focal_length=1392.0,
+        depth_pretrained_path=depth_pretrained_path,
+        turn_time_mask_path=turn_time_mask_path,
+    )
+    assert gait_parameters == expected_gait_parameters
+    np.testing.assert_equal(final_output, expected_final_output)
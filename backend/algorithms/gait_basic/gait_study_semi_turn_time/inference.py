@@ -1,66 +1,117 @@
 import argparse
+import functools
 import typing as t
 
 import numpy as np
 import torch
 import torch.nn as nn
-from scipy import ndimage
 
+from ..utils.model_registry import model_registry
+from ..utils.model_variants import FLOAT32, MODEL_VARIANTS, get_variant_name, load_model_variant
 from .src.datasets import GaitTrialInstanceSimple
 from .src.models import SignalNet
-from .src.utils import group_continuous_ones
+from .src.rle import TURN_MIN_LENGTH, binary_opening
+
+
+DEFAULT_BATCH_SIZE = 256
+TURN_TIME_INPUT_SHAPE = (1, 51, 129)
 
 
 def signal_verifier(signal):
     return np.any(np.isnan(signal))
 
 
+def build_turn_time_model(turn_time_pretrained_path: str) -> nn.Module:
+    model = SignalNet(num_of_class=2)
+    model.load_state_dict(torch.load(turn_time_pretrained_path))
+    model.eval()
+    return model
+
+
+def load_turn_time_model(
+    turn_time_pretrained_path: str,
+    device: str = 'cpu',
+    variant: str = FLOAT32,
+) -> nn.Module:
+    return load_model_variant(
+        turn_time_pretrained_path,
+        build_turn_time_model,
+        TURN_TIME_INPUT_SHAPE,
+        device=device,
+        variant=variant,
+    )
+
+
+def get_turn_time_model(
+    turn_time_pretrained_path: str,
+    device: str = 'cpu',
+    variant: str = FLOAT32,
+) -> nn.Module:
+    return model_registry.get(
+        get_variant_name('turn_time', variant),
+        turn_time_pretrained_path,
+        functools.partial(load_turn_time_model, variant=variant),
+        device=device,
+    )
+
+
+def predict_signal_windows(
+    model: nn.Module,
+    windows: np.ndarray,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    device: str = 'cpu',
+) -> np.ndarray:
+    # windows: N, C, L (a strided view is fine); only one mini-batch is materialized at a time
+    preds = np.empty(len(windows), dtype=np.int64)
+    with torch.no_grad():
+        for start in range(0, len(windows), batch_size):
+            batch = np.ascontiguousarray(windows[start: start + batch_size], dtype=np.float32)
+            logit = model(torch.from_numpy(batch).to(device))
+            preds[start: start + len(batch)] = torch.argmax(logit, dim=1).cpu().numpy()
+    return preds
+
+
+def postprocess_turn_predictions(preds: np.ndarray) -> t.Tuple[float, np.ndarray]:
+    """
+    Remove the turn segments shorter than 10 frames; the turn time is the length of the
+    longest remaining segment. Return the turn time in seconds and the boolean turn mask
+    """
+    preds_postprocess, starts, ends = binary_opening(preds, TURN_MIN_LENGTH)
+    pred_turn_time = (ends - starts).max() if len(starts) > 0 else 0
+    return pred_turn_time * 30 / 1000, preds_postprocess
+
+
 def turn_time_simple_inference(
     turn_time_pretrained_path: str,
     path_to_npz: str,
     return_raw_prediction: bool = False,
-) -> t.Union[float, t.Tuple[float, t.List[bool]]]:
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    variant: str = FLOAT32,
+) -> t.Union[float, t.Tuple[float, np.ndarray]]:
     # given a npz of 3D tragetories and pretrained_path
     # output the turing time in second
 
-    model = SignalNet(num_of_class=2)
-    model.load_state_dict(torch.load(turn_time_pretrained_path))
+    model = get_turn_time_model(turn_time_pretrained_path, variant=variant)
 
     gait_instance = GaitTrialInstanceSimple(
         trial_id='',
         path_to_npz=path_to_npz,
     )
-    model.eval()
-    with torch.no_grad():
-        preds = []
-        probs = []
-        for signal in gait_instance.generate_all_signal_segments_without_answer():
-            if signal_verifier(signal):
-                return -1
-            signal = torch.FloatTensor(signal[None, :, :])
-            logit = model(signal)
-            pred = torch.argmax(logit, dim=1)
-            prob = nn.functional.softmax(logit, dim=1)
-            preds += list(pred.numpy())
-            probs.append(prob.numpy()[0, 1])
-
-    preds = np.array(preds)
-    probs = np.array(probs)
-    preds_postprocess = ndimage.binary_erosion(preds, structure=np.ones(10)).astype(preds.dtype)
-    preds_postprocess = ndimage.binary_dilation(
-        preds_postprocess,
-        structure=np.ones(10),
-    ).astype(preds_postprocess.dtype)
-
-    try:
-        pred_turn_time = group_continuous_ones(preds_postprocess).max()
-    except Exception:
-        pred_turn_time = 0
+    # every frame falls into at least one window, so a NaN anywhere invalidates the trial
+    if signal_verifier(gait_instance.signals):
+        return -1
+
+    preds = predict_signal_windows(
+        model,
+        gait_instance.get_all_signal_windows(),
+        batch_size=batch_size,
+    )
+    turn_time, preds_postprocess = postprocess_turn_predictions(preds)
 
     if return_raw_prediction:
-        return pred_turn_time * 30 / 1000, list(preds_postprocess)
+        return turn_time, preds_postprocess
     else:
-        return pred_turn_time * 30 / 1000
+        return turn_time
 
 
 if __name__ == '__main__':
@@ -77,10 +128,25 @@ if __name__ == '__main__':
         help='path to npz file',
         type=str,
     )
+    parser.add_argument(
+        '--batch-size',
+        default=DEFAULT_BATCH_SIZE,
+        help='number of windows per forward pass',
+        type=int,
+    )
+    parser.add_argument(
+        '--variant',
+        default=FLOAT32,
+        choices=MODEL_VARIANTS,
+        help='model variant',
+        type=str,
+    )
     args = parser.parse_args()
 
     turn_time = turn_time_simple_inference(
         turn_time_pretrained_path=args.pretrained_path,
         path_to_npz=args.npz_file_path,
+        batch_size=args.batch_size,
+        variant=args.variant,
     )
     print(turn_time)
@@ -1,5 +1,4 @@
 import random
-from functools import lru_cache
 
 import numpy as np
 from skimage.restoration import denoise_wavelet
@@ -18,6 +17,7 @@ class GaitTrialInstance:
 
         self.signals = np.load(self.path_to_npz).reshape(-1, 51)  # L, C
         self.signal_length = self.signals.shape[0]
+        self._pad_signal_cache = {}
 
     def parse_id(self):
         self.trial_id = self.path_to_csv.rsplit('/', 1)[1].rsplit('.', 1)[0]
@@ -54,9 +54,14 @@ class GaitTrialInstance:
         self.turn_end = self.turn_time_points[1]
         self.patient_type = patient_verfication_info['type']
 
-    @lru_cache(maxsize=None)
     def pad_signal(self, pad_size):
-        return np.pad(self.signals, ((pad_size, pad_size), (0, 0)), mode='constant')
+        # per instance: an lru_cache on the method would keep every instance (and its padded
+        # signal) alive for the life of the process, e.g. a batch scoring worker
+        if pad_size not in self._pad_signal_cache:
+            self._pad_signal_cache[pad_size] = np.pad(
+                self.signals, ((pad_size, pad_size), (0, 0)), mode='constant',
+            )
+        return self._pad_signal_cache[pad_size]
 
     def crop_signal_from_one_point(self, timestamp, signal_size=129):  # 'left_x', 'right_x'
         # signal_size must be odd
@@ -86,6 +91,13 @@ class GaitTrialInstance:
         for i in range(self.signal_length):
             yield self.crop_signal_from_one_point(i, signal_size=signal_size)
 
+    def get_all_signal_windows(self, signal_size=129):
+        # zero-copy strided view over the padded signal; window i equals
+        # crop_signal_from_one_point(i) and the whole view is N, C, L
+        half_size = signal_size // 2
+        pad_signal = self.pad_signal(half_size)
+        return np.lib.stride_tricks.sliding_window_view(pad_signal, signal_size, axis=0)
+
 
 class GaitTrialInstanceSimple(GaitTrialInstance):
     def __init__(self, trial_id, signal_size=129, path_to_npz=None):
@@ -98,6 +110,7 @@ class GaitTrialInstanceSimple(GaitTrialInstance):
 
         self.signals = np.load(self.path_to_npz).reshape(-1, 51)  # L, C
         self.signal_length = self.signals.shape[0]
+        self._pad_signal_cache = {}
 
     def parse_id(self):
         self.patient_id = self.trial_id.rsplit('-', 1)[0]
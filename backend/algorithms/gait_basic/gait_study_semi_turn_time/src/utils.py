@@ -3,20 +3,12 @@ import math
 import numpy as np
 from torch.optim.lr_scheduler import LambdaLR
 
+from .rle import run_length_encode
+
 
 def group_continuous_ones(array):
-    n = len(array)
-    lengths = []
-    index = 0
-    while (index < n):
-        if array[index] == 1:
-            start = index
-            while (index + 1 < n and array[index + 1] == 1):
-                index += 1
-            length = index - start + 1
-            lengths.append(length)
-        index += 1
-    return np.array(lengths)
+    _, _, lengths = run_length_encode(np.asarray(array) == 1)
+    return lengths
 
 
 def get_cosine_schedule_with_warmup(optimizer,
@@ -0,0 +1,39 @@
+import numpy as np
+from scipy import ndimage
+
+from ..inference import postprocess_turn_predictions
+from ..src.rle import binary_opening, run_length_decode, run_length_encode
+
+
+def test_run_length_encode():
+    starts, ends, lengths = run_length_encode([1, 1, 0, 0, 1, 0, 1, 1, 1])
+    np.testing.assert_array_equal(starts, [0, 4, 6])
+    np.testing.assert_array_equal(ends, [2, 5, 9])
+    np.testing.assert_array_equal(lengths, [2, 1, 3])
+    np.testing.assert_array_equal(
+        run_length_decode(starts, ends, 9), [1, 1, 0, 0, 1, 0, 1, 1, 1],
+    )
+    assert all(len(x) == 0 for x in run_length_encode([]))
+
+
+def test_binary_opening_matches_ndimage():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        preds = np.repeat(rng.random(40) < 0.5, rng.integers(1, 20)).astype(np.int64)
+        for size in [1, 4, 10]:
+            expected = ndimage.binary_erosion(preds, structure=np.ones(size))
+            expected = ndimage.binary_dilation(expected, structure=np.ones(size))
+            mask, _, _ = binary_opening(preds, size)
+            np.testing.assert_array_equal(mask, expected)
+
+
+def test_postprocess_turn_predictions():
+    preds = np.zeros(100, dtype=np.int64)
+    preds[5:12] = 1  # too short to be a turn
+    preds[30:55] = 1
+    preds[70:82] = 1
+    turn_time, mask = postprocess_turn_predictions(preds)
+    assert turn_time == 25 * 30 / 1000
+    assert mask.dtype == bool
+    np.testing.assert_array_equal(np.flatnonzero(mask), np.r_[30:55, 70:82])
+    assert postprocess_turn_predictions(np.zeros(100, dtype=np.int64))[0] == 0
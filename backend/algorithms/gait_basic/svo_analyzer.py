@@ -9,12 +9,11 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from algorithms._analyzer import Analyzer
-from algorithms.gait_basic.utils.calculate import add_newline_if_missing, fix_timestamp_file
-from algorithms.gait_basic.utils.track import (
-    remove_non_target_person, set_zero_prob_for_keypoint_before_start_line,
-)
+from algorithms.gait_basic.utils.calculate import add_newline_if_missing
+from algorithms.gait_basic.utils.keypoint_store import postprocess_openpose_json
 from algorithms.gait_basic.utils.subtask_utils import register_subtask
 from enums.subtask import SubtaskEnum
+from utils.folder_bundle import unbundle_folder
 
 
 BACKEND_FOLDER_PATH = os.environ['BACKEND_FOLDER_PATH']
@@ -23,6 +22,11 @@ START_LINE = 1820
 SVO_EXPORT_RETRY = 2
 DEPTH_SENSING_RETRY = 5
 SYNC_FILE_SERVER_STORE_PATH = os.environ['SYNC_FILE_SERVER_STORE_PATH']
+KEYPOINT_POSTPROCESS_WORKERS = int(
+    os.environ.get('KEYPOINT_POSTPROCESS_WORKERS', os.cpu_count() or 1),
+)
+# the analyzer runs in a daemonic celery worker process, which cannot start a process pool
+KEYPOINT_POSTPROCESS_EXECUTOR = os.environ.get('KEYPOINT_POSTPROCESS_EXECUTOR', 'thread')
 
 if os.environ.get('CELERY_WORKER', 'none') == 'gait-worker':
     from .tasks.openpose_task import openpose_task
@@ -71,6 +75,9 @@ class SVOGaitAnalyzer(Analyzer):
         # meta output
         meta_json_path = os.path.join(data_root_dir, 'out', f'{file_id}-json/')
 
+        # meta output (all the openpose keypoints in one array)
+        meta_keypoints_path = os.path.join(data_root_dir, 'out', f'{file_id}-keypoints.npy')
+
         # meta output (for non-target person removing)
         meta_targeted_person_bboxes_path = os.path.join(data_root_dir, 'out', f'{file_id}-target_person_bboxes.pickle')  # noqa
 
@@ -141,21 +148,26 @@ class SVOGaitAnalyzer(Analyzer):
         if track_and_extract_task_instance.failed():
             raise RuntimeError('Track and Extract Task falied!')
 
-        # step 4: processing
+        # steps 4 - 6: processing, only allow after start line and fix timestemp, in one pass
+        # over the json folder
         with open(meta_targeted_person_bboxes_path, 'rb') as handle:
             targeted_person_bboxes = pickle.load(handle)
 
-        remove_non_target_person(meta_json_path, targeted_person_bboxes)
+        # the json files are modified in place, so that a bundle is never downloaded with the
+        # raw openpose output
+        if unbundle_folder(meta_json_path):
+            print(f'Unbundled {meta_json_path}')
 
-        # step 5: only allow after start line
-        set_zero_prob_for_keypoint_before_start_line(
+        postprocess_openpose_json(
             json_path=meta_json_path,
+            keypoints_path=meta_keypoints_path,
+            targeted_person_bboxes=targeted_person_bboxes,
             start_line=START_LINE,
+            timestamp_file_path=source_txt_path,
+            workers=KEYPOINT_POSTPROCESS_WORKERS,
+            executor=KEYPOINT_POSTPROCESS_EXECUTOR,
         )
 
-        # step 6: fix timestemp
-        fix_timestamp_file(timestamp_file_path=source_txt_path, json_path=meta_json_path)
-
         # step 7: turn time
         turn_time_config = {
             'file_id': file_id,
@@ -3,10 +3,12 @@ import shutil
 import typing as t
 
 from celery import Celery
+from celery.signals import worker_init
 from redis import Redis
 
 from algorithms._runner import Runner
-from algorithms.gait_basic.depth_alg.inference import depth_simple_inference
+from algorithms.gait_basic.depth_alg.inference import depth_simple_inference, get_depth_model
+from algorithms.gait_basic.utils.model_registry import model_registry
 from settings import SYNC_FILE_SERVER_RESULT_PATH
 from utils.synchronizer import DataSynchronizer
 
@@ -27,6 +29,14 @@ WORKER_WORKING_DIR_PATH = os.path.join('/root/data/', 'depth_estimation')
 BACKEND_FOLDER_PATH = os.environ['BACKEND_FOLDER_PATH']
 WORK_DIR = '/root/backend'
 
+DEPTH_PRETRAINED_PATH = os.environ.get(
+    'DEPTH_PRETRAINED_PATH',
+    'algorithms/gait_basic/depth_alg/weights/gait-depth-weight.pth',
+)
+
+# float32, torchscript or int8 (see utils/model_variants.py)
+SIGNAL_MODEL_VARIANT = os.environ.get('SIGNAL_MODEL_VARIANT', 'float32')
+
 app = Celery(
     'tasks',
     broker=CELERY_BROKER_URL,
@@ -36,6 +46,17 @@ app = Celery(
 )
 
 
+@worker_init.connect
+def preload_models(sender=None, **kwargs):
+    # load the weights once in the parent process so that every (recycled) pool process
+    # inherits the frozen model instead of calling torch.load per request
+    if sender is not None and sender.app is not app:
+        return
+    if os.path.exists(DEPTH_PRETRAINED_PATH):
+        get_depth_model(DEPTH_PRETRAINED_PATH, variant=SIGNAL_MODEL_VARIANT)
+    model_registry.print_report()
+
+
 class DepthEstimationTaskRunner(Runner):
     def __init__(
         self,
@@ -101,10 +122,12 @@ class DepthEstimationTaskRunner(Runner):
         self.data_synchronizer.download(
             src=self.input_custom_dataset_path_remote,
             des=self.input_custom_dataset_path_local,
+            cached=True,
         )
         self.data_synchronizer.download(
             src=self.input_3dkeypoint_path_remote,
             des=self.input_3dkeypoint_path_local,
+            cached=True,
         )
         self.data_synchronizer.download(
             src=self.input_raw_turn_time_prediction_path_remote,
@@ -124,6 +147,7 @@ class DepthEstimationTaskRunner(Runner):
             depth_pretrained_path=self.config['depth_pretrained_path'],
             turn_time_mask_path=self.input_raw_turn_time_prediction_path_local,
             device='cpu',
+            variant=SIGNAL_MODEL_VARIANT,
         )
 
         if self.result_hook is not None:
@@ -21,6 +21,8 @@ TASK_SYNC_URL = os.environ.get('TASK_SYNC_URL')
 
 FOLDER_TO_STORE_TEMP_FILE_PATH = os.environ.get('FOLDER_TO_STORE_TEMP_FILE_PATH')
 DOCKER_NETWORK = os.environ.get('DOCKER_NETWORK', None)
+# upload the json of every frame as a single archive (see utils/folder_bundle.py)
+BUNDLE_JSON_FOLDER = os.environ.get('BUNDLE_JSON_FOLDER', 'false').lower() == 'true'
 
 WORKER_WORKING_DIR_PATH = os.path.join('/root/data/', 'openpose')
 
@@ -111,6 +113,7 @@ class OpenposeTask(Runner):
         self.data_synchronizer.download(
             src=self.input_avi_path_remote,
             des=self.input_avi_path_local,
+            cached=True,
         )
 
     def upload_data(self):
@@ -122,7 +125,8 @@ class OpenposeTask(Runner):
         self.data_synchronizer.upload_folder(
             src_folder=self.output_json_folder_local,
             des_folder=self.output_json_folder_remote,
-        )
+            bundle=BUNDLE_JSON_FOLDER,
+        ).raise_for_failures()
 
     def execute(self):
         # openpose
@@ -118,7 +118,7 @@ class REstimationTaskRunner(Runner):
         self.data_synchronizer.upload_folder(
             src_folder=self.output_zgait_folder_local,
             des_folder=self.output_zgait_folder_remote,
-        )
+        ).raise_for_failures()
 
     def execute(self):
         os.makedirs(
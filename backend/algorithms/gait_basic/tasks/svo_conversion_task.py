@@ -107,6 +107,7 @@ class SVOConversionTask(Runner):
         self.data_synchronizer.download(
             src=self.input_svo_path_remote,
             des=self.input_svo_path_local,
+            cached=True,
         )
 
     def upload_data(self):
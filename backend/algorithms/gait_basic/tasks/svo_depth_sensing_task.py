@@ -126,6 +126,7 @@ class SVODepthSensingTask(Runner):
         self.data_synchronizer.download(
             src=self.input_svo_path_remote,
             des=self.input_svo_path_local,
+            cached=True,
         )
         self.data_synchronizer.download(
             src=self.input_txt_path_remote,
@@ -134,7 +135,8 @@ class SVODepthSensingTask(Runner):
         self.data_synchronizer.download_folder(
             src_folder=self.input_json_folder_remote,
             des_folder=self.input_json_folder_local,
-        )
+            bundle=True,  # unpacked if uploaded as a bundle, file by file otherwise
+        ).raise_for_failures()
 
     def upload_data(self):
         self.update_state(state='PROGRESS', meta={'progress': 100, 'stage': 'uploading data'})
@@ -3,13 +3,17 @@ import pickle
 import shutil
 import typing as t
 
+import numpy as np
 from celery import Celery
 from redis import Redis
 
 from algorithms._runner import Runner
 from algorithms.gait_basic.utils.docker_utils import run_container
-from algorithms.gait_basic.utils.make_video import count_frames
-from algorithms.gait_basic.utils.track import find_continuous_personal_bbox, load_mot_file
+from algorithms.gait_basic.utils.pose_lifting import (
+    decode_detectron_2d, infer_2d_keypoints, lift_2d_to_3d, save_custom_dataset,
+)
+from algorithms.gait_basic.utils.track import MOTStore, find_continuous_personal_bbox
+from algorithms.gait_basic.utils.video_metadata import get_video_metadata
 from settings import SYNC_FILE_SERVER_RESULT_PATH
 from utils.synchronizer import DataSynchronizer
 
@@ -26,6 +30,9 @@ FOLDER_TO_STORE_TEMP_FILE_PATH = os.environ.get('FOLDER_TO_STORE_TEMP_FILE_PATH'
 DOCKER_NETWORK = os.environ.get('DOCKER_NETWORK', None)
 
 WORKER_WORKING_DIR_PATH = os.path.join('/root/data/', 'track_and_extract')
+# ceiling for the activations of the 3D lifting model, so long videos are lifted in tiles;
+# 256 MB is a tile of about 7000 frames (4 minutes at 30 fps)
+LIFTING_MAX_MEMORY = int(os.environ.get('LIFTING_MAX_MEMORY_MB', 256)) * 2 ** 20
 
 BACKEND_FOLDER_PATH = os.environ['BACKEND_FOLDER_PATH']
 WORK_DIR = '/root/backend'
@@ -76,19 +83,6 @@ class TrackAndExtractTaskRunner(Runner):
             f'{self.file_id}.mp4',
         )
 
-        # meta
-        self.meta_mp4_folder_local = os.path.join(
-            WORKER_WORKING_DIR_PATH,
-            self.request_uuid,
-            'video',
-        )
-        self.meta_mp4_path_local = os.path.join(
-            WORKER_WORKING_DIR_PATH,
-            self.request_uuid,
-            'video',
-            f'{self.file_id}.mp4',
-        )
-
         # output
         self.output_mot_path_local = os.path.join(
             WORKER_WORKING_DIR_PATH,
@@ -172,6 +166,7 @@ class TrackAndExtractTaskRunner(Runner):
         self.data_synchronizer.download(
             src=self.input_mp4_path_remote,
             des=self.input_mp4_path_local,
+            cached=True,
         )
 
     def upload_data(self):
@@ -191,11 +186,11 @@ class TrackAndExtractTaskRunner(Runner):
         self.data_synchronizer.upload_folder(
             src_folder=self.output_2dkeypoint_folder_local,
             des_folder=self.output_2dkeypoint_folder_remote,
-        )
+        ).raise_for_failures()
         self.data_synchronizer.upload_folder(
             src_folder=self.output_3dkeypoint_folder_local,
             des_folder=self.output_3dkeypoint_folder_remote,
-        )
+        ).raise_for_failures()
 
     def execute(self):
         # tracking
@@ -232,26 +227,37 @@ class TrackAndExtractTaskRunner(Runner):
         os.makedirs(
             os.path.join(WORKER_WORKING_DIR_PATH, self.request_uuid, 'out', '3d'), exist_ok=True,
         )
-        os.makedirs(
-            os.path.join(WORKER_WORKING_DIR_PATH, self.request_uuid, 'video'), exist_ok=True,
-        )
 
-        mot_dict = load_mot_file(self.output_mot_path_local)
-        count = count_frames(self.input_mp4_path_local)
-        targeted_person_ids, targeted_person_bboxes = find_continuous_personal_bbox(count, mot_dict)
+        mot_store = MOTStore.from_file(self.output_mot_path_local)
+        count = get_video_metadata(self.input_mp4_path_local).frame_count
+        targeted_person_ids, targeted_person_bboxes = find_continuous_personal_bbox(
+            count, mot_store,
+        )
 
         with open(self.output_targeted_person_bboxes_path_local, 'wb') as handle:
             pickle.dump(targeted_person_bboxes, handle, protocol=pickle.HIGHEST_PROTOCOL)
 
-        # old pipeline
-        shutil.copyfile(self.input_mp4_path_local, self.meta_mp4_path_local)
-        os.system(
-            'cd algorithms/gait_basic/VideoPose3D && python3 quick_run.py '
-            f'--mp4_video_folder "{self.meta_mp4_folder_local}" '
-            f'--keypoint_2D_video_folder "{self.output_2dkeypoint_folder_local}" '
-            f'--keypoint_3D_video_folder "{self.output_3dkeypoint_folder_local}" '
-            f'--targeted-person-bboxes-path "{self.output_targeted_person_bboxes_path_local}" '
-            f'--custom-dataset-path "{self.output_custom_dataset_path_local}"'
+        # 2D keypoints -> 3D keypoints in this process; models are cached across tasks
+        detectron_2d = infer_2d_keypoints(self.input_mp4_path_local)
+        np.savez_compressed(
+            os.path.join(self.output_2dkeypoint_folder_local, f'{self.file_id}.mp4'),
+            **detectron_2d,
+        )
+        keypoints_2d, _, video_metadata = decode_detectron_2d(
+            detectron_2d, targeted_person_bboxes=targeted_person_bboxes,
+        )
+        save_custom_dataset(
+            self.output_custom_dataset_path_local,
+            canonical_name=f'{self.file_id}.mp4',
+            keypoints_2d=keypoints_2d,
+            video_metadata=video_metadata,
+        )
+        keypoints_3d = lift_2d_to_3d(
+            keypoints_2d, video_metadata, max_memory=LIFTING_MAX_MEMORY,
+        )
+        np.save(
+            os.path.join(self.output_3dkeypoint_folder_local, f'{self.file_id}.mp4.npy'),
+            keypoints_3d,
         )
 
     def clear(self):
@@ -0,0 +1,219 @@
+import os
+import pickle
+import shutil
+import typing as t
+
+from celery import Celery
+from celery.signals import worker_init
+from redis import Redis
+
+from algorithms._runner import Runner
+from algorithms.gait_basic.depth_alg.inference import get_depth_model, turn_time_depth_inference
+from algorithms.gait_basic.gait_study_semi_turn_time.inference import get_turn_time_model
+from algorithms.gait_basic.utils.model_registry import model_registry
+from settings import SYNC_FILE_SERVER_RESULT_PATH
+from utils.synchronizer import DataSynchronizer
+
+
+SYNC_FILE_SERVER_URL = os.environ['SYNC_FILE_SERVER_URL']
+SYNC_FILE_SERVER_PORT = os.environ['SYNC_FILE_SERVER_PORT']
+SYNC_FILE_SERVER_USER = os.environ['SYNC_FILE_SERVER_USER']
+SYNC_FILE_SERVER_PASSWORD = os.environ['SYNC_FILE_SERVER_PASSWORD']
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
+CELERY_BACKEND_URL = os.environ.get('CELERY_BACKEND_URL')
+TASK_SYNC_URL = os.environ.get('TASK_SYNC_URL')
+
+FOLDER_TO_STORE_TEMP_FILE_PATH = os.environ.get('FOLDER_TO_STORE_TEMP_FILE_PATH')
+DOCKER_NETWORK = os.environ.get('DOCKER_NETWORK', None)
+
+WORKER_WORKING_DIR_PATH = os.path.join('/root/data/', 'turn_time_depth')
+
+BACKEND_FOLDER_PATH = os.environ['BACKEND_FOLDER_PATH']
+WORK_DIR = '/root/backend'
+
+TURN_TIME_PRETRAINED_PATH = os.environ.get(
+    'TURN_TIME_PRETRAINED_PATH',
+    'algorithms/gait_basic/gait_study_semi_turn_time/weights/semi_vanilla_v2/gait-turn-time.pth',
+)
+DEPTH_PRETRAINED_PATH = os.environ.get(
+    'DEPTH_PRETRAINED_PATH',
+    'algorithms/gait_basic/depth_alg/weights/gait-depth-weight.pth',
+)
+
+# float32, torchscript or int8 (see utils/model_variants.py)
+SIGNAL_MODEL_VARIANT = os.environ.get('SIGNAL_MODEL_VARIANT', 'float32')
+
+app = Celery(
+    'tasks',
+    broker=CELERY_BROKER_URL,
+    backend=CELERY_BACKEND_URL,
+    result_expires=0,  # with the default setting, redis TTL is set to 1
+    broker_transport_options={'visibility_timeout': 1382400},
+)
+
+
+@worker_init.connect
+def preload_models(sender=None, **kwargs):
+    if sender is not None and sender.app is not app:
+        return
+    if os.path.exists(TURN_TIME_PRETRAINED_PATH):
+        get_turn_time_model(TURN_TIME_PRETRAINED_PATH, variant=SIGNAL_MODEL_VARIANT)
+    if os.path.exists(DEPTH_PRETRAINED_PATH):
+        get_depth_model(DEPTH_PRETRAINED_PATH, variant=SIGNAL_MODEL_VARIANT)
+    model_registry.print_report()
+
+
+class TurnTimeDepthTaskRunner(Runner):
+    """
+    turn_time_task and depth_estimation_task in one stage: the keypoints are downloaded and
+    loaded once and the turn mask is passed to the depth post-processing in memory.
+    The turn mask is still uploaded since the 2D video generation draws it
+    """
+    def __init__(
+        self,
+        request_uuid: str,
+        config: t.Dict[str, t.Any],
+        data_synchronizer: DataSynchronizer,
+        celery_task_id: str,
+        update_state: t.Callable,
+        result_hook: t.Optional[t.Dict] = None,
+    ):
+        self.request_uuid = request_uuid
+        self.config = config
+        self.file_id = self.config['file_id']
+        self.data_synchronizer = data_synchronizer
+        self.celery_task_id = celery_task_id
+        self.update_state = update_state
+        self.result_hook = result_hook
+
+        # input
+        self.input_custom_dataset_path_remote = os.path.join(
+            SYNC_FILE_SERVER_RESULT_PATH,
+            self.request_uuid,
+            'out',
+            f'{self.file_id}-custom-dataset.npz',
+        )
+        self.input_custom_dataset_path_local = os.path.join(
+            WORKER_WORKING_DIR_PATH,
+            self.request_uuid,
+            'out',
+            f'{self.file_id}-custom-dataset.npz',
+        )
+
+        self.input_3dkeypoint_path_remote = os.path.join(
+            SYNC_FILE_SERVER_RESULT_PATH,
+            self.request_uuid,
+            'out',
+            '3d',
+            f'{self.file_id}.mp4.npy',
+        )
+        self.input_3dkeypoint_path_local = os.path.join(
+            WORKER_WORKING_DIR_PATH,
+            self.request_uuid,
+            'out',
+            '3d',
+            f'{self.file_id}.mp4.npy',
+        )
+
+        # output
+        self.output_raw_turn_time_prediction_path_local = os.path.join(
+            WORKER_WORKING_DIR_PATH,
+            self.request_uuid,
+            'out',
+            f'{self.file_id}-tt.pickle',
+        )
+        self.output_raw_turn_time_prediction_path_remote = os.path.join(
+            SYNC_FILE_SERVER_RESULT_PATH,
+            self.request_uuid,
+            'out',
+            f'{self.file_id}-tt.pickle',
+        )
+
+    def fetch_data(self):
+        self.update_state(state='PROGRESS', meta={'progress': 0, 'stage': 'fetching data'})
+        self.data_synchronizer.download(
+            src=self.input_custom_dataset_path_remote,
+            des=self.input_custom_dataset_path_local,
+            cached=True,
+        )
+        self.data_synchronizer.download(
+            src=self.input_3dkeypoint_path_remote,
+            des=self.input_3dkeypoint_path_local,
+            cached=True,
+        )
+
+    def upload_data(self):
+        self.update_state(state='PROGRESS', meta={'progress': 100, 'stage': 'uploading data'})
+        self.data_synchronizer.upload(
+            src=self.output_raw_turn_time_prediction_path_local,
+            des=self.output_raw_turn_time_prediction_path_remote,
+        )
+
+    def execute(self):
+        tt, raw_tt_prediction, final_output, gait_parameters = turn_time_depth_inference(
+            detectron_2d_single_person_keypoints_path=self.input_custom_dataset_path_local,
+            rendered_3d_single_person_keypoints_path=self.input_3dkeypoint_path_local,
+            height=self.config['height'],
+            model_focal_length=self.config['model_focal_length'],
+            used_camera_focal_length=self.config['focal_length'],
+            turn_time_pretrained_path=self.config['turn_time_pretrained_path'],
+            depth_pretrained_path=self.config['depth_pretrained_path'],
+            device='cpu',
+            variant=SIGNAL_MODEL_VARIANT,
+        )
+
+        with open(self.output_raw_turn_time_prediction_path_local, 'wb') as handle:
+            pickle.dump(raw_tt_prediction, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+        if self.result_hook is not None:
+            self.result_hook['tt'] = float(tt)
+            self.result_hook['raw_tt_prediction'] = raw_tt_prediction.astype(int).tolist()
+            self.result_hook['final_output'] = final_output
+            self.result_hook['gait_parameters'] = gait_parameters
+
+    def clear(self):
+        shutil.rmtree(os.path.join(WORKER_WORKING_DIR_PATH, self.request_uuid))
+
+
+@app.task(bind=True, name='turn_time_depth_task', queue='turn_time_depth_task_queue')
+def turn_time_depth_task(self, request_uuid: str, config: t.Dict[str, t.Any]):
+
+    redis = Redis.from_url(TASK_SYNC_URL)
+    key = f'turn_time_depth_task_{request_uuid}'
+    if redis.exists(key):
+        print(f'Skip this task since {key} exists')
+        return True
+    redis.set(key, 1)
+
+    data_synchronizer = DataSynchronizer(
+        url=SYNC_FILE_SERVER_URL,
+        port=SYNC_FILE_SERVER_PORT,
+        user=SYNC_FILE_SERVER_USER,
+        password=SYNC_FILE_SERVER_PASSWORD,
+    )
+
+    result_hook = {
+        'tt': -1,
+        'raw_tt_prediction': [],
+        'final_output': {},
+        'gait_parameters': [],
+    }
+
+    runner = TurnTimeDepthTaskRunner(
+        request_uuid=request_uuid,
+        config=config,
+        data_synchronizer=data_synchronizer,
+        celery_task_id=self.request.id,
+        update_state=self.update_state,
+        result_hook=result_hook,
+    )
+
+    self.update_state(state='PROGRESS', meta={'progress': 0, 'stage': 'start'})
+    runner.run()
+
+    return (
+        result_hook['tt'],
+        result_hook['raw_tt_prediction'],
+        result_hook['final_output'],
+        result_hook['gait_parameters'],
+    )
@@ -4,10 +4,14 @@ import shutil
 import typing as t
 
 from celery import Celery
+from celery.signals import worker_init
 from redis import Redis
 
 from algorithms._runner import Runner
-from algorithms.gait_basic.gait_study_semi_turn_time.inference import turn_time_simple_inference
+from algorithms.gait_basic.gait_study_semi_turn_time.inference import (
+    get_turn_time_model, turn_time_simple_inference,
+)
+from algorithms.gait_basic.utils.model_registry import model_registry
 from settings import SYNC_FILE_SERVER_RESULT_PATH
 from utils.synchronizer import DataSynchronizer
 
@@ -28,6 +32,14 @@ WORKER_WORKING_DIR_PATH = os.path.join('/root/data/', 'turn_time')
 BACKEND_FOLDER_PATH = os.environ['BACKEND_FOLDER_PATH']
 WORK_DIR = '/root/backend'
 
+TURN_TIME_PRETRAINED_PATH = os.environ.get(
+    'TURN_TIME_PRETRAINED_PATH',
+    'algorithms/gait_basic/gait_study_semi_turn_time/weights/semi_vanilla_v2/gait-turn-time.pth',
+)
+
+# float32, torchscript or int8 (see utils/model_variants.py)
+SIGNAL_MODEL_VARIANT = os.environ.get('SIGNAL_MODEL_VARIANT', 'float32')
+
 app = Celery(
     'tasks',
     broker=CELERY_BROKER_URL,
@@ -37,6 +49,17 @@ app = Celery(
 )
 
 
+@worker_init.connect
+def preload_models(sender=None, **kwargs):
+    # load the weights once in the parent process so that every (recycled) pool process
+    # inherits the frozen model instead of calling torch.load per request
+    if sender is not None and sender.app is not app:
+        return
+    if os.path.exists(TURN_TIME_PRETRAINED_PATH):
+        get_turn_time_model(TURN_TIME_PRETRAINED_PATH, variant=SIGNAL_MODEL_VARIANT)
+    model_registry.print_report()
+
+
 class TurnTimeTaskRunner(Runner):
     def __init__(
         self,
@@ -90,6 +113,7 @@ class TurnTimeTaskRunner(Runner):
         self.data_synchronizer.download(
             src=self.input_3dkeypoint_path_remote,
             des=self.input_3dkeypoint_path_local,
+            cached=True,
         )
 
     def upload_data(self):
@@ -104,6 +128,7 @@ class TurnTimeTaskRunner(Runner):
             turn_time_pretrained_path=self.config['turn_time_pretrained_path'],
             path_to_npz=self.input_3dkeypoint_path_local,
             return_raw_prediction=True,
+            variant=SIGNAL_MODEL_VARIANT,
         )
 
         with open(self.output_raw_turn_time_prediction_path_local, 'wb') as handle:
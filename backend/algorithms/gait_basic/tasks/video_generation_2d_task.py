@@ -7,6 +7,8 @@ from redis import Redis
 
 from algorithms._runner import Runner
 from algorithms.gait_basic.utils.make_video import render_detectron_2d_with_target_box
+from algorithms.gait_basic.utils.render import RenderVariant
+from algorithms.gait_basic.utils.video_encoder import VideoEncoder
 from settings import SYNC_FILE_SERVER_RESULT_PATH
 from utils.synchronizer import DataSynchronizer
 
@@ -135,15 +137,12 @@ class VideoGeneration2DTaskRunner(Runner):
             'render-black-background.mp4',
         )
 
-        # meta
-        self.output_shown_mp4_path_temp_local = self.output_shown_mp4_path_local + '.tmp.mp4'
-        self.output_shown_black_background_mp4_path_temp_local = self.output_shown_black_background_mp4_path_local + '.tmp.mp4'  # noqa
-
     def fetch_data(self):
         self.update_state(state='PROGRESS', meta={'progress': 0, 'stage': 'fetching data'})
         self.data_synchronizer.download(
             src=self.input_mp4_path_remote,
             des=self.input_mp4_path_local,
+            cached=True,
         )
         self.data_synchronizer.download(
             src=self.input_detectron_2d_path_remote,
@@ -170,25 +169,22 @@ class VideoGeneration2DTaskRunner(Runner):
         )
 
     def execute(self):
+        # both videos in one decode of the input
         render_detectron_2d_with_target_box(
             video_path=self.input_mp4_path_local,
             detectron_2d_path=self.input_detectron_2d_path_local,
             targeted_person_bboxes_path=self.input_targeted_person_bboxes_path_local,
             tt_pickle_path=self.input_raw_turn_time_prediction_path_local,
-            output_video_path=self.output_shown_mp4_path_temp_local,
-        )
-        # browser mp4v encoding issue -> convert to h264
-        os.system(f'ffmpeg -y -i {self.output_shown_mp4_path_temp_local} -movflags +faststart -vcodec libx264 -f mp4 {self.output_shown_mp4_path_local}')  # noqa
-
-        render_detectron_2d_with_target_box(
-            video_path=self.input_mp4_path_local,
-            detectron_2d_path=self.input_detectron_2d_path_local,
-            targeted_person_bboxes_path=self.input_targeted_person_bboxes_path_local,
-            tt_pickle_path=self.input_raw_turn_time_prediction_path_local,
-            output_video_path=self.output_shown_black_background_mp4_path_temp_local,
-            draw_background=False,
+            variants=[
+                RenderVariant(self.output_shown_mp4_path_local),
+                RenderVariant(
+                    self.output_shown_black_background_mp4_path_local,
+                    draw_background=False,
+                ),
+            ],
+            # h264 for the browsers
+            encoder=VideoEncoder.from_env(),
         )
-        os.system(f'ffmpeg -y -i {self.output_shown_black_background_mp4_path_temp_local} -movflags +faststart -vcodec libx264 -f mp4 {self.output_shown_black_background_mp4_path_local}')  # noqa
 
     def clear(self):
         shutil.rmtree(os.path.join(WORKER_WORKING_DIR_PATH, self.request_uuid))
@@ -8,6 +8,8 @@ from redis import Redis
 from algorithms._runner import Runner
 from algorithms.gait_basic.utils.docker_utils import run_container
 from algorithms.gait_basic.utils.make_video import new_render
+from algorithms.gait_basic.utils.render import RenderVariant
+from algorithms.gait_basic.utils.video_encoder import VideoEncoder
 from settings import SYNC_FILE_SERVER_RESULT_PATH
 from utils.synchronizer import DataSynchronizer
 
@@ -166,8 +168,6 @@ class VideoGeneration3DTaskRunner(Runner):
             'out',
             f'{self.file_id}-rendered-black-background.mp4',
         )
-        self.output_shown_mp4_path_temp_local = self.output_shown_mp4_path_local + '.tmp.mp4'
-        self.output_shown_black_background_mp4_path_temp_local = self.output_shown_black_background_mp4_path_local + '.tmp.mp4'  # noqa
 
         if self.input_json_folder_remote[-1] != '/':
             self.input_json_folder_remote += '/'
@@ -180,11 +180,13 @@ class VideoGeneration3DTaskRunner(Runner):
         self.data_synchronizer.download(
             src=self.input_mp4_path_remote,
             des=self.input_mp4_path_local,
+            cached=True,
         )
         self.data_synchronizer.download_folder(
             src_folder=self.input_json_folder_remote,
             des_folder=self.input_json_folder_local,
-        )
+            bundle=True,  # unpacked if uploaded as a bundle, file by file otherwise
+        ).raise_for_failures()
         self.data_synchronizer.download(
             src=self.input_targeted_person_bboxes_path_remote,
             des=self.input_targeted_person_bboxes_path_local,
@@ -192,6 +194,7 @@ class VideoGeneration3DTaskRunner(Runner):
         self.data_synchronizer.download(
             src=self.input_custom_dataset_path_remote,
             des=self.input_custom_dataset_path_local,
+            cached=True,
         )
         self.data_synchronizer.download(
             src=self.input_raw_turn_time_prediction_path_remote,
@@ -257,25 +260,22 @@ class VideoGeneration3DTaskRunner(Runner):
         )
 
         # (openpose + box) + turning; (openpose + box) is on video_path
+        # and the same with black background, in one pass over both rendered videos
         new_render(
             video_path=self.meta_rendered_mp4_path_local,
             detectron_custom_dataset_path=self.input_custom_dataset_path_local,
             tt_pickle_path=self.input_raw_turn_time_prediction_path_local,
-            output_video_path=self.output_shown_mp4_path_temp_local,
-            draw_keypoint=False,
-        )
-        # browser mp4v encoding issue -> convert to h264
-        os.system(f'ffmpeg -y -i {self.output_shown_mp4_path_temp_local} -movflags +faststart -vcodec libx264 -f mp4 {self.output_shown_mp4_path_local}')  # noqa
-
-        # for black background
-        new_render(
-            video_path=self.meta_rendered_black_background_mp4_path_local,
-            detectron_custom_dataset_path=self.input_custom_dataset_path_local,
-            tt_pickle_path=self.input_raw_turn_time_prediction_path_local,
-            output_video_path=self.output_shown_black_background_mp4_path_temp_local,
             draw_keypoint=False,
+            variants=[
+                RenderVariant(self.output_shown_mp4_path_local),
+                RenderVariant(
+                    self.output_shown_black_background_mp4_path_local,
+                    video_path=self.meta_rendered_black_background_mp4_path_local,
+                ),
+            ],
+            # h264 for the browsers
+            encoder=VideoEncoder.from_env(),
         )
-        os.system(f'ffmpeg -y -i {self.output_shown_black_background_mp4_path_temp_local} -movflags +faststart -vcodec libx264 -f mp4 {self.output_shown_black_background_mp4_path_local}')  # noqa
 
     def clear(self):
         shutil.rmtree(os.path.join(WORKER_WORKING_DIR_PATH, self.request_uuid))
@@ -0,0 +1,110 @@
+import gc
+import pickle
+
+import numpy as np
+import torch
+
+from ..batch_scoring import Trial, iterate_packed_batches, score_trials
+from ..depth_alg.inference import depth_simple_inference
+from ..depth_alg.model import SignalNet as DepthSignalNet
+from ..gait_study_semi_turn_time.inference import turn_time_simple_inference
+from ..gait_study_semi_turn_time.src.datasets import GaitTrialInstanceSimple
+from ..gait_study_semi_turn_time.src.models import SignalNet as TurnTimeSignalNet
+
+
+def test_iterate_packed_batches():
+    windows_list = [np.full((n, 2, 3), n) for n in (5, 0, 2, 7)]
+    batches = list(iterate_packed_batches(windows_list, batch_size=4))
+    assert [len(batch) for batch in batches] == [4, 4, 4, 2]
+    assert all(batch.dtype == np.float32 for batch in batches)
+    np.testing.assert_array_equal(
+        np.concatenate(batches)[:, 0, 0], [5] * 5 + [2] * 2 + [7] * 7,
+    )
+
+
+def test_score_trials_matches_single_trial_inference(tmp_path):
+    torch.manual_seed(0)
+    turn_time_pretrained_path = str(tmp_path / 'turn-time.pth')
+    depth_pretrained_path = str(tmp_path / 'depth.pth')
+    torch.save(TurnTimeSignalNet(num_of_class=2).state_dict(), turn_time_pretrained_path)
+    torch.save(DepthSignalNet(in_channels=86, num_of_class=6).state_dict(), depth_pretrained_path)
+
+    rng = np.random.default_rng(0)
+    trials = []
+    for idx, num_frames in enumerate((150, 40, 300)):
+        keypoints_3d_path = str(tmp_path / f'{idx}.mp4.npy')
+        custom_dataset_path = str(tmp_path / f'{idx}-custom-dataset.npz')
+        np.save(keypoints_3d_path, rng.normal(size=(num_frames, 17, 3)).astype('float32'))
+        keypoints_2d = rng.random((num_frames, 17, 2)).astype('float32')
+        np.savez_compressed(
+            custom_dataset_path, positions_2d={f'{idx}.mp4': {'custom': [keypoints_2d]}},
+        )
+        trials.append(
+            Trial(str(idx), keypoints_3d_path, custom_dataset_path, height=170, focal_length=1500),
+        )
+
+    results = score_trials(
+        trials,
+        turn_time_pretrained_path=turn_time_pretrained_path,
+        depth_pretrained_path=depth_pretrained_path,
+        batch_size=64,
+    )
+
+    for trial, result in zip(trials, results):
+        tt, raw_tt_prediction = turn_time_simple_inference(
+            turn_time_pretrained_path, trial.keypoints_3d_path, return_raw_prediction=True,
+        )
+        assert result['tt'] == tt
+
+        turn_time_mask_path = str(tmp_path / f'{trial.trial_id}-tt.pickle')
+        with open(turn_time_mask_path, 'wb') as handle:
+            pickle.dump(raw_tt_prediction, handle)
+        final_output, gait_parameters = depth_simple_inference(
+            detectron_2d_single_person_keypoints_path=trial.custom_dataset_path,
+            rendered_3d_single_person_keypoints_path=trial.keypoints_3d_path,
+            height=170,
+            model_focal_length=1392.0,
+            used_camera_focal_length=1500,
+            depth_pretrained_path=depth_pretrained_path,
+            turn_time_mask_path=turn_time_mask_path,
+        )
+        assert result['gait_parameters'] == gait_parameters
+        np.testing.assert_equal(result['final_output'], final_output)
+
+
+def test_score_trials_records_bad_trials(tmp_path):
+    torch.manual_seed(0)
+    turn_time_pretrained_path = str(tmp_path / 'turn-time.pth')
+    depth_pretrained_path = str(tmp_path / 'depth.pth')
+    torch.save(TurnTimeSignalNet(num_of_class=2).state_dict(), turn_time_pretrained_path)
+    torch.save(DepthSignalNet(in_channels=86, num_of_class=6).state_dict(), depth_pretrained_path)
+
+    rng = np.random.default_rng(0)
+    trials = []
+    # the 2D keypoints of the second trial are 5 frames shorter than its 3D keypoints
+    for idx, (num_frames, num_frames_2d) in enumerate(((150, 150), (150, 145), (120, 120))):
+        keypoints_3d_path = str(tmp_path / f'{idx}.mp4.npy')
+        custom_dataset_path = str(tmp_path / f'{idx}-custom-dataset.npz')
+        np.save(keypoints_3d_path, rng.normal(size=(num_frames, 17, 3)).astype('float32'))
+        keypoints_2d = rng.random((num_frames_2d, 17, 2)).astype('float32')
+        np.savez_compressed(
+            custom_dataset_path, positions_2d={f'{idx}.mp4': {'custom': [keypoints_2d]}},
+        )
+        trials.append(Trial(str(idx), keypoints_3d_path, custom_dataset_path, height=170))
+
+    kwargs = {
+        'turn_time_pretrained_path': turn_time_pretrained_path,
+        'depth_pretrained_path': depth_pretrained_path,
+        'batch_size': 64,
+    }
+    results = score_trials(trials, **kwargs)
+
+    assert [result['trial_id'] for result in results] == ['0', '1', '2']
+    assert set(results[1]) == {'trial_id', 'error'}
+    assert results[1]['error'].startswith('ValueError')
+    np.testing.assert_equal(results[0], score_trials(trials[:1], **kwargs)[0])
+    np.testing.assert_equal(results[2], score_trials(trials[2:], **kwargs)[0])
+
+    # a scored shard does not keep its trials alive in the worker
+    gc.collect()
+    assert not any(isinstance(obj, GaitTrialInstanceSimple) for obj in gc.get_objects())
@@ -1,5 +1,6 @@
 import os
 import shutil
+import typing as t
 
 
 def avg(left_value: float, right_value: float, left_num: int, right_num: int) -> float:
@@ -29,7 +30,15 @@ def add_newline_if_missing(file_path: str):
             return False
 
 
-def fix_timestamp_file(timestamp_file_path: str, json_path: str):
+def fix_timestamp_file(
+    timestamp_file_path: str,
+    json_path: t.Optional[str] = None,
+    num_frames: t.Optional[int] = None,
+):
+    """
+    Make the timestamp file have one line per frame; the number of frames is given or counted
+    from the json files of `json_path`
+    """
     indices = []
     mss = []
     cnt = 0
@@ -39,11 +48,14 @@ def fix_timestamp_file(timestamp_file_path: str, json_path: str):
             indices.append(int(idx))
             mss.append(int(ms))
             cnt += 1
-    json_cnt = 0
-    for filename in os.listdir(json_path):
-        if not filename.endswith('.json'):
-            continue
-        json_cnt += 1
+    if num_frames is not None:
+        json_cnt = num_frames
+    else:
+        json_cnt = 0
+        for filename in os.listdir(json_path):
+            if not filename.endswith('.json'):
+                continue
+            json_cnt += 1
 
     if json_cnt < cnt:
         print('Number of timestamps is more than frames')
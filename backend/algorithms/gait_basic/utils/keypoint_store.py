@@ -0,0 +1,345 @@
+"""
+OpenPose keypoints of a whole video in one array, built once from the `--write-json` folder.
+
+The keypoints are a [T, P, J, 3] float64 array (x, y, probability of J joints for up to P people
+per frame; the slots after `num_people[frame]` are zeros) and the index keeps the frame index and
+the json file name of every frame. The store is saved as `<name>.npy`, which can be memory-mapped,
+and `<name>-index.npz`.
+
+The json folder is read and written in chunks of frames over a thread or process pool; orjson is
+used for parsing when it is installed.
+"""
+import json
+import os
+import time
+import typing as t
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import numpy.typing as npt
+
+from .calculate import fix_timestamp_file
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+LEFT_ANKLE = 14
+RIGHT_ANKLE = 11
+NUM_JOINTS = 25  # BODY_25
+OPENPOSE_VERSION = 1.3
+THREAD = 'thread'
+PROCESS = 'process'
+EXECUTORS = [THREAD, PROCESS]
+CHUNKS_PER_WORKER = 4
+KEYPOINTS_JSON_SUFFIX = '_keypoints.json'
+
+
+def get_index_path(keypoints_path: str) -> str:
+    return f'{os.path.splitext(keypoints_path)[0]}-index.npz'
+
+
+def parse_frame_idx(filename: str) -> int:
+    # <name>_<frame idx>_keypoints.json
+    return int(filename.split('_')[1])
+
+
+def _empty_person(pose_keypoints_2d: t.List[float]) -> t.Dict[str, t.Any]:
+    # only the body keypoints are kept; face and hands are not estimated by the openpose task
+    return {
+        'person_id': [-1],
+        'pose_keypoints_2d': pose_keypoints_2d,
+        'face_keypoints_2d': [],
+        'hand_left_keypoints_2d': [],
+        'hand_right_keypoints_2d': [],
+        'pose_keypoints_3d': [],
+        'face_keypoints_3d': [],
+        'hand_left_keypoints_3d': [],
+        'hand_right_keypoints_3d': [],
+    }
+
+
+def _loads(data: bytes) -> t.Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _dumps(obj: t.Any) -> bytes:
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj).encode()
+
+
+def _read_frames(
+    json_path: str,
+    filenames: t.List[str],
+) -> t.Tuple[npt.NDArray[np.float64], npt.NDArray[np.int64], t.Optional[float]]:
+    """
+    Read a chunk of json files -> ([n, P, J, 3] keypoints, [n] number of people, version)
+    """
+    frames = []
+    version = None
+    for filename in filenames:
+        with open(os.path.join(json_path, filename), 'rb') as f:
+            keypoint = _loads(f.read())
+        version = keypoint.get('version', version)
+        frames.append([person['pose_keypoints_2d'] for person in keypoint['people']])
+
+    num_people = np.array([len(people) for people in frames], dtype=np.int64)
+    num_joints = next(
+        (len(people[0]) // 3 for people in frames if len(people) > 0), NUM_JOINTS,
+    )
+    keypoints = np.zeros(
+        (len(frames), num_people.max(initial=0), num_joints, 3), dtype=np.float64,
+    )
+    for frame_idx, people in enumerate(frames):
+        if len(people) > 0:
+            keypoints[frame_idx, :len(people)] = np.array(people).reshape(len(people), -1, 3)
+    return keypoints, num_people, version
+
+
+def _write_frames(
+    json_path: str,
+    filenames: t.List[str],
+    keypoints: npt.NDArray[np.float64],
+    num_people: npt.NDArray[np.int64],
+    version: float,
+) -> None:
+    for filename, frame_keypoints, frame_num_people in zip(filenames, keypoints, num_people):
+        people = [
+            _empty_person(frame_keypoints[person].reshape(-1).tolist())
+            for person in range(frame_num_people)
+        ]
+        with open(os.path.join(json_path, filename), 'wb') as f:
+            f.write(_dumps({'version': version, 'people': people}))
+
+
+def _split(num_frames: int, workers: int) -> t.List[slice]:
+    num_chunks = min(max(workers, 1) * CHUNKS_PER_WORKER, num_frames)
+    bounds = np.linspace(0, num_frames, num_chunks + 1).astype(int).tolist()
+    return [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def _map_chunks(
+    fn: t.Callable[..., t.Any],
+    chunks: t.List[t.Tuple[t.Any, ...]],
+    workers: int = 1,
+    executor: str = THREAD,
+) -> t.List[t.Any]:
+    """
+    Run `fn(*chunk)` for every chunk in order, inline for a single worker
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f'Unknown executor {executor}, should be one of {EXECUTORS}')
+    if workers <= 1 or len(chunks) <= 1:
+        return [fn(*chunk) for chunk in chunks]
+    # processes parse in parallel; threads overlap the file io only (the parsing holds the GIL)
+    pool = ProcessPoolExecutor if executor == PROCESS else ThreadPoolExecutor
+    with pool(max_workers=workers) as pool_executor:
+        return list(pool_executor.map(fn, *zip(*chunks)))
+
+
+class KeypointStore:
+
+    def __init__(
+        self,
+        keypoints: npt.NDArray[np.float64],
+        num_people: npt.NDArray[np.int64],
+        frame_indices: npt.NDArray[np.int64],
+        filenames: t.List[str],
+        version: float = OPENPOSE_VERSION,
+    ):
+        self.keypoints = keypoints  # T, P, J, 3
+        self.num_people = num_people  # T
+        self.frame_indices = frame_indices  # T
+        self.filenames = filenames
+        self.version = version
+        # frames changed by the filters (the ones to re-emit)
+        self.modified = np.zeros(len(filenames), dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    @classmethod
+    def from_openpose_json(
+        cls,
+        json_path: str,
+        workers: int = 1,
+        executor: str = THREAD,
+    ) -> 'KeypointStore':
+        filenames = sorted(
+            (
+                filename for filename in os.listdir(json_path)
+                if filename.endswith(KEYPOINTS_JSON_SUFFIX)
+            ),
+            key=parse_frame_idx,
+        )
+        chunks = _map_chunks(
+            _read_frames,
+            [(json_path, filenames[s]) for s in _split(len(filenames), workers)],
+            workers=workers,
+            executor=executor,
+        )
+
+        num_people = np.concatenate(
+            [chunk_num_people for _, chunk_num_people, _ in chunks] + [np.zeros(0, np.int64)],
+        )
+        num_joints = next(
+            (chunk.shape[2] for chunk, _, _ in chunks if chunk.shape[1] > 0), NUM_JOINTS,
+        )
+        keypoints = np.zeros(
+            (len(filenames), max(num_people.max(initial=0), 1), num_joints, 3), dtype=np.float64,
+        )
+        start = 0
+        for chunk, _, _ in chunks:
+            keypoints[start: start + len(chunk), :chunk.shape[1]] = chunk
+            start += len(chunk)
+        version = next(
+            (v for _, _, v in reversed(chunks) if v is not None), OPENPOSE_VERSION,
+        )
+
+        frame_indices = np.array([parse_frame_idx(name) for name in filenames], dtype=np.int64)
+        return cls(keypoints, num_people, frame_indices, filenames, version=version)
+
+    @classmethod
+    def load(cls, keypoints_path: str, mmap_mode: t.Optional[str] = 'r') -> 'KeypointStore':
+        index = np.load(get_index_path(keypoints_path))
+        return cls(
+            np.load(keypoints_path, mmap_mode=mmap_mode),
+            index['num_people'],
+            index['frame_indices'],
+            index['filenames'].tolist(),
+            version=float(index['version']),
+        )
+
+    def save(self, keypoints_path: str) -> None:
+        np.save(keypoints_path, np.asarray(self.keypoints))
+        np.savez(
+            get_index_path(keypoints_path),
+            num_people=self.num_people,
+            frame_indices=self.frame_indices,
+            filenames=np.array(self.filenames),
+            version=self.version,
+        )
+
+    def people_mask(self) -> npt.NDArray[bool]:
+        # T, P: the slots holding a detected person
+        return np.arange(self.keypoints.shape[1]) < self.num_people[:, None]
+
+    def remove_non_target_person(
+        self,
+        targeted_person_bboxes: t.List[t.Tuple[int, int, int, int]],
+    ) -> None:
+        """
+        `track.remove_non_target_person` on the store: in every frame with people, keep the first
+        person whose both ankles are inside the targeted bbox of the frame, or no one
+        """
+        bboxes = np.full((len(self), 4), np.nan)
+        for frame, frame_idx in enumerate(self.frame_indices.tolist()):
+            if len(targeted_person_bboxes[frame_idx]) != 0:
+                bboxes[frame] = targeted_person_bboxes[frame_idx]
+        left, top, width, height = (bboxes[:, i, None, None] for i in range(4))
+
+        ankles = self.keypoints[:, :, [RIGHT_ANKLE, LEFT_ANKLE], :2]  # T, P, 2, 2
+        x, y = ankles[..., 0], ankles[..., 1]
+        inside = (x >= left) & (x <= left + width) & (y >= top) & (y <= top + height)
+        candidates = inside.all(axis=2) & self.people_mask()  # T, P
+
+        has_people = self.num_people > 0
+        selected = candidates.any(axis=1)
+        keypoints = np.zeros_like(self.keypoints[:, :1])
+        keypoints[selected, 0] = self.keypoints[selected, candidates[selected].argmax(axis=1)]
+
+        self.keypoints = keypoints
+        self.num_people = np.where(has_people & selected, 1, 0)
+        self.modified |= has_people
+
+    def set_zero_prob_for_keypoint_before_start_line(self, start_line: int = 1820) -> None:
+        """
+        `track.set_zero_prob_for_keypoint_before_start_line` on the store: zero the ankle
+        probabilities of the first person until one of its detected ankles passes the start line
+        """
+        right = self.keypoints[:, 0, RIGHT_ANKLE]
+        left = self.keypoints[:, 0, LEFT_ANKLE]
+        passed = ((right[:, 1] < start_line) & (right[:, 2] != 0)) | (
+            (left[:, 1] < start_line) & (left[:, 2] != 0)
+        )
+        before_start_line = (self.num_people > 0) & ~passed
+
+        if isinstance(self.keypoints, np.memmap):
+            self.keypoints = np.array(self.keypoints)  # the saved store stays untouched
+        self.keypoints[before_start_line, 0, RIGHT_ANKLE, 2] = 0
+        self.keypoints[before_start_line, 0, LEFT_ANKLE, 2] = 0
+        self.modified |= before_start_line
+
+    def to_openpose_json(
+        self,
+        json_path: str,
+        only_modified: bool = False,
+        workers: int = 1,
+        executor: str = THREAD,
+    ) -> None:
+        """
+        Write the frames as OpenPose json files (all of them or the modified ones), for the
+        consumers of the json folder such as the ZED depth sensing
+        """
+        os.makedirs(json_path, exist_ok=True)
+        frames = np.flatnonzero(self.modified) if only_modified else np.arange(len(self))
+        chunks = [
+            (
+                json_path,
+                [self.filenames[frame] for frame in frames[s].tolist()],
+                np.asarray(self.keypoints[frames[s]]),
+                self.num_people[frames[s]],
+                self.version,
+            )
+            for s in _split(len(frames), workers)
+        ]
+        _map_chunks(_write_frames, chunks, workers=workers, executor=executor)
+
+
+def postprocess_openpose_json(
+    json_path: str,
+    keypoints_path: str,
+    targeted_person_bboxes: t.List[t.Tuple[int, int, int, int]],
+    start_line: int,
+    timestamp_file_path: str,
+    workers: int = 1,
+    executor: str = THREAD,
+) -> t.Tuple[KeypointStore, t.Dict[str, float]]:
+    """
+    The post-processing of the openpose json folder in one pass: every json file is read once,
+    the non-target people are removed, the ankles before the start line are zeroed, the store is
+    saved to `keypoints_path`, the modified frames are written back and the timestamp file is
+    fixed to the number of frames.
+    Return the store and the seconds spent in every phase
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    def lap(phase: str) -> None:
+        nonlocal start
+        now = time.perf_counter()
+        timings[phase] = now - start
+        start = now
+
+    store = KeypointStore.from_openpose_json(json_path, workers=workers, executor=executor)
+    if len(store) == 0:
+        # not to empty the timestamp file
+        raise ValueError(f'No OpenPose json in {json_path}')
+    lap('read')
+    store.remove_non_target_person(targeted_person_bboxes)
+    store.set_zero_prob_for_keypoint_before_start_line(start_line=start_line)
+    lap('filter')
+    store.save(keypoints_path)
+    lap('save')
+    store.to_openpose_json(json_path, only_modified=True, workers=workers, executor=executor)
+    lap('write')
+    fix_timestamp_file(timestamp_file_path=timestamp_file_path, num_frames=len(store))
+    lap('timestamp')
+
+    print(
+        f'Post-processed {len(store)} frames ({int(store.modified.sum())} rewritten, '
+        f'{workers} {executor} workers, orjson: {orjson is not None}): '
+        + ', '.join(f'{phase} {seconds:.3f}s' for phase, seconds in timings.items()),
+    )
+    return store, timings
@@ -0,0 +1,186 @@
+"""
+IoU matching of a target bbox against the candidate bboxes of a frame (or of many frames at once).
+
+Bboxes are in a format of (left, top, width, height). The candidates of many frames are packed
+into one [K, 4] array with offsets, so that `boxes[offsets[i]: offsets[i + 1]]` are the
+candidates of frame i.
+"""
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+
+
+IOU_THRESHOLD = 0.5
+
+
+def calculate_iou(
+    bbox1: t.Tuple[int, int, int, int],
+    bbox2: t.Tuple[int, int, int, int],
+) -> float:
+    """
+    Calculate IOU of two bbox; each bbox in a format of (left, top, width, height)
+    """
+    # Unpack the bounding boxes
+    left1, top1, width1, height1 = bbox1
+    left2, top2, width2, height2 = bbox2
+
+    # Calculate the bottom-right corners
+    right1, bottom1 = left1 + width1, top1 + height1
+    right2, bottom2 = left2 + width2, top2 + height2
+
+    # Calculate intersection coordinates
+    inter_left = max(left1, left2)
+    inter_top = max(top1, top2)
+    inter_right = min(right1, right2)
+    inter_bottom = min(bottom1, bottom2)
+
+    # Calculate intersection area
+    inter_width = inter_right - inter_left
+    inter_height = inter_bottom - inter_top
+    if inter_width > 0 and inter_height > 0:  # Check if there is an intersection
+        intersection_area = inter_width * inter_height
+    else:
+        intersection_area = 0
+
+    # Calculate union area
+    union_area = width1 * height1 + width2 * height2 - intersection_area
+
+    # Calculate Intersection over Union (IoU)
+    iou = intersection_area / union_area
+
+    return iou
+
+
+def _as_float(boxes: npt.ArrayLike) -> npt.NDArray:
+    # float boxes (e.g. float32 detections) keep their precision, like the scalar version
+    boxes = np.asarray(boxes)
+    if not np.issubdtype(boxes.dtype, np.floating):
+        boxes = boxes.astype(np.float64)
+    return boxes
+
+
+def xyxy_to_xywh(boxes: npt.ArrayLike) -> npt.NDArray:
+    """
+    (left, top, right, bottom, ...) -> (left, top, width, height)
+    """
+    boxes = _as_float(boxes)
+    return np.concatenate((boxes[..., :2], boxes[..., 2:4] - boxes[..., :2]), axis=-1)
+
+
+def pairwise_iou(boxes1: npt.ArrayLike, boxes2: npt.ArrayLike) -> npt.NDArray:
+    """
+    IOU of broadcastable [..., 4] arrays of bboxes, e.g. [N, 1, 4] and [M, 4] give an [N, M] matrix
+    """
+    boxes2 = _as_float(boxes2)
+    boxes1 = np.asarray(boxes1, dtype=np.result_type(boxes2.dtype, np.float32))
+    left1, top1, width1, height1 = boxes1[..., 0], boxes1[..., 1], boxes1[..., 2], boxes1[..., 3]
+    left2, top2, width2, height2 = boxes2[..., 0], boxes2[..., 1], boxes2[..., 2], boxes2[..., 3]
+
+    inter_width = np.minimum(left1 + width1, left2 + width2) - np.maximum(left1, left2)
+    inter_height = np.minimum(top1 + height1, top2 + height2) - np.maximum(top1, top2)
+    # no intersection unless both are positive
+    intersection_area = np.maximum(inter_width, 0) * np.maximum(inter_height, 0)
+    union_area = width1 * height1 + width2 * height2 - intersection_area
+    # degenerate (zero area) bboxes give NaN, where the scalar version raises
+    return intersection_area / union_area
+
+
+def iou_matrix(boxes1: npt.ArrayLike, boxes2: npt.ArrayLike) -> npt.NDArray:
+    """
+    IOU of every pair of an [N, 4] and an [M, 4] array of bboxes -> [N, M]
+    """
+    boxes1 = np.asarray(boxes1).reshape(-1, 1, 4)
+    boxes2 = np.asarray(boxes2).reshape(1, -1, 4)
+    return pairwise_iou(boxes1, boxes2)
+
+
+def match_target(
+    target_bbox: t.Tuple[int, int, int, int],
+    bboxes: npt.ArrayLike,
+    threshold: float = IOU_THRESHOLD,
+) -> t.Optional[int]:
+    """
+    Return the index of the bbox overlapping the most with the target (the first one on ties),
+    None if no IOU reaches the threshold
+    """
+    bboxes = np.asarray(bboxes).reshape(-1, 4)
+    if len(bboxes) == 0:
+        return None
+    ious = pairwise_iou(target_bbox, bboxes)
+    best = int(np.argmax(ious))
+    if not ious[best] >= threshold:
+        return None
+    return best
+
+
+def pack_frames(
+    frame_bboxes: t.Sequence[npt.ArrayLike],
+    columns: int = 4,
+) -> t.Tuple[npt.NDArray, npt.NDArray[np.int64]]:
+    """
+    Pack the [n_i, >= columns] rows of every frame into ([K, columns] rows, [T + 1] offsets)
+    """
+    counts = np.array([len(bboxes) for bboxes in frame_bboxes], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    nonempty = [np.asarray(bboxes)[:, :columns] for bboxes in frame_bboxes if len(bboxes) > 0]
+    if len(nonempty) == 0:
+        return np.zeros((0, columns)), offsets
+    return np.concatenate(nonempty, axis=0), offsets
+
+
+def targets_to_array(target_bboxes: t.Sequence[t.Sequence[float]]) -> npt.NDArray[np.float64]:
+    """
+    Target bboxes of every frame ([T, 4]); a frame without a target (empty bbox) is NaN
+    """
+    targets = np.full((len(target_bboxes), 4), np.nan)
+    for idx, bbox in enumerate(target_bboxes):
+        if len(bbox) != 0:
+            targets[idx] = bbox
+    return targets
+
+
+def segment_argmax(
+    values: npt.NDArray,
+    offsets: npt.NDArray[np.int64],
+) -> t.Tuple[npt.NDArray[np.int64], npt.NDArray]:
+    """
+    Index (within its segment, first one on ties) and value of the max of every segment
+    `values[offsets[i]: offsets[i + 1]]`; -1 and NaN for an empty segment.
+    NaN values are never the max
+    """
+    num_segments = len(offsets) - 1
+    counts = np.diff(offsets)
+    segment_ids = np.repeat(np.arange(num_segments), counts)
+
+    maxes = np.full(num_segments, -np.inf)
+    valid = ~np.isnan(values)
+    np.maximum.at(maxes, segment_ids[valid], values[valid])
+
+    is_max = valid & (values == maxes[segment_ids])
+    max_rows = np.flatnonzero(is_max)
+    segments_with_max, first = np.unique(segment_ids[max_rows], return_index=True)
+
+    argmax = np.full(num_segments, -1, dtype=np.int64)
+    argmax[segments_with_max] = max_rows[first] - offsets[segments_with_max]
+    maxes[argmax < 0] = np.nan
+    return argmax, maxes
+
+
+def match_targets(
+    target_bboxes: npt.ArrayLike,
+    bboxes: npt.ArrayLike,
+    offsets: npt.NDArray[np.int64],
+    threshold: float = IOU_THRESHOLD,
+) -> npt.NDArray[np.int64]:
+    """
+    `match_target` for every frame at once: targets [T, 4] (NaN for no target) against the
+    packed candidates. Return the index of the match within each frame, -1 for no match
+    """
+    target_bboxes = np.asarray(target_bboxes).reshape(-1, 4)
+    counts = np.diff(offsets)
+    ious = pairwise_iou(np.repeat(target_bboxes, counts, axis=0), np.asarray(bboxes).reshape(-1, 4))
+    argmax, maxes = segment_argmax(ious, offsets)
+    with np.errstate(invalid='ignore'):
+        argmax[~(maxes >= threshold)] = -1
+    return argmax
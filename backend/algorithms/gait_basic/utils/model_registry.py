@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+import typing as t
+
+import torch.nn as nn
+
+
+def get_resident_memory() -> int:
+    """
+    Return the resident set size of the current process in bytes (0 if unavailable)
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def get_model_memory(model: t.Any) -> int:
+    """
+    Return the number of bytes held by the parameters and buffers of a model
+    """
+    if not isinstance(model, nn.Module):
+        return 0
+    num_bytes = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        num_bytes += tensor.numel() * tensor.element_size()
+    return num_bytes
+
+
+def freeze(model: t.Any) -> t.Any:
+    if isinstance(model, nn.Module):
+        model.eval()
+        for parameter in model.parameters():
+            parameter.requires_grad_(False)
+    return model
+
+
+class ModelRegistry:
+    """
+    Process-resident cache of frozen models, so a worker loads every checkpoint once
+    and hands out the same instance to all requests.
+
+    A model is keyed by (name, weight path, device) and is reloaded when the mtime or
+    the size of the weight file changes. A loader is a callable
+    (weight_path: str, device: str) -> model
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(weight_path: str) -> t.Tuple[str, t.Optional[int], t.Optional[int]]:
+        # weight_path can also be a non-file identifier (e.g. a model zoo config)
+        if not os.path.isfile(weight_path):
+            return weight_path, None, None
+        stat = os.stat(weight_path)
+        return os.path.realpath(weight_path), stat.st_mtime_ns, stat.st_size
+
+    def get(
+        self,
+        name: str,
+        weight_path: str,
+        loader: t.Callable[[str, str], t.Any],
+        device: str = 'cpu',
+    ) -> t.Any:
+        path, mtime, size = self.fingerprint(weight_path)
+        key = (name, path, device)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None and entry['fingerprint'] == (mtime, size):
+                entry['hits'] += 1
+                return entry['model']
+
+            rss_before = get_resident_memory()
+            start = time.perf_counter()
+            model = freeze(loader(weight_path, device))
+            load_seconds = time.perf_counter() - start
+            rss_after = get_resident_memory()
+
+            self._models[key] = {
+                'model': model,
+                'fingerprint': (mtime, size),
+                'hits': 0,
+                'load_seconds': load_seconds,
+                'model_bytes': get_model_memory(model),
+                'rss_delta_bytes': max(rss_after - rss_before, 0),
+            }
+            return model
+
+    def report(self) -> t.List[t.Dict[str, t.Any]]:
+        with self._lock:
+            return [
+                {
+                    'name': name,
+                    'weight_path': path,
+                    'device': device,
+                    'hits': entry['hits'],
+                    'load_seconds': entry['load_seconds'],
+                    'model_bytes': entry['model_bytes'],
+                    'rss_delta_bytes': entry['rss_delta_bytes'],
+                }
+                for (name, path, device), entry in self._models.items()
+            ]
+
+    def print_report(self) -> None:
+        for row in self.report():
+            print(
+                f'[model registry] {row["name"]} ({row["device"]}) {row["weight_path"]}: '
+                f'load {row["load_seconds"]:.2f}s, '
+                f'weights {row["model_bytes"] / 2 ** 20:.1f} MiB, '
+                f'rss +{row["rss_delta_bytes"] / 2 ** 20:.1f} MiB, '
+                f'hits {row["hits"]}',
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,148 @@
+"""
+CPU inference variants of a float32 model:
+- torchscript: traced and frozen TorchScript
+- int8: nn.Linear layers dynamically quantized to int8, then traced and frozen
+
+A variant is exported next to the float32 weights as `<weights>.<variant>.pt`, with the
+SHA-256 of the weights it was built from; when it has not been exported, or the weights have
+changed since, it is built from the float32 weights at load time.
+
+Usage (from `backend/`):
+    python3 -m algorithms.gait_basic.utils.model_variants --model turn_time \
+        --weight-path <path to gait-turn-time.pth>
+"""
+import argparse
+import copy
+import hashlib
+import os
+import typing as t
+
+import torch
+import torch.nn as nn
+
+
+FLOAT32 = 'float32'
+TORCHSCRIPT = 'torchscript'
+INT8 = 'int8'
+MODEL_VARIANTS = (FLOAT32, TORCHSCRIPT, INT8)
+WEIGHTS_DIGEST_NAME = 'weights_sha256'
+
+
+def get_variant_path(weight_path: str, variant: str) -> str:
+    root, _ = os.path.splitext(weight_path)
+    return f'{root}.{variant}.pt'
+
+
+def get_weights_digest(weight_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(weight_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_variant_name(name: str, variant: str) -> str:
+    # model registry name; float32 keeps the plain name
+    return name if variant == FLOAT32 else f'{name}:{variant}'
+
+
+def quantize_int8(model: nn.Module) -> nn.Module:
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def to_torchscript(model: nn.Module, example_input: torch.Tensor) -> torch.jit.ScriptModule:
+    # the batch size stays dynamic since the models flatten with x.view(x.size(0), -1)
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(model.eval(), example_input))
+
+
+def build_variant(model: nn.Module, variant: str, example_input: torch.Tensor) -> nn.Module:
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f'Unknown model variant {variant}; expected one of {MODEL_VARIANTS}')
+    model = copy.deepcopy(model).eval()
+    if variant == FLOAT32:
+        return model
+    if variant == INT8:
+        model = quantize_int8(model)
+    return to_torchscript(model, example_input)
+
+
+def export_variants(
+    model: nn.Module,
+    weight_path: str,
+    example_input: torch.Tensor,
+    variants: t.Iterable[str] = (TORCHSCRIPT, INT8),
+) -> t.Dict[str, str]:
+    variant_paths = {}
+    extra_files = {WEIGHTS_DIGEST_NAME: get_weights_digest(weight_path)}
+    for variant in variants:
+        variant_paths[variant] = get_variant_path(weight_path, variant)
+        torch.jit.save(
+            build_variant(model, variant, example_input),
+            variant_paths[variant],
+            _extra_files=extra_files,
+        )
+    return variant_paths
+
+
+def load_model_variant(
+    weight_path: str,
+    build_model: t.Callable[[str], nn.Module],
+    example_input_shape: t.Tuple[int, ...],
+    device: str = 'cpu',
+    variant: str = FLOAT32,
+) -> nn.Module:
+    """
+    Load `variant` of the model whose float32 weights are at `weight_path`;
+    `build_model(weight_path)` returns the float32 model
+    """
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f'Unknown model variant {variant}; expected one of {MODEL_VARIANTS}')
+    if variant == INT8 and device != 'cpu':
+        raise ValueError('The int8 variant only runs on CPU')
+
+    variant_path = get_variant_path(weight_path, variant)
+    if variant != FLOAT32 and os.path.exists(variant_path):
+        extra_files = {WEIGHTS_DIGEST_NAME: ''}
+        model = torch.jit.load(variant_path, map_location=device, _extra_files=extra_files)
+        if extra_files[WEIGHTS_DIGEST_NAME] == get_weights_digest(weight_path).encode():
+            return model
+        print(f'{variant_path} was not exported from {weight_path}, built again')
+
+    model = build_model(weight_path).to(device).eval()
+    if variant == FLOAT32:
+        return model
+    return build_variant(model, variant, torch.zeros(example_input_shape, device=device))
+
+
+def main():
+    from algorithms.gait_basic.depth_alg.inference import (
+        DEPTH_INPUT_SHAPE, build_depth_model,
+    )
+    from algorithms.gait_basic.gait_study_semi_turn_time.inference import (
+        TURN_TIME_INPUT_SHAPE, build_turn_time_model,
+    )
+    models = {
+        'turn_time': (build_turn_time_model, TURN_TIME_INPUT_SHAPE),
+        'depth': (build_depth_model, DEPTH_INPUT_SHAPE),
+    }
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', required=True, choices=sorted(models), type=str)
+    parser.add_argument('--weight-path', required=True, help='float32 weights', type=str)
+    parser.add_argument('--variants', default=f'{TORCHSCRIPT},{INT8}', type=str)
+    args = parser.parse_args()
+
+    build_model, example_input_shape = models[args.model]
+    variant_paths = export_variants(
+        build_model(args.weight_path),
+        args.weight_path,
+        torch.zeros(example_input_shape),
+        variants=args.variants.split(','),
+    )
+    for variant, variant_path in variant_paths.items():
+        print(f'{variant}: {variant_path}')
+
+
+if __name__ == '__main__':
+    main()
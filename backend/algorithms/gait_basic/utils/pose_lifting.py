@@ -0,0 +1,229 @@
+import os
+import typing as t
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from algorithms.gait_basic.utils.model_registry import model_registry
+from algorithms.gait_basic.utils.matching import (
+    IOU_THRESHOLD, match_targets, pack_frames, segment_argmax, targets_to_array, xyxy_to_xywh,
+)
+from algorithms.gait_basic.utils.video_metadata import get_video_metadata
+from algorithms.gait_basic.VideoPose3D.common.generators import (
+    StreamingGenerator, chunk_size_for_memory,
+)
+from algorithms.gait_basic.VideoPose3D.common.model import TemporalModel
+
+
+VIDEOPOSE3D_FOLDER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'VideoPose3D')
+DEFAULT_LIFTING_CHECKPOINT_PATH = os.path.join(
+    VIDEOPOSE3D_FOLDER_PATH, 'checkpoint', 'pretrained_h36m_detectron_coco.bin',
+)
+DEFAULT_DETECTRON_CFG = 'COCO-Keypoints/keypoint_rcnn_R_101_FPN_3x.yaml'
+
+NUM_JOINTS = 17
+FILTER_WIDTHS = [3, 3, 3, 3, 3]
+CHANNELS = 1024
+
+# same layouts as data/data_utils.py (coco input) and the h36m skeleton (3D output)
+COCO_METADATA = {
+    'layout_name': 'coco',
+    'num_joints': 17,
+    'keypoints_symmetry': [
+        [1, 3, 5, 7, 9, 11, 13, 15],
+        [2, 4, 6, 8, 10, 12, 14, 16],
+    ],
+}
+H36M_JOINTS_LEFT = [4, 5, 6, 11, 12, 13]
+H36M_JOINTS_RIGHT = [1, 2, 3, 14, 15, 16]
+
+
+def get_default_device() -> str:
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def load_lifting_model(checkpoint_path: str, device: str = 'cpu') -> nn.ModuleDict:
+    """
+    Load the VideoPose3D positional model (and the trajectory model if the checkpoint has one)
+    """
+    checkpoint = torch.load(checkpoint_path, map_location=lambda storage, loc: storage)
+    models = nn.ModuleDict()
+    models['pos'] = TemporalModel(
+        NUM_JOINTS, 2, NUM_JOINTS, filter_widths=FILTER_WIDTHS, channels=CHANNELS,
+    )
+    models['pos'].load_state_dict(checkpoint['model_pos'])
+    if checkpoint.get('model_traj') is not None:
+        models['traj'] = TemporalModel(
+            NUM_JOINTS, 2, 1, filter_widths=FILTER_WIDTHS, channels=CHANNELS,
+        )
+        models['traj'].load_state_dict(checkpoint['model_traj'])
+    return models.to(device)
+
+
+def load_detectron_predictor(cfg_name: str, device: str = 'cpu') -> t.Any:
+    # detectron2 is only available in the gait worker image
+    from algorithms.gait_basic.VideoPose3D.inference.infer_video_d2 import build_predictor
+    return build_predictor(cfg_name)
+
+
+def infer_2d_keypoints(
+    video_path: str,
+    cfg_name: str = DEFAULT_DETECTRON_CFG,
+) -> t.Dict[str, t.Any]:
+    """
+    Run detectron2 on a video with a cached predictor; the returned dict holds the fields of
+    the `.npz` written by `inference/infer_video_d2.py`
+    """
+    from algorithms.gait_basic.VideoPose3D.inference.infer_video_d2 import infer_video
+    predictor = model_registry.get('detectron2', cfg_name, load_detectron_predictor)
+    resolution = get_video_metadata(video_path).display_size
+    return infer_video(predictor, video_path, resolution=resolution)
+
+
+def _nan_detection() -> t.Tuple[np.ndarray, np.ndarray]:
+    return np.full(4, np.nan, dtype=np.float32), np.full((17, 4), np.nan, dtype=np.float32)
+
+
+def decode_detectron_2d(
+    detectron_2d: t.Mapping[str, t.Any],
+    targeted_person_bboxes: t.Optional[t.List[t.Any]] = None,
+) -> t.Tuple[np.ndarray, np.ndarray, t.Dict[str, int]]:
+    """
+    Library version of `decode` in `data/prepare_data_2d_custom.py`.
+
+    Pick one person per frame (the targeted person by IoU >= 0.5 if `targeted_person_bboxes`
+    is given, otherwise the most confident one) and linearly interpolate missing frames.
+    `detectron_2d` is either the dict returned by `infer_2d_keypoints` or the loaded `.npz`.
+    Return (keypoints [T, 17, 2], bounding boxes [T, 4], video metadata {'w', 'h'})
+    """
+    bb = detectron_2d['boxes']
+    kp = detectron_2d['keypoints']
+    metadata = detectron_2d['metadata']
+    if isinstance(metadata, np.ndarray):
+        metadata = metadata.item()
+
+    # frames without bbox/keypoints have no candidate
+    detections, offsets = pack_frames(
+        [bb[i][1] if len(kp[i][1]) != 0 else [] for i in range(len(bb))], columns=5,
+    )
+    if targeted_person_bboxes is None:
+        best_matches, _ = segment_argmax(detections[:, 4], offsets)
+    else:
+        best_matches = match_targets(
+            targets_to_array(targeted_person_bboxes[:len(bb)]),
+            xyxy_to_xywh(detections),
+            offsets,
+            IOU_THRESHOLD,
+        )
+
+    results_bb = []
+    results_kp = []
+    for i, best_match in enumerate(best_matches.tolist()):
+        if best_match < 0:
+            # no (targeted) person in this frame -> will be interpolated
+            nan_bb, nan_kp = _nan_detection()
+            results_bb.append(nan_bb)
+            results_kp.append(nan_kp)
+        else:
+            results_bb.append(bb[i][1][best_match, :4])
+            results_kp.append(kp[i][1][best_match].T.copy())
+
+    bb = np.array(results_bb, dtype=np.float32)
+    kp = np.array(results_kp, dtype=np.float32)[:, :, :2]  # Extract (x, y)
+
+    mask = ~np.isnan(bb[:, 0])
+    indices = np.arange(len(bb))
+    for i in range(4):
+        bb[:, i] = np.interp(indices, indices[mask], bb[mask, i])
+    for i in range(17):
+        for j in range(2):
+            kp[:, i, j] = np.interp(indices, indices[mask], kp[mask, i, j])
+
+    print(f'{len(bb)} total frames processed, {np.sum(~mask)} frames were interpolated')
+    return kp, bb, metadata
+
+
+def save_custom_dataset(
+    path: str,
+    canonical_name: str,
+    keypoints_2d: np.ndarray,
+    video_metadata: t.Dict[str, int],
+) -> None:
+    """
+    Write the custom dataset `.npz` consumed by `run.py -d custom`
+    """
+    metadata = dict(COCO_METADATA)
+    metadata['video_metadata'] = {canonical_name: video_metadata}
+    positions_2d = {canonical_name: {'custom': [keypoints_2d.astype('float32')]}}
+    np.savez_compressed(path, positions_2d=positions_2d, metadata=metadata)
+
+
+def normalize_screen_coordinates(X: np.ndarray, w: int, h: int) -> np.ndarray:
+    # same as common/camera.py: [0, w] -> [-1, 1] while preserving the aspect ratio
+    assert X.shape[-1] == 2
+    return X / w * 2 - [1, h / w]
+
+
+def lift_2d_to_3d(
+    keypoints_2d: np.ndarray,
+    metadata: t.Dict[str, int],
+    checkpoint_path: str = DEFAULT_LIFTING_CHECKPOINT_PATH,
+    device: t.Optional[str] = None,
+    test_time_augmentation: bool = True,
+    chunk_size: t.Optional[int] = None,
+    max_memory: t.Optional[int] = None,
+) -> np.ndarray:
+    """
+    Lift COCO 2D keypoints [T, 17, 2] in pixels of a `metadata['w']` x `metadata['h']` video to
+    h36m 3D keypoints [T, 17, 3] in camera space; the same output as
+    `run.py --evaluate pretrained_h36m_detectron_coco.bin --viz-export`.
+
+    The sequence is predicted at most `chunk_size` frames at a time, or with tiles sized so that
+    the activations stay below `max_memory` bytes; by default it is predicted in one pass
+    """
+    if device is None:
+        device = get_default_device()
+    models = model_registry.get('videopose3d', checkpoint_path, load_lifting_model, device=device)
+
+    keypoints = keypoints_2d[..., :2].astype(np.float32)
+    keypoints = normalize_screen_coordinates(
+        keypoints, w=metadata['w'], h=metadata['h'],
+    ).astype(np.float32)
+
+    receptive_field = models['pos'].receptive_field()
+    if max_memory is not None:
+        chunk_size = chunk_size_for_memory(
+            max_memory, CHANNELS, receptive_field, augment=test_time_augmentation,
+        )
+    if chunk_size is None:
+        chunk_size = len(keypoints)
+
+    kps_left, kps_right = COCO_METADATA['keypoints_symmetry']
+    generator = StreamingGenerator(
+        None, None, [keypoints], chunk_size,
+        pad=(receptive_field - 1) // 2, causal_shift=0, augment=test_time_augmentation,
+        kps_left=kps_left, kps_right=kps_right,
+        joints_left=H36M_JOINTS_LEFT, joints_right=H36M_JOINTS_RIGHT,
+    )
+
+    predictions = []
+    with torch.no_grad():
+        for _, _, batch_2d in generator.next_epoch():
+            inputs_2d = torch.from_numpy(batch_2d.astype('float32')).to(device)
+            prediction = None
+            for name in ('pos', 'traj'):
+                if name not in models:
+                    continue
+                predicted_3d = models[name](inputs_2d)
+                if test_time_augmentation:
+                    # undo flipping and take average with non-flipped version
+                    predicted_3d[1, :, :, 0] *= -1
+                    if name == 'pos':
+                        predicted_3d[1, :, H36M_JOINTS_LEFT + H36M_JOINTS_RIGHT] = \
+                            predicted_3d[1, :, H36M_JOINTS_RIGHT + H36M_JOINTS_LEFT]
+                    predicted_3d = torch.mean(predicted_3d, dim=0, keepdim=True)
+                predicted_3d = predicted_3d.squeeze(0).cpu().numpy()
+                prediction = predicted_3d if prediction is None else prediction + predicted_3d
+            predictions.append(prediction)
+    return np.concatenate(predictions, axis=0)
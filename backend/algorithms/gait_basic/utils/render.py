@@ -0,0 +1,411 @@
+"""
+The rendered videos as a decode -> draw -> encode loop: a single frame (per source video and
+output) is in memory at a time, whatever the length of the video, and several outputs of the
+same video are written from a single decode.
+"""
+import typing as t
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+from .video_encoder import VideoEncoder
+from .video_metadata import get_video_metadata
+
+
+FPS = 30.0
+RED = (0, 0, 255)
+WHITE = (255, 255, 255)
+YELLOW = (0, 255, 255)
+PURPLE = (255, 0, 255)
+LIGHT_BLUE = (255, 255, 0)
+LABEL_ORIGIN = (100, 200)  # bottom left of the text
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_FONT_SCALE = 2
+LABEL_FONT_THICKNESS = 3
+
+
+def gen_pairs(keypoint_idx_list: t.List[int]):
+    pairs = [(keypoint_idx_list[i], keypoint_idx_list[i + 1]) for i in range(len(keypoint_idx_list) - 1)]  # noqa
+    return pairs
+
+
+def decode_frames(video_path: str) -> t.Iterator[npt.NDArray[np.uint8]]:
+    """
+    Decode the frames of a video one by one into the same buffer; a frame is only valid until
+    the next one is decoded
+    """
+    video = cv2.VideoCapture(video_path)
+    frame = None
+    try:
+        while True:
+            ret, frame = video.read(frame)
+            if not ret:
+                break
+            yield frame
+    finally:
+        video.release()
+
+
+class RenderVariant:
+    """
+    An output of a render: the video it is written to and its background, either the frames of
+    a source video (the rendered video by default) or black
+    """
+
+    def __init__(
+        self,
+        output_video_path: str,
+        draw_background: bool = True,
+        video_path: t.Optional[str] = None,
+    ):
+        self.output_video_path = output_video_path
+        self.draw_background = draw_background
+        self.video_path = video_path
+
+    @property
+    def color(self) -> t.Tuple[int, int, int]:
+        return RED if self.draw_background else WHITE
+
+
+def render_variants(
+    video_path: str,
+    size: t.Tuple[int, int],
+    num_frames: int,
+    variants: t.Sequence[RenderVariant],
+    draw: t.Callable[[npt.NDArray[np.uint8], int, t.Tuple[int, int, int]], None],
+    fps: float = FPS,
+    encoder: t.Optional[VideoEncoder] = None,
+) -> int:
+    """
+    Render up to `num_frames` frames of every variant in one loop: each source video is decoded
+    once and `draw(frame, frame_id, color)` draws the overlay of a variant on its frame in
+    place. A black background is one canvas, cleared before every frame.
+    `size` (width, height) is the one of `video_path`; the frames are encoded by `encoder`
+    (mp4v by default). Return the number of rendered frames
+    """
+    if encoder is None:
+        encoder = VideoEncoder()
+    source_paths = [variant.video_path or video_path for variant in variants]
+    sizes = [
+        size if variant.video_path is None else get_video_metadata(variant.video_path).display_size
+        for variant in variants
+    ]
+    # number of variants drawn on each source video
+    num_users = {}
+    for variant, source_path in zip(variants, source_paths):
+        if variant.draw_background:
+            num_users[source_path] = num_users.get(source_path, 0) + 1
+
+    decoders = {source_path: decode_frames(source_path) for source_path in num_users}
+    # the only variant on a source draws on the decoded frame, the others on their own canvas
+    canvases = [
+        None if variant.draw_background and num_users[source_path] == 1
+        else np.zeros((height, width, 3), dtype=np.uint8)
+        for variant, source_path, (width, height) in zip(variants, source_paths, sizes)
+    ]
+    writers = []
+
+    num_rendered = 0
+    try:
+        for variant, variant_size in zip(variants, sizes):
+            writers.append(encoder.open(variant.output_video_path, variant_size, fps))
+        for frame_id in range(num_frames):
+            frames = {source_path: next(decoder, None) for source_path, decoder in decoders.items()}
+            if any(frame is None for frame in frames.values()):
+                break
+            for variant, source_path, canvas, writer in zip(
+                variants, source_paths, canvases, writers,
+            ):
+                if not variant.draw_background:
+                    canvas.fill(0)
+                elif canvas is None:
+                    canvas = frames[source_path]
+                else:
+                    np.copyto(canvas, frames[source_path])
+                draw(canvas, frame_id, variant.color)
+                writer.write(canvas)
+            num_rendered += 1
+    except BaseException:
+        # the error of the rendering is the one raised
+        _close_all(writers, decoders.values())
+        raise
+    error = _close_all(writers, decoders.values())
+    if error is not None:
+        raise error
+    return num_rendered
+
+
+def _close_all(
+    writers: t.Sequence[t.Any],
+    decoders: t.Iterable[t.Iterator[npt.NDArray[np.uint8]]],
+) -> t.Optional[Exception]:
+    # every writer is released (and its ffmpeg waited on) even if another one failed; return
+    # the first error
+    error = None
+    for writer in writers:
+        try:
+            writer.release()
+        except Exception as e:
+            error = error or e
+    for decoder in decoders:
+        decoder.close()
+    return error
+
+
+def _get_label_rectangle(text: str) -> t.Tuple[t.Tuple[int, int], t.Tuple[int, int]]:
+    text_size, _ = cv2.getTextSize(text, LABEL_FONT, LABEL_FONT_SCALE, LABEL_FONT_THICKNESS)
+    text_width, text_height = text_size
+    margin = 5
+    left, bottom = LABEL_ORIGIN
+    lower_left_corner = (left, bottom - text_height - margin)
+    upper_right_corner = (left + text_width + margin, bottom + margin)
+    return lower_left_corner, upper_right_corner
+
+
+def _draw_label(frame: npt.NDArray[np.uint8], text: str) -> None:
+    # add white text on a red rectangle
+    cv2.rectangle(frame, *_get_label_rectangle(text), RED, cv2.FILLED)
+    cv2.putText(
+        frame,
+        text,
+        LABEL_ORIGIN,
+        LABEL_FONT,
+        LABEL_FONT_SCALE,
+        WHITE,
+        LABEL_FONT_THICKNESS,
+        cv2.LINE_AA,
+    )
+
+
+def draw_frame_type(frame: npt.NDArray[np.uint8], turning: bool) -> None:
+    _draw_label(frame, 'turning' if turning else 'walking')
+
+
+def _draw_lines(
+    frame: npt.NDArray[np.uint8],
+    keypoints: npt.NDArray,
+    keypoint_idx_list: t.List[int],
+    color: t.Tuple[int, int, int],
+    thickness: int,
+) -> None:
+    for (from_idx, to_idx) in gen_pairs(keypoint_idx_list):
+        cv2.line(
+            frame,
+            tuple(keypoints[from_idx][:2].astype(int)),
+            tuple(keypoints[to_idx][:2].astype(int)),
+            color,
+            thickness,
+        )
+
+
+def draw_skeleton(
+    frame: npt.NDArray[np.uint8],
+    keypoints: npt.NDArray,
+    color: t.Tuple[int, int, int],
+) -> None:
+    """
+    COCO keypoints [17, >= 2] as points and the lines of the arms, legs and hips
+    """
+    for point in keypoints:
+        cv2.circle(frame, (int(point[0]), int(point[1])), 10, color, -1)
+    _draw_lines(frame, keypoints, [10, 8, 6, 5, 7, 9], color, 5)
+    _draw_lines(frame, keypoints, [6, 12, 14, 16], color, 5)
+    _draw_lines(frame, keypoints, [5, 11, 13, 15], color, 5)
+    _draw_lines(frame, keypoints, [12, 11], color, 5)
+
+
+def draw_target(
+    frame: npt.NDArray[np.uint8],
+    bbox: t.Tuple[int, int, int, int],
+    keypoints: t.Optional[npt.NDArray],
+    color: t.Tuple[int, int, int],
+) -> None:
+    """
+    The bbox (left, top, width, height) of the target and its COCO keypoints [17, 3] if both
+    ankles are confident; the right leg is purple and the left one light blue
+    """
+    if len(bbox) == 4:
+        left, top, width, height = bbox
+        cv2.rectangle(frame, [left, top], [left + width, top + height], YELLOW, 10)
+
+    if keypoints is not None and keypoints[15][2] >= 0.2 and keypoints[16][2] >= 0.2:
+        _draw_lines(frame, keypoints, [10, 8, 6, 5, 7, 9], color, 10)
+        _draw_lines(frame, keypoints, [6, 12, 14, 16], PURPLE, 10)
+        _draw_lines(frame, keypoints, [6, 12], color, 10)
+        _draw_lines(frame, keypoints, [5, 11], color, 10)
+        _draw_lines(frame, keypoints, [11, 13, 15], LIGHT_BLUE, 10)
+        _draw_lines(frame, keypoints, [12, 11], color, 10)
+
+
+class LabelSprite:
+    """
+    A label of `_draw_label` drawn once: its red rectangle (with the text) is copied to the
+    frames and the antialiased text overhanging the rectangle is blended with the frames
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        (text_width, _), baseline = cv2.getTextSize(
+            text, LABEL_FONT, LABEL_FONT_SCALE, LABEL_FONT_THICKNESS,
+        )
+        left, bottom = LABEL_ORIGIN
+        size = (bottom + 2 * baseline + LABEL_FONT_THICKNESS, left + 2 * text_width)
+        label = np.zeros((*size, 3), dtype=np.uint8)
+        _draw_label(label, text)
+        # the coverage of the text (alpha * 255) and of the rectangle alone
+        text_layer = np.zeros(size, dtype=np.uint8)
+        cv2.putText(
+            text_layer, text, LABEL_ORIGIN, LABEL_FONT, LABEL_FONT_SCALE, 255,
+            LABEL_FONT_THICKNESS, cv2.LINE_AA,
+        )
+        rectangle_layer = np.zeros(size, dtype=np.uint8)
+        cv2.rectangle(rectangle_layer, *_get_label_rectangle(text), 255, cv2.FILLED)
+
+        rows, columns = np.nonzero((text_layer > 0) | (rectangle_layer > 0))
+        self.top, self.left = rows.min(), columns.min()
+        box = np.s_[self.top: rows.max() + 1, self.left: columns.max() + 1]
+        self.height, self.width = rows.max() + 1 - self.top, columns.max() + 1 - self.left
+        # the rectangle in the coordinates of the sprite
+        (left, top), (right, bottom) = _get_label_rectangle(text)
+        top, bottom = top - self.top, bottom + 1 - self.top
+        left, right = left - self.left, right + 1 - self.left
+        self.rectangle = np.s_[top: bottom, left: right]
+        self.rectangle_pixels = label[box][self.rectangle].copy()
+        self.blended = np.nonzero((text_layer[box] > 0) & (rectangle_layer[box] == 0))
+        alpha = (text_layer[box][self.blended] / 255.0)[:, None]
+        self.weight = 1 - alpha
+        self.offset = 255 * alpha + 0.5  # rounded by the truncation to uint8
+
+    def draw(self, frame: npt.NDArray[np.uint8]) -> None:
+        if frame.shape[0] < self.top + self.height or frame.shape[1] < self.left + self.width:
+            _draw_label(frame, self.text)
+            return
+        region = frame[self.top: self.top + self.height, self.left: self.left + self.width]
+        behind = region[self.blended]
+        region[self.rectangle] = self.rectangle_pixels
+        region[self.blended] = behind * self.weight + self.offset
+
+
+FRAME_TYPE_SPRITES = {}
+
+
+def get_frame_type_sprite(turning: bool) -> LabelSprite:
+    text = 'turning' if turning else 'walking'
+    if text not in FRAME_TYPE_SPRITES:
+        FRAME_TYPE_SPRITES[text] = LabelSprite(text)
+    return FRAME_TYPE_SPRITES[text]
+
+
+def _to_points(keypoints: t.Sequence[t.Optional[npt.NDArray]]) -> npt.NDArray[np.int32]:
+    # [T, 17, 2] integer (truncated) points; zeros for a frame without keypoints
+    points = np.zeros((len(keypoints), 17, 2), dtype=np.int32)
+    detected = [idx for idx, frame_keypoints in enumerate(keypoints) if frame_keypoints is not None]
+    if len(detected) > 0:
+        points[detected] = np.stack([keypoints[idx] for idx in detected])[:, :, :2].astype(int)
+    return points
+
+
+class SkeletonOverlay:
+    """
+    `draw_skeleton` (optional) and `draw_frame_type` of a whole trial, with the integer points
+    computed once, the lines of a frame drawn in one `cv2.polylines` and the label sprites
+    """
+    CHAINS = [[10, 8, 6, 5, 7, 9], [6, 12, 14, 16], [5, 11, 13, 15], [12, 11]]
+
+    def __init__(
+        self,
+        keypoints: npt.NDArray,
+        raw_tt: t.Sequence[int],
+        draw_keypoint: bool = False,
+    ):
+        self.points = _to_points(keypoints)
+        self.turning = np.asarray(raw_tt) == 1
+        self.draw_keypoint = draw_keypoint
+
+    def draw(self, frame: npt.NDArray[np.uint8], frame_id: int, color: t.Tuple[int, int, int]):
+        if self.draw_keypoint:
+            points = self.points[frame_id]
+            for x, y in points.tolist():
+                cv2.circle(frame, (x, y), 10, color, -1)
+            cv2.polylines(frame, [points[chain] for chain in self.CHAINS], False, color, 5)
+        get_frame_type_sprite(self.turning[frame_id]).draw(frame)
+
+
+class TargetOverlay:
+    """
+    `draw_target` and `draw_frame_type` of a whole trial, with the integer points and the
+    confident frames computed once, one `cv2.polylines` per group of lines (in the order of
+    `draw_target`, which matters where they overlap) and the label sprites
+    """
+
+    def __init__(
+        self,
+        keypoints: t.Sequence[t.Optional[npt.NDArray]],
+        targeted_person_bboxes: t.Sequence[t.Tuple[int, int, int, int]],
+        raw_tt: t.Sequence[int],
+    ):
+        self.points = _to_points(keypoints)
+        self.confident = np.array([
+            frame_keypoints is not None
+            and frame_keypoints[15][2] >= 0.2 and frame_keypoints[16][2] >= 0.2
+            for frame_keypoints in keypoints
+        ], dtype=bool)
+        self.bboxes = [
+            ((bbox[0], bbox[1]), (bbox[0] + bbox[2], bbox[1] + bbox[3])) if len(bbox) == 4
+            else None
+            for bbox in targeted_person_bboxes
+        ]
+        self.turning = np.asarray(raw_tt) == 1
+
+    def draw(self, frame: npt.NDArray[np.uint8], frame_id: int, color: t.Tuple[int, int, int]):
+        if self.bboxes[frame_id] is not None:
+            cv2.rectangle(frame, *self.bboxes[frame_id], YELLOW, 10)
+
+        if self.confident[frame_id]:
+            points = self.points[frame_id]
+            cv2.polylines(frame, [points[[10, 8, 6, 5, 7, 9]]], False, color, 10)
+            cv2.polylines(frame, [points[[6, 12, 14, 16]]], False, PURPLE, 10)
+            cv2.polylines(frame, [points[[6, 12]], points[[5, 11]]], False, color, 10)
+            cv2.polylines(frame, [points[[11, 13, 15]]], False, LIGHT_BLUE, 10)
+            cv2.polylines(frame, [points[[12, 11]]], False, color, 10)
+        get_frame_type_sprite(self.turning[frame_id]).draw(frame)
+
+
+def render_keypoints(
+    video_path: str,
+    size: t.Tuple[int, int],
+    keypoints: npt.NDArray,
+    raw_tt: t.Sequence[int],
+    variants: t.Sequence[RenderVariant],
+    draw_keypoint: bool = False,
+    encoder: t.Optional[VideoEncoder] = None,
+) -> int:
+    """
+    Render the walking / turning state of every frame (and the COCO keypoints [T, 17, 2]) on
+    the video of `size` (width, height), for every variant; return the number of rendered frames
+    """
+    overlay = SkeletonOverlay(keypoints, raw_tt, draw_keypoint=draw_keypoint)
+    return render_variants(
+        video_path, size, len(keypoints), variants, overlay.draw, encoder=encoder,
+    )
+
+
+def render_target(
+    video_path: str,
+    size: t.Tuple[int, int],
+    keypoints: t.Sequence[t.Optional[npt.NDArray]],
+    targeted_person_bboxes: t.Sequence[t.Tuple[int, int, int, int]],
+    raw_tt: t.Sequence[int],
+    variants: t.Sequence[RenderVariant],
+    encoder: t.Optional[VideoEncoder] = None,
+) -> int:
+    """
+    Render the targeted person (bbox and COCO keypoints [17, 3], None if not detected) and the
+    walking / turning state of every frame on the video of `size` (width, height), for every
+    variant; return the number of rendered frames
+    """
+    overlay = TargetOverlay(keypoints, targeted_person_bboxes, raw_tt)
+    return render_variants(
+        video_path, size, len(keypoints), variants, overlay.draw, encoder=encoder,
+    )
@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from ..keypoint_store import PROCESS, THREAD, KeypointStore, postprocess_openpose_json
+from ..track import remove_non_target_person, set_zero_prob_for_keypoint_before_start_line
+
+
+def write_openpose_json(json_path, frames):
+    os.makedirs(json_path, exist_ok=True)
+    for frame_idx, people in enumerate(frames):
+        keypoint = {
+            'version': 1.3,
+            'people': [{'person_id': [-1], 'pose_keypoints_2d': person} for person in people],
+        }
+        with open(os.path.join(json_path, f'video_{frame_idx:012d}_keypoints.json'), 'w') as f:
+            json.dump(keypoint, f)
+
+
+def read_pose_keypoints(json_path):
+    pose_keypoints = {}
+    for filename in sorted(os.listdir(json_path)):
+        with open(os.path.join(json_path, filename), 'r') as f:
+            people = json.load(f)['people']
+        pose_keypoints[filename] = [person['pose_keypoints_2d'] for person in people]
+    return pose_keypoints
+
+
+def random_trial(num_frames):
+    rng = np.random.default_rng(0)
+    frames = []
+    targeted_person_bboxes = []
+    for _ in range(num_frames):
+        people = rng.random((rng.integers(0, 4), 25, 3)) * [1080, 2200, 1]
+        people[rng.random(people.shape[:2]) < 0.2, 2] = 0
+        frames.append([person.reshape(-1).tolist() for person in people])
+        if len(people) == 0 or rng.random() < 0.2:
+            targeted_person_bboxes.append(())
+        else:
+            ankles = people[rng.integers(0, len(people)), [11, 14], :2]
+            left, top = ankles.min(axis=0).astype(int) - 5
+            width, height = np.ptp(ankles, axis=0).astype(int) + 10
+            targeted_person_bboxes.append((left, top, width, height))
+    return frames, targeted_person_bboxes
+
+
+def test_keypoint_store_filters_match_json_filters(tmp_path):
+    frames, targeted_person_bboxes = random_trial(30)
+    expected_json_path = str(tmp_path / 'expected')
+    json_path = str(tmp_path / 'json')
+    write_openpose_json(expected_json_path, frames)
+    shutil.copytree(expected_json_path, json_path)
+
+    remove_non_target_person(expected_json_path, targeted_person_bboxes)
+    set_zero_prob_for_keypoint_before_start_line(expected_json_path, start_line=1820)
+
+    keypoints_path = str(tmp_path / 'keypoints.npy')
+    KeypointStore.from_openpose_json(json_path).save(keypoints_path)
+    store = KeypointStore.load(keypoints_path)
+    assert store.keypoints.shape == (30, 3, 25, 3)
+    store.remove_non_target_person(targeted_person_bboxes)
+    store.set_zero_prob_for_keypoint_before_start_line(start_line=1820)
+    store.to_openpose_json(json_path, only_modified=True)
+
+    assert read_pose_keypoints(json_path) == read_pose_keypoints(expected_json_path)
+
+
+@pytest.mark.parametrize('executor', [THREAD, PROCESS])
+def test_postprocess_openpose_json(tmp_path, executor):
+    frames, targeted_person_bboxes = random_trial(40)
+    expected_json_path = str(tmp_path / 'expected')
+    json_path = str(tmp_path / 'json')
+    write_openpose_json(expected_json_path, frames)
+    shutil.copytree(expected_json_path, json_path)
+    timestamp_path = str(tmp_path / 'timestamp.txt')
+    with open(timestamp_path, 'w') as f:
+        f.writelines(f'{i + 1},{i * 33}\n' for i in range(45))
+
+    serial = KeypointStore.from_openpose_json(expected_json_path)
+    parallel = KeypointStore.from_openpose_json(expected_json_path, workers=3, executor=executor)
+    np.testing.assert_array_equal(parallel.keypoints, serial.keypoints)
+    np.testing.assert_array_equal(parallel.num_people, serial.num_people)
+
+    remove_non_target_person(expected_json_path, targeted_person_bboxes)
+    set_zero_prob_for_keypoint_before_start_line(expected_json_path, start_line=1820)
+    store, timings = postprocess_openpose_json(
+        json_path,
+        str(tmp_path / 'keypoints.npy'),
+        targeted_person_bboxes,
+        start_line=1820,
+        timestamp_file_path=timestamp_path,
+        workers=3,
+        executor=executor,
+    )
+
+    assert list(timings) == ['read', 'filter', 'save', 'write', 'timestamp']
+    assert read_pose_keypoints(json_path) == read_pose_keypoints(expected_json_path)
+    np.testing.assert_array_equal(
+        KeypointStore.load(str(tmp_path / 'keypoints.npy')).keypoints, store.keypoints,
+    )
+    with open(timestamp_path, 'r') as f:
+        assert len(f.readlines()) == 40
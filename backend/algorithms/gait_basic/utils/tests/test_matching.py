@@ -0,0 +1,38 @@
+import numpy as np
+
+from ..matching import (
+    calculate_iou, iou_matrix, match_target, match_targets, pack_frames, segment_argmax,
+    targets_to_array, xyxy_to_xywh,
+)
+
+
+def test_iou_matrix_matches_calculate_iou():
+    rng = np.random.default_rng(0)
+    boxes1 = rng.integers(0, 100, (5, 4))
+    boxes2 = rng.integers(0, 100, (7, 4))
+    expected = [[calculate_iou(bbox1, bbox2) for bbox2 in boxes2] for bbox1 in boxes1]
+    np.testing.assert_array_equal(iou_matrix(boxes1, boxes2), expected)
+
+
+def test_match_targets():
+    frames = [
+        np.array([[0, 0, 10, 10, 0.9], [0, 0, 10, 10, 0.8], [50, 50, 60, 60, 0.7]]),
+        np.zeros((0, 5)),
+        np.array([[50, 50, 60, 60, 0.1], [0, 0, 10, 12, 0.3]]),
+        np.array([[0, 0, 10, 10, 0.5]]),
+    ]
+    detections, offsets = pack_frames(frames, columns=5)
+    np.testing.assert_array_equal(offsets, [0, 3, 3, 5, 6])
+
+    targets = targets_to_array([(0, 0, 10, 10), (0, 0, 10, 10), (0, 0, 10, 10), ()])
+    best_matches = match_targets(targets, xyxy_to_xywh(detections), offsets)
+    # ties go to the first bbox, like the scalar loops
+    np.testing.assert_array_equal(best_matches, [0, -1, 1, -1])
+    for frame, target, best_match in zip(frames, targets, best_matches):
+        if len(frame) > 0 and not np.isnan(target[0]):
+            expected = match_target(target, xyxy_to_xywh(frame))
+            assert best_match == (-1 if expected is None else expected)
+
+    argmax, maxes = segment_argmax(detections[:, 4], offsets)
+    np.testing.assert_array_equal(argmax, [0, -1, 1, 0])
+    np.testing.assert_array_equal(maxes, [0.9, np.nan, 0.3, 0.5])
@@ -0,0 +1,32 @@
+import os
+
+import torch
+import torch.nn as nn
+
+from ..model_registry import ModelRegistry
+
+
+def linear_loader(weight_path: str, device: str = 'cpu') -> nn.Module:
+    model = nn.Linear(4, 2)
+    model.load_state_dict(torch.load(weight_path))
+    return model.to(device)
+
+
+def test_model_registry_reuses_and_reloads(tmp_path):
+    weight_path = str(tmp_path / 'linear.pth')
+    torch.save(nn.Linear(4, 2).state_dict(), weight_path)
+
+    registry = ModelRegistry()
+    model = registry.get('linear', weight_path, linear_loader)
+    assert not model.training
+    assert not any(p.requires_grad for p in model.parameters())
+    assert registry.get('linear', weight_path, linear_loader) is model
+
+    torch.save(nn.Linear(4, 2).state_dict(), weight_path)
+    stat = os.stat(weight_path)
+    os.utime(weight_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert registry.get('linear', weight_path, linear_loader) is not model
+
+    report = registry.report()
+    assert len(report) == 1
+    assert report[0]['model_bytes'] == (4 * 2 + 2) * 4
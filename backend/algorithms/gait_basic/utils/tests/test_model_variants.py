@@ -0,0 +1,46 @@
+import os
+
+import pytest
+import torch
+
+from ...depth_alg.inference import DEPTH_INPUT_SHAPE, build_depth_model, load_depth_model
+from ...depth_alg.model import SignalNet
+from ..model_variants import (
+    FLOAT32, INT8, TORCHSCRIPT, export_variants, get_variant_path, load_model_variant,
+)
+
+
+def test_model_variants(tmp_path):
+    torch.manual_seed(0)
+    weight_path = str(tmp_path / 'depth.pth')
+    torch.save(SignalNet(in_channels=86, num_of_class=6).state_dict(), weight_path)
+    x = torch.randn(8, *DEPTH_INPUT_SHAPE[1:])
+
+    with torch.no_grad():
+        expected = load_depth_model(weight_path)(x)
+        torchscript = load_depth_model(weight_path, variant=TORCHSCRIPT)
+        assert isinstance(torchscript, torch.jit.ScriptModule)
+        torch.testing.assert_close(torchscript(x), expected, rtol=0, atol=0)
+        int8 = load_depth_model(weight_path, variant=INT8)
+        torch.testing.assert_close(int8(x), expected, rtol=0, atol=0.05)
+
+        export_variants(
+            build_depth_model(weight_path), weight_path, torch.zeros(DEPTH_INPUT_SHAPE),
+        )
+        assert os.path.exists(get_variant_path(weight_path, INT8))
+        torch.testing.assert_close(load_depth_model(weight_path, variant=INT8)(x), int8(x))
+
+        # new float32 weights: the exported variants are stale
+        torch.save(SignalNet(in_channels=86, num_of_class=6).state_dict(), weight_path)
+        expected = load_depth_model(weight_path)(x)
+        torch.testing.assert_close(
+            load_depth_model(weight_path, variant=TORCHSCRIPT)(x), expected, rtol=0, atol=0,
+        )
+
+    with pytest.raises(ValueError):
+        load_model_variant(weight_path, build_depth_model, DEPTH_INPUT_SHAPE, variant='fp16')
+    with pytest.raises(ValueError):
+        load_model_variant(
+            weight_path, build_depth_model, DEPTH_INPUT_SHAPE, device='cuda', variant=INT8,
+        )
+    assert not isinstance(load_depth_model(weight_path, variant=FLOAT32), torch.jit.ScriptModule)
@@ -0,0 +1,46 @@
+import numpy as np
+import torch
+
+from ..pose_lifting import (
+    CHANNELS, FILTER_WIDTHS, NUM_JOINTS, TemporalModel, decode_detectron_2d, lift_2d_to_3d,
+)
+
+
+def test_decode_detectron_2d_matches_target_and_interpolates():
+    boxes = np.array([[0, 0, 10, 10, 0.9], [50, 50, 70, 90, 0.5]], dtype=np.float32)
+    keypoints = np.stack([np.zeros((4, 17)), np.ones((4, 17))]).astype(np.float32)
+    detectron_2d = {
+        'boxes': [[[], boxes], [[], []], [[], boxes]],
+        'keypoints': [[[], keypoints], [[], []], [[], keypoints]],
+        'metadata': np.array({'w': 100, 'h': 100}),
+    }
+
+    kp, bb, metadata = decode_detectron_2d(detectron_2d)
+    assert metadata == {'w': 100, 'h': 100}
+    assert kp.shape == (3, 17, 2)
+    assert np.all(kp == 0)
+
+    kp, bb, _ = decode_detectron_2d(detectron_2d, [(50, 50, 20, 40), (), (50, 50, 20, 40)])
+    assert np.all(kp == 1)
+    np.testing.assert_array_equal(bb[1], [50, 50, 70, 90])
+
+
+def save_checkpoint(checkpoint_path: str) -> None:
+    torch.manual_seed(0)
+    model_pos = TemporalModel(
+        NUM_JOINTS, 2, NUM_JOINTS, filter_widths=FILTER_WIDTHS, channels=CHANNELS,
+    )
+    torch.save({'model_pos': model_pos.state_dict()}, checkpoint_path)
+
+
+def test_lift_2d_to_3d_chunked_is_exact(tmp_path):
+    checkpoint_path = str(tmp_path / 'videopose3d.bin')
+    save_checkpoint(checkpoint_path)
+
+    keypoints_2d = np.random.default_rng(0).random((700, 17, 2)) * 100
+    kwargs = {'checkpoint_path': checkpoint_path, 'device': 'cpu'}
+    unchunked = lift_2d_to_3d(keypoints_2d, {'w': 100, 'h': 100}, **kwargs)
+    # tiles of 300 and 400 output frames
+    chunked = lift_2d_to_3d(keypoints_2d, {'w': 100, 'h': 100}, chunk_size=300, **kwargs)
+    assert unchunked.shape == (700, 17, 3)
+    np.testing.assert_array_equal(chunked, unchunked)
@@ -0,0 +1,179 @@
+import os
+import pickle
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+from ..render import (
+    RED, WHITE, RenderVariant, SkeletonOverlay, TargetOverlay, decode_frames, draw_frame_type,
+    draw_skeleton, draw_target, render_keypoints, render_variants,
+)
+
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), *['..'] * 4))
+WIDTH, HEIGHT = 720, 1280
+NUM_FRAMES = 150  # 415 MB of decoded frames
+RENDER_SCRIPT = '''
+import pickle
+import resource
+import sys
+
+from algorithms.gait_basic.utils.render import RenderVariant, render_keypoints, render_target
+
+video_path, keypoints_path, output_video_path = sys.argv[1:]
+with open(keypoints_path, 'rb') as handle:
+    keypoints, bboxes, raw_tt = pickle.load(handle)
+size = ({width}, {height})
+
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+render_target(video_path, size, keypoints, bboxes, raw_tt, [RenderVariant(output_video_path)])
+render_keypoints(
+    video_path, size, keypoints, raw_tt,
+    [RenderVariant(output_video_path, draw_background=False)], draw_keypoint=True,
+)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)  # KB
+'''
+
+
+def write_video(video_path, num_frames, width, height):
+    out = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), 30.0, (width, height))
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    for frame_id in range(num_frames):
+        frame[:] = frame_id % 256
+        out.write(frame)
+    out.release()
+
+
+def test_render_peak_memory(tmp_path):
+    video_path = str(tmp_path / 'long.avi')
+    write_video(video_path, NUM_FRAMES, WIDTH, HEIGHT)
+    rng = np.random.default_rng(0)
+    keypoints = [
+        np.concatenate((rng.random((17, 2)) * [WIDTH, HEIGHT], np.ones((17, 1))), axis=1)
+        for _ in range(NUM_FRAMES)
+    ]
+    bboxes = [(100, 200, 300, 600)] * NUM_FRAMES
+    raw_tt = (np.arange(NUM_FRAMES) % 60 < 20).astype(int).tolist()
+    keypoints_path = str(tmp_path / 'keypoints.pickle')
+    with open(keypoints_path, 'wb') as handle:
+        pickle.dump((keypoints, bboxes, raw_tt), handle)
+
+    output_video_path = str(tmp_path / 'render.mp4')
+    result = subprocess.run(
+        [
+            sys.executable, '-c', RENDER_SCRIPT.format(width=WIDTH, height=HEIGHT),
+            video_path, keypoints_path, output_video_path,
+        ],
+        cwd=BACKEND_DIR,
+        env={**os.environ, 'PYTHONPATH': BACKEND_DIR},
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    peak_increase_mb = int(result.stdout.decode().split()[-1]) / 1024
+    # a few frames in flight, not the whole video
+    assert peak_increase_mb < 100
+
+    rendered = sum(1 for _ in decode_frames(output_video_path))
+    assert rendered == NUM_FRAMES
+
+
+def read_frames(video_path):
+    return np.array([frame.copy() for frame in decode_frames(video_path)])
+
+
+def test_render_variants_single_decode(tmp_path):
+    video_path = str(tmp_path / 'video.avi')
+    write_video(video_path, 10, 64, 48)
+    rng = np.random.default_rng(0)
+    keypoints = rng.random((8, 17, 2)) * [64, 48]
+    raw_tt = [0, 0, 1, 1, 1, 0, 0, 0]
+    variants = [
+        RenderVariant(str(tmp_path / 'render.mp4')),
+        RenderVariant(str(tmp_path / 'black.mp4'), draw_background=False),
+        RenderVariant(str(tmp_path / 'render-2.mp4')),
+    ]
+
+    num_frames = render_keypoints(
+        video_path, (64, 48), keypoints, raw_tt, variants, draw_keypoint=True,
+    )
+
+    assert num_frames == 8
+    for variant in variants:
+        expected_path = str(tmp_path / 'expected.mp4')
+        render_keypoints(
+            video_path, (64, 48), keypoints, raw_tt,
+            [RenderVariant(expected_path, draw_background=variant.draw_background)],
+            draw_keypoint=True,
+        )
+        np.testing.assert_array_equal(
+            read_frames(variant.output_video_path), read_frames(expected_path),
+        )
+
+
+class RecordingEncoder:
+    # writers of which the first one fails to release, as ffmpeg exiting non-zero
+    def __init__(self):
+        self.writers = []
+
+    def open(self, output_video_path, size, fps):
+        encoder = self
+
+        class Writer:
+            def __init__(self):
+                self.released = False
+
+            def write(self, frame):
+                pass
+
+            def release(self):
+                self.released = True
+                if self is encoder.writers[0]:
+                    raise RuntimeError(f'ffmpeg failed to encode {output_video_path}')
+
+        self.writers.append(Writer())
+        return self.writers[-1]
+
+
+def test_render_variants_releases_every_writer(tmp_path):
+    video_path = str(tmp_path / 'video.avi')
+    write_video(video_path, 4, 64, 48)
+    encoder = RecordingEncoder()
+    variants = [RenderVariant(str(tmp_path / f'{idx}.mp4')) for idx in range(3)]
+
+    with pytest.raises(RuntimeError, match='0.mp4'):
+        render_variants(video_path, (64, 48), 4, variants, lambda *_: None, encoder=encoder)
+    assert [writer.released for writer in encoder.writers] == [True] * 3
+
+
+def test_overlays_match_draw_functions():
+    rng = np.random.default_rng(0)
+    num_frames = 20
+    keypoints = [
+        None if idx % 7 == 3 else np.concatenate(
+            (rng.random((17, 2)) * [720, 1280], rng.random((17, 1))), axis=1,
+        )
+        for idx in range(num_frames)
+    ]
+    bboxes = [() if idx % 5 == 2 else (100, 200, 300, 600) for idx in range(num_frames)]
+    raw_tt = (np.arange(num_frames) % 6 < 3).astype(int).tolist()
+    skeletons = rng.random((num_frames, 17, 2)) * [720, 1280]
+    target_overlay = TargetOverlay(keypoints, bboxes, raw_tt)
+    skeleton_overlay = SkeletonOverlay(skeletons, raw_tt, draw_keypoint=True)
+    for frame_id in range(num_frames):
+        background = rng.integers(0, 256, (1280, 720, 3), dtype=np.uint8)
+        expected = background.copy()
+        draw_target(expected, bboxes[frame_id], keypoints[frame_id], RED)
+        draw_frame_type(expected, raw_tt[frame_id] == 1)
+        frame = background.copy()
+        target_overlay.draw(frame, frame_id, RED)
+        assert np.array_equal(frame, expected)
+
+        expected = background.copy()
+        draw_skeleton(expected, skeletons[frame_id], WHITE)
+        draw_frame_type(expected, raw_tt[frame_id] == 1)
+        frame = background.copy()
+        skeleton_overlay.draw(frame, frame_id, WHITE)
+        assert np.array_equal(frame, expected)
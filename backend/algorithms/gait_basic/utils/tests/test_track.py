@@ -0,0 +1,132 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from ..track import (
+    VIDEO_WIDTH, MOTStore, OnlineTargetTracker, find_continuous_personal_bbox, iter_mot_frames,
+    load_mot_file,
+)
+
+
+MOT_LINES = [
+    '2 7 900 100 100 300 -1 -1 -1',
+    '2 3 500 100 100 300 -1 -1 -1',
+    '1 5 500 100 100 300 -1 -1 -1',
+    '1 9 0 0 100 300 -1 -1 -1',
+    '2 8 10 10 100 300 -1 -1 -1',
+    '3 3 510 110 100 300 -1 -1 -1',
+    '3 7 900 100 100 300 -1 -1 -1',
+    '3 3 520 110 100 300 -1 -1 -1',
+    '5 3 900 900 100 300 -1 -1 -1',
+]
+
+
+def baseline_iou(bbox1, bbox2):
+    left1, top1, width1, height1 = bbox1
+    left2, top2, width2, height2 = bbox2
+    inter_width = min(left1 + width1, left2 + width2) - max(left1, left2)
+    inter_height = min(top1 + height1, top2 + height2) - max(top1, top2)
+    intersection_area = inter_width * inter_height if inter_width > 0 and inter_height > 0 else 0
+    return intersection_area / (width1 * height1 + width2 * height2 - intersection_area)
+
+
+def baseline_find_continuous_personal_bbox(frame_num, mot_file_path):
+    # the selection loop over a mot dict from before the track store and the online tracker
+    mot_dict = defaultdict(dict)
+    with open(mot_file_path, 'r') as f:
+        for line in f:
+            frame, person_id, left, top, width, height = map(int, line.split()[:6])
+            mot_dict[frame - 1][person_id] = (left, top, width, height)
+
+    current_person_id = None
+    current_person_bbox = None
+    targeted_person_ids = [-1 for _ in range(frame_num)]
+    targeted_person_bboxes = [() for _ in range(frame_num)]
+    for time_idx in range(frame_num):
+        if len(mot_dict[time_idx]) == 0:
+            continue
+        if current_person_id is None:
+            min_distance = VIDEO_WIDTH
+            for person_id, bbox in mot_dict[time_idx].items():
+                distance = abs(bbox[0] + bbox[2] // 2 - VIDEO_WIDTH // 2)
+                if distance < min_distance:
+                    min_distance = distance
+                    current_person_id = person_id
+            current_person_bbox = bbox  # the last bbox of the frame
+        else:
+            max_iou = 0
+            for person_id, bbox in mot_dict[time_idx].items():
+                iou = baseline_iou(current_person_bbox, bbox)
+                if iou > max_iou:
+                    max_iou, potential_person_id, potential_person_bbox = iou, person_id, bbox
+            if max_iou < 0.5:
+                continue
+            current_person_id, current_person_bbox = potential_person_id, potential_person_bbox
+        targeted_person_ids[time_idx] = current_person_id
+        targeted_person_bboxes[time_idx] = current_person_bbox
+    return targeted_person_ids, targeted_person_bboxes
+
+
+def test_mot_store(tmp_path):
+    mot_file_path = str(tmp_path / 'mot.txt')
+    with open(mot_file_path, 'w') as f:
+        f.write('\n'.join(MOT_LINES) + '\n')
+
+    store = MOTStore.from_file(mot_file_path)
+    assert len(store) == 5
+    person_ids, bboxes = store.frame(2)
+    # a repeated person_id keeps its first position and its last bbox
+    assert person_ids.tolist() == [3, 7]
+    assert bboxes.tolist() == [[520, 110, 100, 300], [900, 100, 100, 300]]
+    assert len(store.frame(3)[0]) == 0
+    assert len(store.frame(10)[0]) == 0
+
+    mot_dict = load_mot_file(mot_file_path)
+    assert list(mot_dict[1].items()) == [
+        (7, (900, 100, 100, 300)), (3, (500, 100, 100, 300)), (8, (10, 10, 100, 300)),
+    ]
+    assert list(mot_dict[2].items()) == [(3, (520, 110, 100, 300)), (7, (900, 100, 100, 300))]
+
+    targeted_person_ids, targeted_person_bboxes = find_continuous_personal_bbox(6, store)
+    # frame 0 selects the person closest to the center but keeps the last bbox of the frame
+    assert targeted_person_ids == [5, 8, -1, -1, -1, -1]
+    assert targeted_person_bboxes == [(0, 0, 100, 300), (10, 10, 100, 300), (), (), (), ()]
+    assert find_continuous_personal_bbox(6, mot_dict) == (
+        targeted_person_ids, targeted_person_bboxes,
+    )
+
+
+def test_online_target_tracker_matches_baseline(tmp_path):
+    rng = np.random.default_rng(0)
+    # people walking slowly, each detected in 80% of the frames
+    starts = rng.integers(0, 1000, size=(6, 2))
+    sizes = rng.integers(150, 400, size=(6, 2))
+    lines = []
+    for frame in range(1, 301):
+        for person_id in np.flatnonzero(rng.random(6) < 0.8).tolist():
+            left, top = starts[person_id] + frame * 2 + rng.integers(-5, 5, size=2)
+            width, height = sizes[person_id]
+            lines.append(f'{frame} {person_id} {left} {top} {width} {height} -1 -1 -1')
+    mot_file_path = str(tmp_path / 'mot.txt')
+    with open(mot_file_path, 'w') as f:
+        f.write('\n'.join(MOT_LINES + lines) + '\n')
+    expected = baseline_find_continuous_personal_bbox(310, mot_file_path)
+    assert find_continuous_personal_bbox(310, MOTStore.from_file(mot_file_path)) == expected
+
+    tracker = OnlineTargetTracker()
+    targeted_person_ids = [-1] * 310
+    targeted_person_bboxes = [()] * 310
+    with open(mot_file_path, 'r') as f:
+        # the lines ordered by frame (as written by the tracker)
+        ordered = sorted(f, key=lambda line: int(line.split()[0]))
+    for frame_idx, person_ids, bboxes in iter_mot_frames(ordered):
+        targeted_person_ids[frame_idx], targeted_person_bboxes[frame_idx] = tracker.update(
+            frame_idx, person_ids, bboxes,
+        )
+
+    assert (targeted_person_ids, targeted_person_bboxes) == expected
+    assert sum(person_id != -1 for person_id in targeted_person_ids) > 100
+    assert tracker.person_id == next(p for p in reversed(targeted_person_ids) if p != -1)
+    with pytest.raises(ValueError):
+        tracker.update(0, [1], [(0, 0, 10, 10)])
@@ -0,0 +1,46 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from ..render import decode_frames
+from ..video_encoder import H264, VideoEncoder, get_ffmpeg_command
+
+
+def test_ffmpeg_command():
+    command = get_ffmpeg_command(
+        'out.mp4', (1080, 1920), 30.0, preset='veryfast', crf=28, threads=2,
+    )
+    input_options = ' '.join(command[:command.index('-i')])
+    output_options = ' '.join(command[command.index('-i'):])
+    assert '-pix_fmt bgr24 -s 1080x1920' in input_options
+    for option in [
+        '-c:v libx264', '-preset veryfast', '-crf 28', '-threads 2', '-pix_fmt yuv420p',
+        '-movflags +faststart',
+    ]:
+        assert option in output_options
+    assert command[-1] == 'out.mp4'
+    with pytest.raises(ValueError):
+        VideoEncoder(codec='vp9')
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='ffmpeg is not installed')
+def test_ffmpeg_writer(tmp_path):
+    output_video_path = str(tmp_path / 'render.mp4')
+    writer = VideoEncoder(codec=H264, preset='ultrafast').open(output_video_path, (65, 49), 30.0)
+    for frame_id in range(12):
+        writer.write(np.full((49, 65, 3), frame_id * 20, dtype=np.uint8))
+    with pytest.raises(ValueError):
+        writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+    writer.release()
+
+    frames = [frame.copy() for frame in decode_frames(output_video_path)]
+    assert len(frames) == 12
+    # the odd size is padded for yuv420p
+    assert frames[0].shape == (50, 66, 3)
+    assert abs(int(frames[5][10, 10, 0]) - 100) <= 10
+
+    writer = VideoEncoder(codec=H264).open(str(tmp_path / 'missing' / 'render.mp4'), (64, 48), 30.0)
+    with pytest.raises(RuntimeError):
+        writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+        writer.release()
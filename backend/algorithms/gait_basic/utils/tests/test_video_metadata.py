@@ -0,0 +1,77 @@
+import os
+
+import cv2
+import numpy as np
+
+from .. import video_metadata
+from ..video_metadata import VideoMetadata, get_video_metadata, parse_ffprobe
+
+
+def write_video(video_path, num_frames, width=64, height=48):
+    out = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), 30.0, (width, height))
+    for _ in range(num_frames):
+        out.write(np.zeros((height, width, 3), dtype=np.uint8))
+    out.release()
+
+
+def test_parse_ffprobe():
+    metadata = parse_ffprobe({
+        'streams': [{
+            'codec_name': 'h264',
+            'width': 1920,
+            'height': 1080,
+            'r_frame_rate': '30000/1001',
+            'avg_frame_rate': '30000/1001',
+            'duration': '10.010000',
+            'side_data_list': [{'side_data_type': 'Display Matrix', 'rotation': -90}],
+        }],
+        'format': {'duration': '10.010000'},
+    })
+    assert metadata == VideoMetadata(1920, 1080, 30000 / 1001, 300, 'h264', rotation=90)
+    assert metadata.display_size == (1080, 1920)
+
+    metadata = parse_ffprobe({
+        'streams': [{
+            'codec_name': 'mpeg4', 'width': 1080, 'height': 1920, 'r_frame_rate': '0/0',
+            'avg_frame_rate': '30/1', 'nb_frames': '451', 'tags': {'rotate': '180'},
+        }],
+    })
+    assert metadata == VideoMetadata(1080, 1920, 30.0, 451, 'mpeg4', rotation=180)
+    assert metadata.display_size == (1080, 1920)
+
+
+def test_get_video_metadata_cache(tmp_path, monkeypatch):
+    video_path = str(tmp_path / 'video.avi')
+    write_video(video_path, 12)
+
+    probes = []
+    probe_video = video_metadata.probe_video
+    monkeypatch.setattr(
+        video_metadata, 'probe_video', lambda path: probes.append(path) or probe_video(path),
+    )
+    video_metadata.clear_cache()
+    cache_dir = str(tmp_path / 'cache')
+
+    metadata = get_video_metadata(video_path, cache_dir=cache_dir)
+    assert (metadata.display_size, metadata.frame_count) == ((64, 48), 12)
+    assert get_video_metadata(video_path, cache_dir=cache_dir) is metadata
+    assert len(probes) == 1
+
+    # another process: the json cache is used
+    video_metadata.clear_cache()
+    assert get_video_metadata(video_path, cache_dir=cache_dir) == metadata
+    assert len(probes) == 1
+
+    # the link of another task to the same file
+    os.makedirs(tmp_path / 'other_task')
+    linked_path = str(tmp_path / 'other_task' / 'video.avi')
+    os.link(video_path, linked_path)
+    video_metadata.clear_cache()
+    assert get_video_metadata(linked_path, cache_dir=cache_dir) == metadata
+    assert len(probes) == 1
+
+    # a rewritten video is probed again
+    write_video(video_path, 20)
+    os.utime(video_path, ns=(0, os.stat(video_path).st_mtime_ns + 10 ** 9))
+    assert get_video_metadata(video_path, cache_dir=cache_dir).frame_count == 20
+    assert len(probes) == 2
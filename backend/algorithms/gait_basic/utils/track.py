@@ -4,6 +4,11 @@ import os
 import typing as t
 from collections import defaultdict
 
+import numpy as np
+import numpy.typing as npt
+
+from .matching import IOU_THRESHOLD, calculate_iou, match_target  # noqa: F401
+
 
 VIDEO_WIDTH = 1080
 VIDEO_HEIGHT = 1920
@@ -49,42 +54,88 @@ def set_zero_prob_for_keypoint_before_start_line(
             json.dump(keypoint, f)
 
 
-def calculate_iou(
-    bbox1: t.Tuple[int, int, int, int],
-    bbox2: t.Tuple[int, int, int, int],
-) -> float:
+class MOTStore:
     """
-    Calculate IOU of two bbox; each bbox in a format of (left, top, width, height)
+    Columnar store of a mot file: the rows are grouped by frame (zero indexing) and
+    `offsets[frame]: offsets[frame + 1]` are the rows of a frame, in the order of the file.
+    A person_id repeated in a frame keeps its first position and its last bbox,
+    like the assignment to a dict in `load_mot_file`
     """
-    # Unpack the bounding boxes
-    left1, top1, width1, height1 = bbox1
-    left2, top2, width2, height2 = bbox2
-
-    # Calculate the bottom-right corners
-    right1, bottom1 = left1 + width1, top1 + height1
-    right2, bottom2 = left2 + width2, top2 + height2
-
-    # Calculate intersection coordinates
-    inter_left = max(left1, left2)
-    inter_top = max(top1, top2)
-    inter_right = min(right1, right2)
-    inter_bottom = min(bottom1, bottom2)
-
-    # Calculate intersection area
-    inter_width = inter_right - inter_left
-    inter_height = inter_bottom - inter_top
-    if inter_width > 0 and inter_height > 0:  # Check if there is an intersection
-        intersection_area = inter_width * inter_height
-    else:
-        intersection_area = 0
 
-    # Calculate union area
-    union_area = width1 * height1 + width2 * height2 - intersection_area
-
-    # Calculate Intersection over Union (IoU)
-    iou = intersection_area / union_area
-
-    return iou
+    def __init__(
+        self,
+        frame_ids: npt.ArrayLike,
+        person_ids: npt.ArrayLike,
+        bboxes: npt.ArrayLike,
+    ):
+        frame_ids = np.asarray(frame_ids, dtype=np.int64).reshape(-1)
+        person_ids = np.asarray(person_ids, dtype=np.int64).reshape(-1)
+        bboxes = np.asarray(bboxes, dtype=np.int64).reshape(-1, 4)
+
+        # frames before the first one (only possible with a zero-indexed file) are never queried
+        keep = frame_ids >= 0
+        frame_ids, person_ids, bboxes = frame_ids[keep], person_ids[keep], bboxes[keep]
+
+        order = np.argsort(frame_ids, kind='stable')
+        frame_ids, person_ids, bboxes = frame_ids[order], person_ids[order], bboxes[order]
+
+        keys = person_ids - person_ids.min(initial=0)
+        keys += frame_ids * (keys.max(initial=0) + 1)
+        _, first_rows, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        if len(first_rows) != len(keys):
+            last_rows = np.zeros(len(first_rows), dtype=np.int64)
+            np.maximum.at(last_rows, inverse, np.arange(len(keys)))
+            rows = np.sort(first_rows)
+            bboxes = bboxes[last_rows[inverse[rows]]]
+            frame_ids, person_ids = frame_ids[rows], person_ids[rows]
+
+        num_frames = int(frame_ids[-1]) + 1 if len(frame_ids) > 0 else 0
+        self.person_ids = person_ids
+        self.bboxes = bboxes
+        self.offsets = np.searchsorted(frame_ids, np.arange(num_frames + 1))
+
+    @classmethod
+    def from_file(cls, mot_file_path: str) -> 'MOTStore':
+        """
+        Load a mot file (txt) with lines of
+        `frame (one indexing) person_id left top width height _ _ _`
+        """
+        if os.path.getsize(mot_file_path) == 0:
+            return cls([], [], [])
+        rows = np.loadtxt(mot_file_path, dtype=np.int64, usecols=range(6), ndmin=2)
+        return cls(rows[:, 0] - 1, rows[:, 1], rows[:, 2:6])
+
+    @classmethod
+    def from_dict(
+        cls,
+        mot_dict: t.Dict[int, t.Dict[int, t.Tuple[int, int, int, int]]],
+    ) -> 'MOTStore':
+        frame_ids, person_ids, bboxes = [], [], []
+        for frame_id, frame_bboxes in mot_dict.items():
+            for person_id, bbox in frame_bboxes.items():
+                frame_ids.append(frame_id)
+                person_ids.append(person_id)
+                bboxes.append(bbox)
+        return cls(frame_ids, person_ids, bboxes)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def frame(self, frame_id: int) -> t.Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """
+        Return the person_ids [N] and bboxes [N, 4] of a frame (views, empty if out of range)
+        """
+        if frame_id < 0 or frame_id >= len(self):
+            return self.person_ids[:0], self.bboxes[:0]
+        start, end = self.offsets[frame_id], self.offsets[frame_id + 1]
+        return self.person_ids[start: end], self.bboxes[start: end]
+
+    def to_dict(self) -> t.Dict[int, t.Dict[int, t.Tuple[int, int, int, int]]]:
+        mot_dict = defaultdict(lambda: dict())
+        for frame_id in np.flatnonzero(np.diff(self.offsets)).tolist():
+            person_ids, bboxes = self.frame(frame_id)
+            mot_dict[frame_id] = dict(zip(person_ids.tolist(), map(tuple, bboxes.tolist())))
+        return mot_dict
 
 
 def load_mot_file(
@@ -94,100 +145,121 @@ def load_mot_file(
     Load a mot file (txt) into a dictionary with a format of
     time (key: int) -> person_id (key: int) -> bbox (value: t.Tuple[int, int, int, int])
     """
-    mot_dict = defaultdict(lambda: dict())
-    with open(mot_file_path, 'r') as f:
-        for line in f:
-            t, person_id, left, top, width, height, _, _, _ = line.strip().split(' ')
-            t = int(t) - 1  # since it is one indexing
-            person_id = int(person_id)
-            left = int(left)
-            top = int(top)
-            width = int(width)
-            height = int(height)
+    return MOTStore.from_file(mot_file_path).to_dict()
+
+
+def _to_frame(
+    frame_id: int,
+    frame_bboxes: t.Dict[int, t.Tuple[int, int, int, int]],
+) -> t.Tuple[int, npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    person_ids = np.array(list(frame_bboxes.keys()), dtype=np.int64)
+    bboxes = np.array(list(frame_bboxes.values()), dtype=np.int64).reshape(-1, 4)
+    return frame_id, person_ids, bboxes
+
+
+def iter_mot_frames(
+    lines: t.Iterable[str],
+) -> t.Iterator[t.Tuple[int, npt.NDArray[np.int64], npt.NDArray[np.int64]]]:
+    """
+    Group the lines of a mot file (ordered by frame, as written by the tracker) into frames while
+    they are read, e.g. from a file still being written.
+    Yield the frame (zero indexing), person_ids [N] and bboxes [N, 4] of every frame with people;
+    a repeated person_id keeps its first position and its last bbox like `MOTStore`
+    """
+    frame_id = None
+    frame_bboxes = {}
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 6:
+            continue
+        frame, person_id, left, top, width, height = map(int, fields[:6])
+        if frame - 1 != frame_id:
+            if len(frame_bboxes) > 0:
+                yield _to_frame(frame_id, frame_bboxes)
+            frame_id, frame_bboxes = frame - 1, {}
+        frame_bboxes[person_id] = (left, top, width, height)
+    if len(frame_bboxes) > 0:
+        yield _to_frame(frame_id, frame_bboxes)
+
 
-            mot_dict[t][person_id] = (left, top, width, height)
+class OnlineTargetTracker:
+    """
+    Target person selection one frame at a time, keeping only the current target: initially the
+    person closest to the center of the video, then the bbox overlapping the most with the
+    previous target bbox
+    """
 
-    return mot_dict
+    def __init__(self, threshold: float = IOU_THRESHOLD):
+        self.threshold = threshold
+        self.frame_idx = None
+        self.person_id = None
+        self.bbox = None
+
+    def update(
+        self,
+        frame_idx: int,
+        person_ids: npt.ArrayLike,
+        bboxes: npt.ArrayLike,
+    ) -> t.Tuple[int, t.Tuple[int, int, int, int]]:
+        """
+        Feed the person_ids [N] and bboxes [N, 4] of a frame (frames in increasing order; frames
+        without people can be skipped).
+        Return the targeted person_id and bbox of the frame, or -1 and () if there is none
+        """
+        if self.frame_idx is not None and frame_idx <= self.frame_idx:
+            raise ValueError(f'Frame {frame_idx} is not after frame {self.frame_idx}')
+        self.frame_idx = frame_idx
+
+        person_ids = np.asarray(person_ids).reshape(-1)
+        bboxes = np.asarray(bboxes).reshape(-1, 4)
+        if len(person_ids) == 0:
+            return -1, ()
+
+        # base case (initially): the person closest to the center of the video
+        if self.person_id is None:
+            bbox_x_centers = bboxes[:, 0] + bboxes[:, 2] // 2
+            distances = np.abs(bbox_x_centers - VIDEO_WIDTH // 2)
+            closest = int(np.argmin(distances))
+            if distances[closest] < VIDEO_WIDTH:
+                self.person_id = int(person_ids[closest])
+            # the bbox kept here is the last one of the frame, not the closest one
+            self.bbox = tuple(bboxes[-1].tolist())
+            return self.person_id, self.bbox
+
+        # after find the first person_id: the bbox overlapping the most with the previous one
+        best = match_target(self.bbox, bboxes, self.threshold)
+        if best is None:
+            return -1, ()
+        self.person_id = int(person_ids[best])
+        self.bbox = tuple(bboxes[best].tolist())
+        return self.person_id, self.bbox
 
 
 def find_continuous_personal_bbox(
     frame_num: int,
-    mot_dict: t.Dict[int, t.Dict[int, t.Tuple[int, int, int, int]]],
+    mot: t.Union[MOTStore, t.Dict[int, t.Dict[int, t.Tuple[int, int, int, int]]]],
 ) -> t.Tuple[t.List[int], t.List[t.Tuple[int, int, int, int]]]:
     """
-    Load a mot dict and number of frame, find continuous person id and its bbox
+    Load a mot store (or a mot dict) and number of frame, find continuous person id and its bbox
     Returns:
-        targeted_person_ids (t.List[int]): a list of person_id; person_id = 1 indicates
+        targeted_person_ids (t.List[int]): a list of person_id; person_id = -1 indicates
             there is no suitable person detected
         targeted_person_bboxes (t.List[t.Tuple[int, int, int, int]]]): a list of bbox;
             bbox = () empty tuple indicates there is no suitable person detected
     """
-    current_person_id = None
-    current_person_bbox = None
+    if not isinstance(mot, MOTStore):
+        mot = MOTStore.from_dict(mot)
 
+    tracker = OnlineTargetTracker()
     targeted_person_ids = [-1 for _ in range(frame_num)]
     targeted_person_bboxes = [() for _ in range(frame_num)]
     for time_idx in range(frame_num):
-
-        # base case (initially)
-        if current_person_id is None:
-            if len(mot_dict[time_idx]) == 0:
-                continue
-            min_distance = VIDEO_WIDTH
-            potential_person_id = None
-            potential_person_bbox = None
-            for person_id, bbox in mot_dict[time_idx].items():
-                left, top, width, height = bbox
-                bbox_y_center = left + width // 2
-                _distance = abs(bbox_y_center - VIDEO_WIDTH // 2)  # bbox center to the center of the video  # noqa
-                if _distance < min_distance:
-                    min_distance = _distance
-                    potential_person_id = person_id
-                    potential_person_bbox = bbox
-
-            current_person_id = potential_person_id
-            current_person_bbox = bbox
-
-            targeted_person_ids[time_idx] = current_person_id
-            targeted_person_bboxes[time_idx] = current_person_bbox
-
-        # after find the first person_id
-        else:
-            # still has such id -> keep it
-            # if current_person_id in mot_dict[time_idx]:
-            #     targeted_person_ids[time_idx] = current_person_id
-
-            #     current_person_bbox = mot_dict[time_idx][current_person_id]
-            #     targeted_person_bboxes[time_idx] = current_person_bbox
-
-            # # no such id ...
-            # else:
-            # if there is no bbox detected
-            if len(mot_dict[time_idx]) == 0:
-                targeted_person_ids[time_idx] = -1
-                targeted_person_bboxes[time_idx] = ()
-                continue
-            # try to find the next person_id
-            else:
-                max_iou = 0
-                potential_person_id = None
-                potential_person_bbox = None
-                for person_id, bbox in mot_dict[time_idx].items():
-                    _iou = calculate_iou(current_person_bbox, bbox)
-                    if _iou > max_iou:
-                        max_iou = _iou
-                        potential_person_id = person_id
-                        potential_person_bbox = bbox
-                if max_iou < 0.5:
-                    targeted_person_ids[time_idx] = -1
-                    targeted_person_bboxes[time_idx] = ()
-                    continue
-
-                current_person_id = potential_person_id
-                current_person_bbox = potential_person_bbox
-
-                targeted_person_ids[time_idx] = current_person_id
-                targeted_person_bboxes[time_idx] = current_person_bbox
+        person_ids, bboxes = mot.frame(time_idx)
+        if len(person_ids) == 0:
+            continue
+        targeted_person_ids[time_idx], targeted_person_bboxes[time_idx] = tracker.update(
+            time_idx, person_ids, bboxes,
+        )
 
     return targeted_person_ids, targeted_person_bboxes
 
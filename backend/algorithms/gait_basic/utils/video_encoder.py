@@ -0,0 +1,133 @@
+"""
+Encoders of rendered frames: mp4v through opencv, or H.264 (yuv420p, `+faststart`) by piping
+raw BGR frames into a single ffmpeg libx264 process, which browsers play without a re-encode.
+"""
+import os
+import subprocess
+import typing as t
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+
+MP4V = 'mp4v'
+H264 = 'h264'
+CODECS = [MP4V, H264]
+DEFAULT_PRESET = 'medium'  # the defaults of libx264
+DEFAULT_CRF = 23
+
+
+def get_ffmpeg_command(
+    output_video_path: str,
+    size: t.Tuple[int, int],
+    fps: float,
+    preset: str = DEFAULT_PRESET,
+    crf: int = DEFAULT_CRF,
+    threads: int = 0,
+) -> t.List[str]:
+    width, height = size
+    return [
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps),
+        '-i', '-',
+        '-an',
+        # yuv420p needs an even width and height
+        '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+        '-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-threads', str(threads),
+        '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+        output_video_path,
+    ]
+
+
+class FFmpegWriter:
+    """
+    `cv2.VideoWriter`-like writer streaming the frames into an ffmpeg process
+    """
+
+    def __init__(
+        self,
+        output_video_path: str,
+        size: t.Tuple[int, int],
+        fps: float,
+        preset: str = DEFAULT_PRESET,
+        crf: int = DEFAULT_CRF,
+        threads: int = 0,
+    ):
+        self.output_video_path = output_video_path
+        self.size = size
+        self.process = subprocess.Popen(
+            get_ffmpeg_command(output_video_path, size, fps, preset, crf, threads),
+            stdin=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+    def write(self, frame: npt.NDArray[np.uint8]) -> None:
+        width, height = self.size
+        if frame.shape != (height, width, 3):
+            raise ValueError(f'Frame of shape {frame.shape} in a {width}x{height} video')
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self.release()
+
+    def release(self) -> None:
+        if self.process.returncode is not None:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        stderr = self.process.stderr.read().decode().strip()
+        self.process.stderr.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f'ffmpeg failed to encode {self.output_video_path}: {stderr}')
+
+
+class VideoEncoder:
+    """
+    The codec and libx264 settings (preset, CRF and number of threads, 0 for auto) of the
+    rendered videos
+    """
+
+    def __init__(
+        self,
+        codec: str = MP4V,
+        preset: str = DEFAULT_PRESET,
+        crf: int = DEFAULT_CRF,
+        threads: int = 0,
+    ):
+        if codec not in CODECS:
+            raise ValueError(f'Unknown codec {codec}, should be one of {CODECS}')
+        self.codec = codec
+        self.preset = preset
+        self.crf = crf
+        self.threads = threads
+
+    @classmethod
+    def from_env(cls) -> 'VideoEncoder':
+        """
+        H.264 with the settings of `VIDEO_ENCODER_PRESET`, `VIDEO_ENCODER_CRF` and
+        `VIDEO_ENCODER_THREADS`
+        """
+        return cls(
+            codec=H264,
+            preset=os.environ.get('VIDEO_ENCODER_PRESET', DEFAULT_PRESET),
+            crf=int(os.environ.get('VIDEO_ENCODER_CRF', DEFAULT_CRF)),
+            threads=int(os.environ.get('VIDEO_ENCODER_THREADS', 0)),
+        )
+
+    def open(
+        self,
+        output_video_path: str,
+        size: t.Tuple[int, int],
+        fps: float,
+    ) -> t.Union[cv2.VideoWriter, FFmpegWriter]:
+        """
+        Writer of frames of `size` (width, height), with `write(frame)` and `release()`
+        """
+        if self.codec == H264:
+            return FFmpegWriter(
+                output_video_path, size, fps, self.preset, self.crf, self.threads,
+            )
+        return cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
@@ -0,0 +1,224 @@
+"""
+Metadata of a video (width, height, fps, frame count, codec and rotation) probed once from its
+container header and cached by file identity (device, inode, size and modification time), so
+that the hard links of a video (e.g. the downloads of the artifact cache in the folder of every
+task) share their entry, and a video rewritten in place is probed again.
+
+The cache lives in the process; with `VIDEO_METADATA_CACHE_DIR` set it is also kept as json
+files in that folder, so that the tasks of other workers sharing the data folder reuse it.
+"""
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import typing as t
+from collections import OrderedDict
+
+
+VIDEO_METADATA_CACHE_DIR = os.environ.get('VIDEO_METADATA_CACHE_DIR')
+MAX_CACHED_VIDEOS = 1024
+FFPROBE_COMMAND = [
+    'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+    '-show_streams', '-show_format', '-of', 'json',
+]
+
+
+class VideoMetadata:
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        fps: float,
+        frame_count: int,
+        codec: str,
+        rotation: int = 0,
+    ):
+        self.width = width  # of the encoded frames
+        self.height = height
+        self.fps = fps
+        self.frame_count = frame_count
+        self.codec = codec
+        self.rotation = rotation  # clockwise degrees to display
+
+    @property
+    def display_size(self) -> t.Tuple[int, int]:
+        """
+        (width, height) of the decoded frames; ffmpeg and opencv apply the rotation
+        """
+        if self.rotation % 180 == 90:
+            return self.height, self.width
+        return self.width, self.height
+
+    def to_dict(self) -> t.Dict[str, t.Any]:
+        return {
+            'width': self.width,
+            'height': self.height,
+            'fps': self.fps,
+            'frame_count': self.frame_count,
+            'codec': self.codec,
+            'rotation': self.rotation,
+        }
+
+    @classmethod
+    def from_dict(cls, metadata: t.Dict[str, t.Any]) -> 'VideoMetadata':
+        return cls(**metadata)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, VideoMetadata) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f'VideoMetadata({self.to_dict()})'
+
+
+def _parse_rate(rate: t.Optional[str]) -> float:
+    # e.g. '30000/1001'; '0/0' when unknown
+    if not rate:
+        return 0.0
+    numerator, _, denominator = rate.partition('/')
+    if float(denominator or 1) == 0:
+        return 0.0
+    return float(numerator) / float(denominator or 1)
+
+
+def parse_ffprobe(probe: t.Dict[str, t.Any]) -> VideoMetadata:
+    """
+    Metadata from the json output of `FFPROBE_COMMAND`
+    """
+    if len(probe.get('streams', [])) == 0:
+        raise ValueError('No video stream')
+    stream = probe['streams'][0]
+
+    fps = _parse_rate(stream.get('r_frame_rate')) or _parse_rate(stream.get('avg_frame_rate'))
+
+    # the frame count of the header, else estimated from the duration
+    frame_count = int(stream.get('nb_frames', 0) or 0)
+    if frame_count == 0:
+        duration = float(stream.get('duration') or probe.get('format', {}).get('duration') or 0)
+        frame_count = round(duration * fps)
+
+    # older ffmpeg writes a rotate tag, newer ones a display matrix (counterclockwise)
+    rotation = int(stream.get('tags', {}).get('rotate', 0))
+    for side_data in stream.get('side_data_list', []):
+        if 'rotation' in side_data:
+            rotation = -int(side_data['rotation'])
+
+    return VideoMetadata(
+        width=int(stream['width']),
+        height=int(stream['height']),
+        fps=fps,
+        frame_count=frame_count,
+        codec=stream.get('codec_name', ''),
+        rotation=rotation % 360,
+    )
+
+
+def _probe_opencv(video_path: str) -> VideoMetadata:
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f'Cannot open {video_path}')
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    rotation = int(cap.get(cv2.CAP_PROP_ORIENTATION_META))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if rotation % 180 == 90 and cap.get(cv2.CAP_PROP_ORIENTATION_AUTO):
+        # opencv reports the size of the rotated frames
+        width, height = height, width
+    metadata = VideoMetadata(
+        width=width,
+        height=height,
+        fps=cap.get(cv2.CAP_PROP_FPS),
+        frame_count=int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        codec=''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 '),
+        rotation=rotation % 360,
+    )
+    cap.release()
+    return metadata
+
+
+def probe_video(video_path: str) -> VideoMetadata:
+    """
+    Probe the container header of a video (no frame is decoded) with ffprobe, or with opencv
+    where ffprobe is not installed
+    """
+    try:
+        output = subprocess.run(
+            FFPROBE_COMMAND + [video_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            check=True,
+        ).stdout
+    except FileNotFoundError:
+        return _probe_opencv(video_path)
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f'Cannot probe {video_path}: {e.stderr.decode().strip()}')
+    return parse_ffprobe(json.loads(output))
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_cache_key(video_path: str) -> t.Tuple[int, int, int, int]:
+    stat = os.stat(video_path)
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _get_cache_file_path(cache_dir: str, key: t.Tuple[int, int, int, int]) -> str:
+    return os.path.join(cache_dir, hashlib.sha1(repr(key).encode()).hexdigest() + '.json')
+
+
+def _load_cached(
+    cache_dir: str,
+    key: t.Tuple[int, int, int, int],
+) -> t.Optional[VideoMetadata]:
+    try:
+        with open(_get_cache_file_path(cache_dir, key), 'r') as f:
+            return VideoMetadata.from_dict(json.load(f))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _save_cached(
+    cache_dir: str,
+    key: t.Tuple[int, int, int, int],
+    metadata: VideoMetadata,
+) -> None:
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_file_path = _get_cache_file_path(cache_dir, key)
+    tmp_path = f'{cache_file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(metadata.to_dict(), f)
+    os.replace(tmp_path, cache_file_path)
+
+
+def get_video_metadata(
+    video_path: str,
+    cache_dir: t.Optional[str] = VIDEO_METADATA_CACHE_DIR,
+) -> VideoMetadata:
+    """
+    Cached `probe_video`; a video rewritten in place (other size or mtime) is probed again
+    """
+    key = get_cache_key(video_path)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    metadata = _load_cached(cache_dir, key) if cache_dir is not None else None
+    if metadata is None:
+        metadata = probe_video(video_path)
+        if cache_dir is not None:
+            _save_cached(cache_dir, key, metadata)
+
+    with _cache_lock:
+        _cache[key] = metadata
+        while len(_cache) > MAX_CACHED_VIDEOS:
+            _cache.popitem(last=False)
+    return metadata
+
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
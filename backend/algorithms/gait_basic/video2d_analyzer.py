@@ -18,10 +18,12 @@ START_LINE = 1820
 SVO_EXPORT_RETRY = 2
 DEPTH_SENSING_RETRY = 5
 SYNC_FILE_SERVER_STORE_PATH = os.environ['SYNC_FILE_SERVER_STORE_PATH']
+FUSE_TURN_TIME_AND_DEPTH = os.environ.get('FUSE_TURN_TIME_AND_DEPTH', 'false').lower() == 'true'
 
 if os.environ.get('CELERY_WORKER', 'none') == 'gait-worker':
     from .tasks.depth_estimation_task import depth_estimation_task
     from .tasks.track_and_extract_task import track_and_extract_task
+    from .tasks.turn_time_depth_task import turn_time_depth_task
     from .tasks.turn_time_task import turn_time_task
     from .tasks.video_generation_2d_task import video_generation_2d_task
 
@@ -32,6 +34,7 @@ class Video2DGaitAnalyzer(Analyzer):
         turn_time_pretrained_path: str = 'algorithms/gait_basic/gait_study_semi_turn_time/weights/semi_vanilla_v2/gait-turn-time.pth',  # noqa
         depth_pretrained_path: str = 'algorithms/gait_basic/depth_alg/weights/gait-depth-weight.pth',  # noqa
         model_focal_length: float = 1392.0,
+        fuse_turn_time_and_depth: bool = FUSE_TURN_TIME_AND_DEPTH,
         **kwargs,
     ):
         self.turn_time_pretrained_path = turn_time_pretrained_path
@@ -39,6 +42,8 @@ class Video2DGaitAnalyzer(Analyzer):
         if math.isclose(model_focal_length, -1):
             raise ValueError('model focal length is not provided')
         self.model_focal_length = model_focal_length
+        # run turn time and depth estimation as one turn_time_depth_task
+        self.fuse_turn_time_and_depth = fuse_turn_time_and_depth
 
     def run(
         self,
@@ -89,6 +94,17 @@ class Video2DGaitAnalyzer(Analyzer):
         if track_and_extract_task_instance.failed():
             raise RuntimeError('Track and Extract Task falied!')
 
+        if self.fuse_turn_time_and_depth:
+            tt, final_output = self.run_turn_time_depth_and_video_generation(
+                session=session,
+                request_uuid=request_uuid,
+                file_id=file_id,
+                height=height,
+                focal_length=focal_length,
+                on_msg=on_msg,
+            )
+            return self.write_final_result(final_result_json_path, tt, final_output)
+
         # turn time
         turn_time_config = {
             'file_id': file_id,
@@ -173,6 +189,82 @@ class Video2DGaitAnalyzer(Analyzer):
         if video_generation_2d_task_instance.failed():
             raise RuntimeError('Video Generation Task falied!')
 
+        return self.write_final_result(final_result_json_path, tt, final_output)
+
+    def run_turn_time_depth_and_video_generation(
+        self,
+        session,
+        request_uuid: str,
+        file_id: str,
+        height: float,
+        focal_length: float,
+        on_msg: t.Callable,
+    ) -> t.Tuple[float, t.Dict[str, float]]:
+        tt = -1
+        final_output = {}
+        turn_time_depth_config = {
+            'file_id': file_id,
+            'height': height,
+            'model_focal_length': self.model_focal_length,
+            'focal_length': focal_length,
+            'turn_time_pretrained_path': self.turn_time_pretrained_path,
+            'depth_pretrained_path': self.depth_pretrained_path,
+        }
+        turn_time_depth_task_instance = turn_time_depth_task.delay(
+            request_uuid,
+            turn_time_depth_config,
+        )
+        register_subtask(
+            session=session,
+            request_uuid=request_uuid,
+            subtask_instance=turn_time_depth_task_instance,
+            subtask_name=SubtaskEnum.TURN_TIME_DEPTH.value,
+        )
+
+        while not turn_time_depth_task_instance.ready():
+            time.sleep(3)
+
+        if turn_time_depth_task_instance.failed():
+            raise RuntimeError('Turn Time Depth Task falied!')
+
+        with allow_join_result():
+            try:
+                tt, _, final_output, _ = turn_time_depth_task_instance.get(
+                    on_message=on_msg,
+                    timeout=10,
+                )
+            except TimeoutError:
+                print('Timeout!')
+
+        # video generation (needs the turn mask uploaded by turn_time_depth_task)
+        video_generation_2d_config = {
+            'file_id': file_id,
+        }
+        video_generation_2d_task_instance = video_generation_2d_task.delay(
+            request_uuid,
+            video_generation_2d_config,
+        )
+        register_subtask(
+            session=session,
+            request_uuid=request_uuid,
+            subtask_instance=video_generation_2d_task_instance,
+            subtask_name=SubtaskEnum.VIDEO_GENERATION_2D.value,
+        )
+
+        while not video_generation_2d_task_instance.ready():
+            time.sleep(3)
+
+        if video_generation_2d_task_instance.failed():
+            raise RuntimeError('Video Generation Task falied!')
+
+        return tt, final_output
+
+    def write_final_result(
+        self,
+        final_result_json_path: str,
+        tt: float,
+        final_output: t.Dict[str, float],
+    ) -> t.List[t.Dict[str, t.Any]]:
         sl = final_output.get('sl', -1)
         sw = final_output.get('sw', -1)
         st = final_output.get('st', -1)
@@ -9,5 +9,6 @@ class SubtaskEnum(enum.Enum):
     SVO_DEPTH_SENSING = 'svo_depth_sensing'
     TRACK_AND_EXTRACT = 'track_and_extract'
     TURN_TIME = 'turn_time'
+    TURN_TIME_DEPTH = 'turn_time_depth'
     VIDEO_GENERATION_2D = 'video_generation_2d'
     VIDEO_GENERATION_3D = 'video_generation_3d'
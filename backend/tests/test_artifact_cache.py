@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from utils.artifact_cache import ArtifactCache
+
+
+class TestArtifactCache(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = ArtifactCache(os.path.join(self.root, 'cache'), max_bytes=250)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _add(self, key, content):
+        path = self.cache.new_temp_path()
+        with open(path, 'wb') as f:
+            f.write(content)
+        return self.cache.add(key, path)
+
+    def test_lookup_and_link(self):
+        object_path = self._add('a', b'a' * 100)
+        mtime_ns = os.stat(object_path).st_mtime_ns
+        self.assertEqual(self.cache.lookup('a', 100), object_path)
+        # the use is recorded without changing the modification time
+        self.assertEqual(os.stat(object_path).st_mtime_ns, mtime_ns)
+        self.assertIsNone(self.cache.lookup('a', 99))  # another version of the file
+        self.assertIsNone(self.cache.lookup('b', 100))
+
+        des = os.path.join(self.root, 'work', 'a.bin')
+        os.makedirs(os.path.dirname(des))
+        self.assertTrue(self.cache.link('a', 100, des))
+        self.assertTrue(os.path.samefile(des, object_path))
+        self.assertFalse(self.cache.link('b', 100, des))
+
+        # the same content under another key is stored once
+        self.assertEqual(self._add('c', b'a' * 100), object_path)
+        self.assertEqual(self.cache.get_size(), 100)
+
+    def test_least_recently_used_eviction(self):
+        for idx, key in enumerate(['a', 'b', 'c']):
+            self._add(key, bytes([idx]) * 100)
+            time.sleep(0.01)
+        # 'a' is evicted, the least recently used
+        self.assertIsNone(self.cache.lookup('a', 100))
+
+        # 'b', the least recently used, is skipped while it is linked into a working folder
+        des = os.path.join(self.root, 'b.bin')
+        self.assertTrue(self.cache.link('b', 100, des))
+        time.sleep(0.01)
+        self.assertIsNotNone(self.cache.lookup('c', 100))
+        time.sleep(0.01)
+        self._add('d', b'd' * 100)
+        self.assertIsNone(self.cache.lookup('c', 100))
+        self.assertIsNotNone(self.cache.lookup('b', 100))
+        self.assertIsNotNone(self.cache.lookup('d', 100))
+
+        # above the cap while every file is linked
+        self.assertTrue(self.cache.link('d', 100, os.path.join(self.root, 'd.bin')))
+        path = self.cache.new_temp_path()
+        with open(path, 'wb') as f:
+            f.write(b'e' * 100)
+        os.link(path, os.path.join(self.root, 'e.bin'))
+        self.cache.add('e', path)
+        self.assertEqual(self.cache.get_size(), 300)
+
+        os.remove(des)
+        self.assertEqual(self.cache.evict(), 100)
+        self.assertIsNone(self.cache.lookup('b', 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
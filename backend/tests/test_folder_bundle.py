@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils.folder_bundle import GZIP, ZSTD, list_files, pack_folder, unpack_folder, zstandard
+
+
+class TestFolderBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.folder = os.path.join(self.root, 'src')
+        self.contents = {
+            'a.json': b'{}',
+            'empty.txt': b'',
+            'nested/deeper/b.bin': os.urandom(100 * 1024),
+        }
+        for name, content in self.contents.items():
+            path = os.path.join(self.folder, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _round_trip(self, compression):
+        archive_path = os.path.join(self.root, 'archive')
+        manifest = pack_folder(self.folder, archive_path, compression)
+        self.assertEqual(manifest['compression'], compression)
+        self.assertEqual(manifest['archive_size'], os.path.getsize(archive_path))
+        self.assertEqual(
+            manifest['files'],
+            [{'path': name, 'size': len(self.contents[name])} for name in sorted(self.contents)],
+        )
+
+        folder = os.path.join(self.root, 'des')
+        unpack_folder(archive_path, folder, compression)
+        self.assertEqual(list_files(folder), sorted(self.contents))
+        for name, content in self.contents.items():
+            with open(os.path.join(folder, name), 'rb') as f:
+                self.assertEqual(f.read(), content)
+
+    def test_gzip_round_trip(self):
+        self._round_trip(GZIP)
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_zstd_round_trip(self):
+        self._round_trip(ZSTD)
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            pack_folder(self.folder, os.path.join(self.root, 'archive'), 'lz4')
+
+
+if __name__ == '__main__':
+    unittest.main()
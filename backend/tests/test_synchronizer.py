@@ -0,0 +1,475 @@
+import base64
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+from algorithms.gait_basic.utils.keypoint_store import postprocess_openpose_json
+from utils.artifact_cache import ArtifactCache
+from utils.folder_bundle import MANIFEST_NAME, unbundle_folder
+from utils.synchronizer import (
+    CHECKSUM_SUFFIX, ChecksumMismatchError, DataSynchronizer, FileServerError,
+)
+
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+USER, PASSWORD = 'user', 'password'
+LARGE_FILE_SIZE = 128 * 1024 * 1024
+TRANSFER_SCRIPT = '''
+import resource
+import sys
+import time
+
+from utils.synchronizer import DataSynchronizer
+
+port, src, des = sys.argv[1:]
+synchronizer = DataSynchronizer('http://127.0.0.1', int(port), '{user}', '{password}')
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+synchronizer.upload(src, 'large.bin')
+upload_elapsed = time.perf_counter() - start
+start = time.perf_counter()
+synchronizer.download('large.bin', des)
+download_elapsed = time.perf_counter() - start
+# KB, seconds, seconds
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before, upload_elapsed, download_elapsed)
+'''
+
+
+class FileServerHandler(BaseHTTPRequestHandler):
+    """
+    The subset of dufs used by `DataSynchronizer`, with basic auth and keep-alive
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    chunk_size = 1024 * 1024
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.num_connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _get_path(self):
+        return os.path.join(self.server.root, unquote(urlparse(self.path).path).lstrip('/'))
+
+    def _reply(self, status, body=b''):
+        if status >= HTTPStatus.BAD_REQUEST:
+            # the request body is unread, so the connection cannot be reused
+            self.close_connection = True
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _is_available(self):
+        # the number of 503 still to answer for a path, for the retries
+        path = unquote(urlparse(self.path).path)
+        with self.server.lock:
+            failures = self.server.failures.get(path, 0)
+            self.server.failures[path] = failures - 1
+        if failures > 0:
+            self._reply(HTTPStatus.SERVICE_UNAVAILABLE)
+            return False
+        return True
+
+    def _truncate(self):
+        # whether to cut the transfer short (and close the connection) for the retries
+        path = unquote(urlparse(self.path).path)
+        with self.server.lock:
+            truncations = self.server.truncations.get(path, 0)
+            self.server.truncations[path] = truncations - 1
+        if truncations > 0:
+            self.close_connection = True
+        return truncations > 0
+
+    def _is_authorized(self):
+        if not self._is_available():
+            return False
+        token = base64.b64encode(f'{USER}:{PASSWORD}'.encode()).decode()
+        if self.headers.get('Authorization') == f'Basic {token}':
+            return True
+        self._reply(HTTPStatus.UNAUTHORIZED)
+        return False
+
+    def _send_file_headers(self, path):
+        stat = os.stat(path)
+        self.send_header('Content-Length', str(stat.st_size if os.path.isfile(path) else 0))
+        self.send_header('ETag', f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"')
+
+    def do_HEAD(self):
+        if not self._is_authorized():
+            return
+        path = self._get_path()
+        if not os.path.exists(path):
+            self._reply(HTTPStatus.NOT_FOUND)
+            return
+        self.send_response(HTTPStatus.OK)
+        self._send_file_headers(path)
+        self.end_headers()
+
+    def do_GET(self):
+        if not self._is_authorized():
+            return
+        path = self._get_path()
+        if os.path.isdir(path):
+            paths = [
+                {'name': name, 'path_type': 'Dir' if os.path.isdir(os.path.join(path, name)) else 'File'}  # noqa
+                for name in sorted(os.listdir(path))
+            ]
+            self._reply(HTTPStatus.OK, json.dumps({'paths': paths}).encode())
+            return
+        if not os.path.isfile(path):
+            self._reply(HTTPStatus.NOT_FOUND)
+            return
+        size = os.path.getsize(path)
+        offset = 0
+        with self.server.lock:
+            self.server.num_downloads += 1
+        if self.headers.get('Range', '').startswith('bytes='):
+            offset = int(self.headers['Range'][len('bytes='):].split('-')[0])
+            with self.server.lock:
+                self.server.num_range_requests += 1
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header('Content-Range', f'bytes {offset}-{size - 1}/{size}')
+            self.send_header('Content-Length', str(size - offset))
+        else:
+            self.send_response(HTTPStatus.OK)
+            self._send_file_headers(path)
+        self.end_headers()
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            if self._truncate():
+                self.wfile.write(f.read((size - offset) // 2))
+                return
+            shutil.copyfileobj(f, self.wfile, self.chunk_size)
+
+    def do_PUT(self):
+        if not self._is_authorized():
+            return
+        if 'Content-Length' not in self.headers:
+            self._reply(HTTPStatus.LENGTH_REQUIRED)
+            return
+        path = self._get_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        remaining = int(self.headers['Content-Length'])
+        with open(path, 'wb') as f:
+            while remaining > 0:
+                chunk = self.rfile.read(min(remaining, self.chunk_size))
+                f.write(chunk)
+                remaining -= len(chunk)
+        self._reply(HTTPStatus.CREATED)
+
+    def do_PATCH(self):
+        if not self._is_authorized():
+            return
+        path = self._get_path()
+        if self.headers.get('X-Update-Range') != 'append' or not os.path.isfile(path):
+            self._reply(HTTPStatus.BAD_REQUEST)
+            return
+        length = int(self.headers['Content-Length'])
+        truncate = self._truncate()
+        with open(path, 'ab') as f:
+            # half of the body, then the connection is closed without an answer
+            f.write(self.rfile.read(length // 2 if truncate else length))
+        if not truncate:
+            self._reply(HTTPStatus.NO_CONTENT)
+
+    def do_MKCOL(self):
+        if not self._is_authorized():
+            return
+        os.makedirs(self._get_path(), exist_ok=True)
+        self._reply(HTTPStatus.CREATED)
+
+
+class TestDataSynchronizer(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.local = tempfile.mkdtemp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FileServerHandler)
+        self.server.root = self.root
+        self.server.lock = threading.Lock()
+        self.server.num_connections = 0
+        self.server.failures = {}
+        self.server.num_downloads = 0
+        self.server.num_range_requests = 0
+        self.server.truncations = {}
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.root)
+        shutil.rmtree(self.local)
+
+    def _write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def test_folder_round_trip(self):
+        src_folder = os.path.join(self.local, 'src') + '/'
+        contents = {
+            'a.json': b'{}',
+            'empty.txt': b'',
+            'nested/b.bin': os.urandom(300 * 1024),
+            'nested/deeper/c.txt': b'c' * 10,
+        }
+        for name, content in contents.items():
+            self._write(os.path.join(src_folder, name), content)
+
+        # transient errors of an upload, a listing and a download
+        self.server.failures = {'/trial/a.json': 2, '/trial/nested/': 1, '/trial/empty.txt': 1}
+        num_failures = sum(self.server.failures.values())
+        with DataSynchronizer(
+            'http://127.0.0.1/', self.port, USER, PASSWORD,
+            chunk_size=4096, workers=3, retry_backoff=0.01,
+        ) as synchronizer:
+            synchronizer.create_folder('trial')
+            upload_report = synchronizer.upload_folder(src_folder, 'trial/')
+            self.assertTrue(synchronizer.is_exist('trial/nested/b.bin'))
+            self.assertFalse(synchronizer.is_exist('trial/missing.bin'))
+            des_folder = os.path.join(self.local, 'des') + '/'
+            download_report = synchronizer.download_folder('trial/', des_folder)
+
+        for report in [upload_report, download_report]:
+            self.assertEqual(len(report.results), len(contents))
+            self.assertEqual(report.failed, [])
+            self.assertEqual(report.num_bytes, sum(len(content) for content in contents.values()))
+            report.raise_for_failures()
+        for name, content in contents.items():
+            with open(os.path.join(des_folder, name), 'rb') as f:
+                self.assertEqual(f.read(), content)
+        # the requests reused the keep-alive connections of the workers, but the error replies
+        self.assertLessEqual(self.server.num_connections, 3 + num_failures)
+
+    def test_folder_failures_are_reported(self):
+        src_folder = os.path.join(self.local, 'src') + '/'
+        for name in ['a.txt', 'b.txt', 'c.txt']:
+            self._write(os.path.join(src_folder, name), name.encode())
+        self.server.failures = {'/trial/b.txt': 10}
+        with DataSynchronizer(
+            'http://127.0.0.1', self.port, USER, PASSWORD, retries=2, retry_backoff=0.01,
+        ) as synchronizer:
+            report = synchronizer.upload_folder(src_folder, 'trial/')
+        self.assertEqual([result.src for result in report.failed], [src_folder + 'b.txt'])
+        # the first attempt and 2 retries
+        self.assertEqual(self.server.failures['/trial/b.txt'], 7)
+        with self.assertRaises(RuntimeError):
+            report.raise_for_failures()
+
+    def test_bundle_round_trip(self):
+        src_folder = os.path.join(self.local, 'src') + '/'
+        contents = {f'{idx:012d}_keypoints.json': b'{"people": []}' * idx for idx in range(200)}
+        contents['nested/a.txt'] = b'a'
+        for name, content in contents.items():
+            self._write(os.path.join(src_folder, name), content)
+
+        with DataSynchronizer('http://127.0.0.1', self.port, USER, PASSWORD) as synchronizer:
+            upload_report = synchronizer.upload_folder(src_folder, 'bundled/', bundle=True)
+            synchronizer.upload_folder(src_folder, 'legacy/')
+            bundled_folder = os.path.join(self.local, 'bundled') + '/'
+            download_report = synchronizer.download_folder('bundled/', bundled_folder, bundle=True)
+            # a folder uploaded file by file is still downloaded file by file
+            legacy_folder = os.path.join(self.local, 'legacy') + '/'
+            synchronizer.download_folder('legacy/', legacy_folder, bundle=True)
+            # and a bundle is unpacked even when not expected
+            unflagged_folder = os.path.join(self.local, 'unflagged') + '/'
+            synchronizer.download_folder('bundled/', unflagged_folder)
+
+        # the archive and its manifest, the manifest listing the files in the folder
+        remote_names = os.listdir(os.path.join(self.root, 'bundled'))
+        self.assertEqual(len(remote_names), 2)
+        self.assertIn(MANIFEST_NAME, remote_names)
+        with open(os.path.join(self.root, 'bundled', MANIFEST_NAME), 'r') as f:
+            manifest = json.load(f)
+        self.assertEqual(
+            [(file['path'], file['size']) for file in manifest['files']],
+            sorted((name, len(content)) for name, content in contents.items()),
+        )
+        for report in [upload_report, download_report]:
+            self.assertEqual(len(report.results), len(contents))
+            self.assertEqual(report.failed, [])
+        for folder in [bundled_folder, legacy_folder, unflagged_folder]:
+            for name, content in contents.items():
+                with open(os.path.join(folder, name), 'rb') as f:
+                    self.assertEqual(f.read(), content)
+            self.assertEqual(len(os.listdir(folder)), len(contents))  # no temporary archive
+
+    def test_post_processed_bundle(self):
+        # the json folder of the openpose task, post-processed in the store by the analyzer
+        src_folder = os.path.join(self.local, 'json') + '/'
+        for frame_idx in range(5):
+            people = []
+            for ankle_x in [100, 600]:
+                pose_keypoints_2d = [0.0] * 75
+                pose_keypoints_2d[11 * 3: 11 * 3 + 3] = [ankle_x, 2000.0, 0.9]
+                pose_keypoints_2d[14 * 3: 14 * 3 + 3] = [ankle_x + 20, 2000.0, 0.9]
+                people.append({'person_id': [-1], 'pose_keypoints_2d': pose_keypoints_2d})
+            self._write(
+                os.path.join(src_folder, f'video_{frame_idx:012d}_keypoints.json'),
+                json.dumps({'version': 1.3, 'people': people}).encode(),
+            )
+        timestamp_path = os.path.join(self.local, 'timestamp.txt')
+        self._write(timestamp_path, ''.join(f'{i + 1},{i * 33}\n' for i in range(5)).encode())
+
+        des_folder = os.path.join(self.local, 'downloaded') + '/'
+        with DataSynchronizer('http://127.0.0.1', self.port, USER, PASSWORD) as synchronizer:
+            synchronizer.upload_folder(src_folder, 'out/json/', bundle=True)
+            store_folder = os.path.join(self.root, 'out', 'json')
+            self.assertTrue(unbundle_folder(store_folder))
+            postprocess_openpose_json(
+                store_folder,
+                os.path.join(self.local, 'keypoints.npy'),
+                [(90, 1990, 40, 20)] * 5,
+                start_line=1820,
+                timestamp_file_path=timestamp_path,
+            )
+            synchronizer.download_folder('out/json/', des_folder, bundle=True)
+
+        names = sorted(os.listdir(store_folder))
+        self.assertEqual(sorted(os.listdir(des_folder)), names)
+        self.assertEqual(len(names), 5)
+        for name in names:
+            with open(os.path.join(des_folder, name), 'r') as f:
+                people = json.load(f)['people']
+            # only the target person
+            self.assertEqual(len(people), 1)
+            self.assertEqual(people[0]['pose_keypoints_2d'][11 * 3], 100)
+        with open(timestamp_path, 'r') as f:
+            self.assertEqual(len(f.readlines()), 5)
+
+    def test_cached_download(self):
+        self._write(os.path.join(self.root, 'video.mp4'), b'v' * 1000)
+        self._write(os.path.join(self.root, 'copy.mp4'), b'v' * 1000)
+        cache = ArtifactCache(os.path.join(self.local, 'cache'))
+        first, second, third = [os.path.join(self.local, f'{idx}/video.mp4') for idx in range(3)]
+        with DataSynchronizer(
+            'http://127.0.0.1', self.port, USER, PASSWORD, cache=cache,
+        ) as synchronizer:
+            synchronizer.download('video.mp4', first, cached=True)
+            synchronizer.download('video.mp4', second, cached=True)
+            self.assertEqual(self.server.num_downloads, 1)
+            # the same file, hard linked from the cache
+            self.assertTrue(os.path.samefile(first, second))
+
+            # another path of the same content is downloaded, but stored once
+            synchronizer.download('copy.mp4', third, cached=True)
+            self.assertEqual(self.server.num_downloads, 2)
+            self.assertEqual(cache.get_size(), 1000)
+
+            # a file changed on the file server is downloaded again
+            self._write(os.path.join(self.root, 'video.mp4'), b'w' * 1000)
+            synchronizer.download('video.mp4', second, cached=True)
+            self.assertEqual(self.server.num_downloads, 3)
+            with self.assertRaises(FileServerError):
+                synchronizer.download('missing.mp4', third, cached=True)
+
+        with open(first, 'rb') as f:
+            self.assertEqual(f.read(), b'v' * 1000)
+        with open(second, 'rb') as f:
+            self.assertEqual(f.read(), b'w' * 1000)
+
+    def test_resumed_large_file_transfers(self):
+        src = os.path.join(self.local, 'large.svo')
+        content = os.urandom(5 * 1024 * 1024 + 123)
+        self._write(src, content)
+        # a broken upload of the second part, and broken downloads
+        self.server.truncations = {'/large.svo': 1}
+        des = os.path.join(self.local, 'downloaded.svo')
+        with DataSynchronizer(
+            'http://127.0.0.1', self.port, USER, PASSWORD, retry_backoff=0.01,
+            large_file_size=1024 * 1024, part_size=2 * 1024 * 1024,
+        ) as synchronizer:
+            synchronizer.upload(src, 'large.svo')
+            with open(os.path.join(self.root, 'large.svo'), 'rb') as f:
+                self.assertEqual(f.read(), content)
+            with open(os.path.join(self.root, 'large.svo' + CHECKSUM_SUFFIX), 'r') as f:
+                self.assertEqual(f.read(), f'{hashlib.sha256(content).hexdigest()}  large.svo\n')
+
+            self.server.truncations = {'/large.svo': 2}
+            synchronizer.download('large.svo', des)
+            with open(des, 'rb') as f:
+                self.assertEqual(f.read(), content)
+            # resumed twice, where the broken downloads stopped, then the checksum
+            self.assertEqual(self.server.num_range_requests, 2)
+            self.assertEqual(self.server.num_downloads, 4)
+
+            # a corrupted file is not kept
+            with open(os.path.join(self.root, 'large.svo'), 'r+b') as f:
+                f.seek(1000)
+                f.write(bytes([content[1000] ^ 1]))
+            with self.assertRaises(ChecksumMismatchError):
+                synchronizer.download('large.svo', des)
+            self.assertFalse(os.path.exists(des))
+
+    def test_stale_remote_file_is_not_appended_to(self):
+        src = os.path.join(self.local, 'render.mp4')
+        content = os.urandom(5 * 1024 * 1024 + 123)
+        self._write(src, content)
+        # an older render of the size of a part, and a first upload that is refused
+        self._write(os.path.join(self.root, 'render.mp4'), os.urandom(2 * 1024 * 1024))
+        self.server.failures = {'/render.mp4': 1}
+        with DataSynchronizer(
+            'http://127.0.0.1', self.port, USER, PASSWORD, retry_backoff=0.01,
+            large_file_size=1024 * 1024, part_size=2 * 1024 * 1024,
+        ) as synchronizer:
+            synchronizer.upload(src, 'render.mp4')
+        with open(os.path.join(self.root, 'render.mp4'), 'rb') as f:
+            self.assertEqual(f.read(), content)
+
+    def test_wrong_password(self):
+        path = os.path.join(self.local, 'a.txt')
+        self._write(path, b'a')
+        with DataSynchronizer('http://127.0.0.1', self.port, USER, 'wrong') as synchronizer:
+            with self.assertRaises(FileServerError) as context:
+                synchronizer.upload(path, 'a.txt')
+            self.assertEqual(context.exception.status, HTTPStatus.UNAUTHORIZED)
+            self.assertFalse(synchronizer.is_exist('a.txt'))
+
+    def test_large_file_peak_memory(self):
+        src = os.path.join(self.local, 'large.bin')
+        with open(src, 'wb') as f:
+            f.truncate(LARGE_FILE_SIZE)
+        des = os.path.join(self.local, 'downloaded.bin')
+
+        result = subprocess.run(
+            [
+                sys.executable, '-c', TRANSFER_SCRIPT.format(user=USER, password=PASSWORD),
+                str(self.port), src, des,
+            ],
+            cwd=BACKEND_DIR,
+            env={**os.environ, 'PYTHONPATH': BACKEND_DIR},
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        peak_increase_kb, upload_elapsed, download_elapsed = result.stdout.decode().split()
+        size_mb = LARGE_FILE_SIZE / 1024 / 1024
+        print(
+            f'{size_mb:.0f} MB: upload {size_mb / float(upload_elapsed):.0f} MB/s, '
+            f'download {size_mb / float(download_elapsed):.0f} MB/s, '
+            f'peak memory +{int(peak_increase_kb) / 1024:.0f} MB',
+        )
+        # a few chunks in flight, not the whole file
+        self.assertLess(int(peak_increase_kb) / 1024, size_mb / 4)
+        self.assertEqual(os.path.getsize(des), LARGE_FILE_SIZE)
+        self.assertEqual(os.path.getsize(os.path.join(self.root, 'large.bin')), LARGE_FILE_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
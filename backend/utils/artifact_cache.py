@@ -0,0 +1,169 @@
+"""
+A host-level cache of the files downloaded from the file server, shared by the task workers
+through the data folder they all mount.
+
+The files are stored once per content (by SHA-256) and hard linked (copied where a link is not
+possible) into the working folders. A remote file is found again by its key (path, ETag or
+Last-Modified, and size, from a HEAD request), so that a file changed on the file server is
+downloaded again. The least recently used files are evicted above a size cap, except those
+still linked into a working folder.
+
+The cached files are shared by every link to them: only files the tasks do not modify in place
+should be cached.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+import typing as t
+import uuid
+
+
+ARTIFACT_CACHE_DIR = os.environ.get('ARTIFACT_CACHE_DIR')
+ARTIFACT_CACHE_MAX_BYTES = int(os.environ.get('ARTIFACT_CACHE_MAX_BYTES', 20 * 1024 ** 3))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _touch(path: str) -> None:
+    # the last use is kept as the access time: the modification time is left alone, as it
+    # identifies the content (e.g. for the video metadata cache)
+    os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+
+
+def link_or_copy(src: str, des: str) -> None:
+    if os.path.lexists(des):
+        os.remove(des)
+    try:
+        os.link(src, des)
+    except OSError:
+        # another file system, or one without hard links
+        shutil.copyfile(src, des)
+
+
+class ArtifactCache:
+
+    def __init__(self, root: str, max_bytes: int = ARTIFACT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, 'objects')
+        self.refs_dir = os.path.join(root, 'refs')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        for folder in [self.objects_dir, self.refs_dir, self.tmp_dir]:
+            os.makedirs(folder, exist_ok=True)
+
+    def _get_ref_path(self, key: str) -> str:
+        return os.path.join(self.refs_dir, hashlib.sha256(key.encode()).hexdigest() + '.json')
+
+    def _get_object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def new_temp_path(self) -> str:
+        """
+        A path to download a file to before `add`, on the file system of the cache
+        """
+        return os.path.join(self.tmp_dir, uuid.uuid4().hex)
+
+    def lookup(self, key: str, size: int) -> t.Optional[str]:
+        """
+        The path of the cached file of a key, None on a miss
+        """
+        try:
+            with open(self._get_ref_path(key), 'r') as f:
+                digest = json.load(f)['digest']
+            object_path = self._get_object_path(digest)
+            if os.path.getsize(object_path) != size:
+                return None
+            _touch(object_path)  # most recently used
+        except (OSError, ValueError, KeyError):
+            return None
+        return object_path
+
+    def link(self, key: str, size: int, des: str) -> bool:
+        """
+        Link the cached file of a key to `des`; False on a miss
+        """
+        object_path = self.lookup(key, size)
+        if object_path is None:
+            return False
+        try:
+            link_or_copy(object_path, des)
+        except FileNotFoundError:  # evicted in the meantime
+            return False
+        return True
+
+    def add(self, key: str, path: str) -> str:
+        """
+        Move a downloaded file (from `new_temp_path`) into the cache under a key; return its path
+        in the cache
+        """
+        digest = hash_file(path)
+        object_path = self._get_object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        # the same content under another key (or from another worker) is stored once
+        if os.path.exists(object_path):
+            os.remove(path)
+            _touch(object_path)
+        else:
+            os.replace(path, object_path)
+
+        tmp_ref_path = self.new_temp_path()
+        with open(tmp_ref_path, 'w') as f:
+            json.dump({'key': key, 'digest': digest}, f)
+        os.replace(tmp_ref_path, self._get_ref_path(key))
+
+        self.evict()
+        return object_path
+
+    def _list_objects(self) -> t.List[t.Tuple[float, int, int, str]]:
+        # (last use, size, number of links, path) of every cached file
+        objects = []
+        for prefix in os.scandir(self.objects_dir):
+            for entry in os.scandir(prefix.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                objects.append((stat.st_atime, stat.st_size, stat.st_nlink, entry.path))
+        return objects
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used files above the size cap, but those still linked into
+        a working folder; return the number of freed bytes
+        """
+        with open(os.path.join(self.root, 'lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            objects = sorted(self._list_objects())
+            total = sum(size for _, size, _, _ in objects)
+            freed = 0
+            for _, size, num_links, path in objects:
+                if total - freed <= self.max_bytes:
+                    break
+                if num_links > 1:
+                    continue
+                os.remove(path)
+                freed += size
+        # the references to removed files are ignored by `lookup` and overwritten by `add`
+        return freed
+
+    def get_size(self) -> int:
+        return sum(size for _, size, _, _ in self._list_objects())
+
+
+def get_default_cache() -> t.Optional[ArtifactCache]:
+    """
+    The cache in `ARTIFACT_CACHE_DIR`, capped at `ARTIFACT_CACHE_MAX_BYTES`; None if not set
+    """
+    if not ARTIFACT_CACHE_DIR:
+        return None
+    return ArtifactCache(ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MAX_BYTES)
@@ -0,0 +1,139 @@
+"""
+A folder of many small files (e.g. the json of every frame written by OpenPose) packed into a
+single tar archive, zstd compressed when `zstandard` is installed and gzip otherwise, with a
+manifest of the files it holds (their path relative to the folder and size).
+"""
+import json
+import os
+import tarfile
+import typing as t
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MANIFEST_VERSION = 1
+ZSTD = 'zstd'
+GZIP = 'gzip'
+ARCHIVE_NAMES = {
+    ZSTD: '.bundle.tar.zst',
+    GZIP: '.bundle.tar.gz',
+}
+MANIFEST_NAME = '.bundle-manifest.json'
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+
+
+def get_default_compression() -> str:
+    return ZSTD if zstandard is not None else GZIP
+
+
+def _check_compression(compression: str) -> None:
+    if compression not in ARCHIVE_NAMES:
+        raise ValueError(
+            f'Unknown compression {compression}, should be one of {list(ARCHIVE_NAMES)}',
+        )
+    if compression == ZSTD and zstandard is None:
+        raise RuntimeError('zstandard is not installed to (de)compress a zstd bundle')
+
+
+def list_files(folder: str) -> t.List[str]:
+    """
+    The paths of the files under a folder relative to it, sorted
+    """
+    paths = []
+    for root, _, file_names in os.walk(folder):
+        for file_name in file_names:
+            paths.append(os.path.relpath(os.path.join(root, file_name), folder))
+    return sorted(paths)
+
+
+def pack_folder(
+    folder: str,
+    archive_path: str,
+    compression: t.Optional[str] = None,
+) -> t.Dict[str, t.Any]:
+    """
+    Pack the files of a folder into an archive; return its manifest
+    """
+    compression = compression or get_default_compression()
+    _check_compression(compression)
+    paths = list_files(folder)
+    with open(archive_path, 'wb') as f:
+        if compression == ZSTD:
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            with compressor.stream_writer(f, closefd=False) as writer:
+                with tarfile.open(fileobj=writer, mode='w|') as tar:
+                    for path in paths:
+                        tar.add(os.path.join(folder, path), arcname=path)
+        else:
+            with tarfile.open(fileobj=f, mode='w:gz', compresslevel=GZIP_LEVEL) as tar:
+                for path in paths:
+                    tar.add(os.path.join(folder, path), arcname=path)
+
+    return {
+        'version': MANIFEST_VERSION,
+        'archive': ARCHIVE_NAMES[compression],
+        'compression': compression,
+        'archive_size': os.path.getsize(archive_path),
+        'files': [
+            {'path': path, 'size': os.path.getsize(os.path.join(folder, path))} for path in paths
+        ],
+    }
+
+
+def _extract(tar: tarfile.TarFile, folder: str) -> None:
+    # refuse absolute paths, links out of the folder and special files where supported
+    if hasattr(tarfile, 'data_filter'):
+        tar.extractall(folder, filter='data')
+    else:
+        tar.extractall(folder)
+
+
+def unpack_folder(archive_path: str, folder: str, compression: str) -> None:
+    """
+    Unpack an archive of `pack_folder` into a folder
+    """
+    _check_compression(compression)
+    os.makedirs(folder, exist_ok=True)
+    with open(archive_path, 'rb') as f:
+        if compression == ZSTD:
+            with zstandard.ZstdDecompressor().stream_reader(f, closefd=False) as reader:
+                with tarfile.open(fileobj=reader, mode='r|') as tar:
+                    _extract(tar, folder)
+        else:
+            with tarfile.open(fileobj=f, mode='r:gz') as tar:
+                _extract(tar, folder)
+
+
+def unbundle_folder(folder: str) -> bool:
+    """
+    Replace the archive and manifest of a folder uploaded as a bundle (e.g. in the store of the
+    file server) by the files it holds, for the consumers that modify them in place; return
+    whether the folder was a bundle
+    """
+    manifest_path = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path, 'r') as f:
+        manifest = check_manifest(json.load(f))
+    archive_path = os.path.join(folder, manifest['archive'])
+    unpack_folder(archive_path, folder, manifest['compression'])
+    # the manifest first: without it the folder is downloaded file by file
+    os.remove(manifest_path)
+    os.remove(archive_path)
+    return True
+
+
+def dump_manifest(manifest: t.Dict[str, t.Any], manifest_path: str) -> None:
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+
+
+def check_manifest(manifest: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f'Unsupported bundle manifest version {manifest.get("version")}')
+    _check_compression(manifest['compression'])
+    return manifest
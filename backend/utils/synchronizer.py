@@ -1,29 +1,220 @@
 import glob
+import hashlib
 import os
+import tempfile
+import time
 import typing as t
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from http import HTTPStatus
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from utils.artifact_cache import ArtifactCache, get_default_cache, hash_file, link_or_copy
+from utils.folder_bundle import (
+    MANIFEST_NAME, check_manifest, dump_manifest, pack_folder, unpack_folder,
+)
+
+
+# connections kept alive to the file server, and bytes per read / write of the streamed files
+SYNC_FILE_SERVER_POOL_SIZE = int(os.environ.get('SYNC_FILE_SERVER_POOL_SIZE', 10))
+SYNC_FILE_SERVER_CHUNK_SIZE = int(os.environ.get('SYNC_FILE_SERVER_CHUNK_SIZE', 1024 * 1024))
+# files of a folder transferred (or sub folders listed) at the same time
+SYNC_FILE_SERVER_WORKERS = int(os.environ.get('SYNC_FILE_SERVER_WORKERS', 8))
+# retries of a request failing to connect or answered by a transient error, after 0.5s, 1s, 2s...
+SYNC_FILE_SERVER_RETRIES = int(os.environ.get('SYNC_FILE_SERVER_RETRIES', 3))
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = [
+    HTTPStatus.REQUEST_TIMEOUT,
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+]
+# files from this size are uploaded in parts (the next ones appended with PATCH, resumed where
+# the file server stopped) and published with a SHA-256 checksum verified by the downloads
+SYNC_FILE_SERVER_LARGE_FILE_SIZE = int(
+    os.environ.get('SYNC_FILE_SERVER_LARGE_FILE_SIZE', 64 * 1024 * 1024),
+)
+SYNC_FILE_SERVER_PART_SIZE = int(os.environ.get('SYNC_FILE_SERVER_PART_SIZE', 256 * 1024 * 1024))
+# the chunks of a large file grow up to 1/256 of it, within this
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+CHECKSUM_SUFFIX = '.sha256'
+SUCCESS_STATUSES = [
+    HTTPStatus.OK, HTTPStatus.CREATED, HTTPStatus.NO_CONTENT, HTTPStatus.PARTIAL_CONTENT,
+]
+
+
+class TransferError(Exception):
+    """
+    A file failing to transfer to or from the file server
+    """
+
+    def __init__(self, message: str, path: str, status: t.Optional[int] = None):
+        super().__init__(message)
+        self.path = path
+        self.status = status
+
+
+class FileServerError(TransferError):
+    """
+    The file server answering a transfer with an error status
+    """
+
+
+class IncompleteTransferError(TransferError):
+    """
+    A transfer still cut short after its retries
+    """
+
+
+class ChecksumMismatchError(TransferError):
+    """
+    A downloaded file differing from the checksum of its upload
+    """
+
+
+class FileChunks:
+    """
+    The content of a file as an iterable of chunks with a length, which requests sends with a
+    Content-Length header (not chunked encoding) without reading the whole file in memory
+    """
+
+    def __init__(
+        self,
+        file: t.BinaryIO,
+        chunk_size: int = SYNC_FILE_SERVER_CHUNK_SIZE,
+        length: t.Optional[int] = None,
+    ):
+        self.file = file
+        self.chunk_size = chunk_size
+        # the rest of the file from its position, or `length` bytes of it
+        self.length = os.fstat(file.fileno()).st_size - file.tell()
+        if length is not None:
+            self.length = min(self.length, length)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> t.Iterator[bytes]:
+        remaining = self.length
+        while remaining > 0:
+            chunk = self.file.read(min(self.chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class TransferResult:
+
+    def __init__(self, src: str, des: str, success: bool, num_bytes: int = 0, error: str = ''):
+        self.src = src
+        self.des = des
+        self.success = success
+        self.num_bytes = num_bytes
+        self.error = error
+
+    def __repr__(self) -> str:
+        status = 'SUCCEED' if self.success else 'FAIL'
+        error = f' ({self.error})' if self.error else ''
+        return f'[{status:<7}] {self.src} -> {self.des}{error}'
+
+
+class TransferReport:
+    """
+    The result of every file of a folder transfer, and the overall throughput
+    """
+
+    def __init__(self, results: t.List[TransferResult], elapsed: float):
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def failed(self) -> t.List[TransferResult]:
+        return [result for result in self.results if not result.success]
+
+    @property
+    def num_bytes(self) -> int:
+        return sum(result.num_bytes for result in self.results)
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes per second
+        """
+        return self.num_bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self) -> str:
+        num_succeeded = len(self.results) - len(self.failed)
+        return (
+            f'{num_succeeded}/{len(self.results)} files, {self.num_bytes / 1024 / 1024:.1f} MB '
+            f'in {self.elapsed:.2f}s ({self.throughput / 1024 / 1024:.1f} MB/s)'
+        )
+
+    def raise_for_failures(self) -> 'TransferReport':
+        failed = self.failed
+        if len(failed) > 0:
+            raise RuntimeError(
+                f'{len(failed)} of {len(self.results)} files failed to transfer: '
+                + ', '.join(repr(result) for result in failed),
+            )
+        return self
 
 
 class DataSynchronizer:
-    def __init__(self, url: str, port: int, user: str, password: str):
+    def __init__(
+        self,
+        url: str,
+        port: int,
+        user: str,
+        password: str,
+        pool_size: int = SYNC_FILE_SERVER_POOL_SIZE,
+        chunk_size: int = SYNC_FILE_SERVER_CHUNK_SIZE,
+        workers: int = SYNC_FILE_SERVER_WORKERS,
+        retries: int = SYNC_FILE_SERVER_RETRIES,
+        retry_backoff: float = RETRY_BACKOFF,
+        cache: t.Optional[ArtifactCache] = None,
+        large_file_size: int = SYNC_FILE_SERVER_LARGE_FILE_SIZE,
+        part_size: int = SYNC_FILE_SERVER_PART_SIZE,
+    ):
         if url[-1] == '/':
             url = url[:-1]
         self.url = url
         self.port = port
         self.user = user
         self.password = password
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.large_file_size = large_file_size
+        self.part_size = part_size
+        # of the `cached` downloads; `ARTIFACT_CACHE_DIR` by default
+        self.cache = cache if cache is not None else get_default_cache()
+
+        # one keep-alive connection pool (and auth) for all the requests to the file server
+        self.session = requests.Session()
+        self.session.auth = (user, password)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, workers))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self) -> 'DataSynchronizer':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def is_exist(self, src, timeout=10):
         try:
             if src.endswith('/'):  # remove the ending '/' if there is
                 src = src[:-1]
-            r = requests.head(
-                f'{self.url}:{self.port}/{src}',
-                auth=(self.user, self.password),
-                timeout=timeout,
-            )
+            r = self.session.head(f'{self.url}:{self.port}/{src}', timeout=timeout)
             if r.status_code == HTTPStatus.NOT_FOUND:
                 return False
             if r.status_code != HTTPStatus.OK:
@@ -33,98 +224,452 @@ class DataSynchronizer:
             print(e)
             return False
 
-    def _put(self, src: str, des: str, timeout=1000000):
+    def _retry(self, send: t.Callable[[], requests.Response]) -> requests.Response:
+        # resend on connection errors and transient statuses, with an exponential backoff
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                r = send()
+            except IncompleteTransferError as e:
+                if last_attempt:
+                    raise
+                print(f'Retry after {e!r}')
+            except requests.RequestException as e:
+                if last_attempt:
+                    url = e.request.url if e.request is not None else ''
+                    raise TransferError(
+                        f'No answer from {url} after {self.retries + 1} attempts: {e!r}', url,
+                    ) from e
+                print(f'Retry after {e!r}')
+            else:
+                if r.status_code not in RETRY_STATUSES or last_attempt:
+                    return r
+                r.close()
+                print(f'Retry after {r.status_code} {r.reason}')
+            time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def _get_url(self, path: str) -> str:
+        return f'{self.url}:{self.port}/{path}'
+
+    def _get_chunk_size(self, size: t.Optional[int]) -> int:
+        # larger reads / writes for larger files
+        if size is None:
+            return self.chunk_size
+        return max(self.chunk_size, min(size // 256, MAX_CHUNK_SIZE))
+
+    def _check_status(self, r: requests.Response, path: str, action: str) -> None:
+        if r.status_code not in SUCCESS_STATUSES:
+            raise FileServerError(
+                f'{action} {path} answered {r.status_code} {r.reason}', path, r.status_code,
+            )
+
+    def _get_remote_size(self, path: str, timeout=10) -> t.Optional[int]:
+        r = self._retry(lambda: self.session.head(self._get_url(path), timeout=timeout))
+        if r.status_code != HTTPStatus.OK:
+            return None
+        return int(r.headers.get('Content-Length', 0))
+
+    def _put_whole(self, src: str, des: str, size: int, timeout=1000000):
         with open(src, 'rb') as f:
-            data = f.read()
-        r = requests.put(
-            f'{self.url}:{self.port}/{des}',
-            data=data,
-            auth=(self.user, self.password),
-            timeout=timeout,
+
+            def send():
+                f.seek(0)
+                return self.session.put(
+                    self._get_url(des),
+                    data=FileChunks(f, self._get_chunk_size(size)),
+                    timeout=timeout,
+                )
+
+            r = self._retry(send)
+        self._check_status(r, des, 'Upload to')
+
+    def _send_part(self, f: t.BinaryIO, des: str, offset: int, size: int, timeout: float):
+        # the first part creates the file, the next ones are appended to it
+        f.seek(offset)
+        data = FileChunks(f, self._get_chunk_size(size), length=self.part_size)
+        if offset == 0:
+            return self.session.put(self._get_url(des), data=data, timeout=timeout)
+        return self.session.patch(
+            self._get_url(des), data=data, headers={'X-Update-Range': 'append'}, timeout=timeout,
         )
-        return r.status_code == HTTPStatus.CREATED
 
-    def _get(self, src: str, des: str, timeout=1000000):
-        r = requests.get(
-            f'{self.url}:{self.port}/{src}',
-            auth=(self.user, self.password),
-            timeout=timeout,
-            stream=True,
+    def _put_parts(self, src: str, des: str, size: int, timeout=1000000):
+        offset = 0
+        # the bytes of this upload the file server acknowledged
+        confirmed = 0
+        attempt = 0
+        with open(src, 'rb') as f:
+            while offset < size:
+                try:
+                    r = self._send_part(f, des, offset, size, timeout)
+                except requests.RequestException as e:
+                    error = repr(e)
+                else:
+                    if r.status_code in SUCCESS_STATUSES:
+                        offset = min(offset + self.part_size, size)
+                        confirmed = offset
+                        attempt = 0
+                        continue
+                    if r.status_code in [HTTPStatus.METHOD_NOT_ALLOWED, HTTPStatus.NOT_IMPLEMENTED]:
+                        print(f'No appending upload on the file server, upload {src} at once')
+                        self._put_whole(src, des, size, timeout)
+                        return
+                    if r.status_code not in RETRY_STATUSES:
+                        self._check_status(r, des, 'Upload to')
+                    error = f'{r.status_code} {r.reason}'
+
+                if attempt == self.retries:
+                    raise IncompleteTransferError(
+                        f'Upload of {src} to {des} stopped at {offset}/{size} bytes: {error}', des,
+                    )
+                print(f'Retry after {error}')
+                time.sleep(self.retry_backoff * 2 ** attempt)
+                attempt += 1
+                # before the first part is acknowledged, the remote file may be an older one
+                if confirmed == 0:
+                    offset = 0
+                    continue
+                # resume where the file server stopped, which may be within the part; a remote
+                # file shorter than the acknowledged parts is not ours anymore
+                remote_size = self._get_remote_size(des)
+                if remote_size is not None and confirmed <= remote_size <= size:
+                    offset = remote_size
+                else:
+                    offset = confirmed = 0
+
+    def _put(self, src: str, des: str, timeout=1000000):
+        size = os.path.getsize(src)
+        if size < self.large_file_size:
+            self._put_whole(src, des, size, timeout)
+            return
+
+        self._put_parts(src, des, size, timeout)
+        remote_size = self._get_remote_size(des)
+        if remote_size != size:
+            raise IncompleteTransferError(
+                f'Upload of {src} to {des} has {remote_size}/{size} bytes', des,
+            )
+        # in the format of sha256sum
+        checksum = f'{hash_file(src)}  {os.path.basename(des)}\n'.encode()
+        r = self._retry(
+            lambda: self.session.put(self._get_url(des + CHECKSUM_SUFFIX), data=checksum),
         )
-        with open(des, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
+        self._check_status(r, des + CHECKSUM_SUFFIX, 'Upload to')
+
+    def _get_checksum(self, src: str) -> t.Optional[str]:
+        r = self._retry(lambda: self.session.get(self._get_url(src + CHECKSUM_SUFFIX)))
+        if r.status_code != HTTPStatus.OK:
+            return None
+        return r.text.split()[0]
 
-        return r.status_code == HTTPStatus.OK
+    def _get(self, src: str, des: str, timeout=1000000):
+        # a broken download is resumed from its last byte with a range request
+        offset = 0
+        size = None
+        sha256 = hashlib.sha256()
+
+        def send():
+            nonlocal offset, size, sha256
+            headers = {'Range': f'bytes={offset}-'} if offset > 0 else {}
+            with self.session.get(
+                self._get_url(src), headers=headers, timeout=timeout, stream=True,
+            ) as r:
+                if r.status_code == HTTPStatus.PARTIAL_CONTENT:
+                    size = int(r.headers['Content-Range'].rsplit('/', 1)[-1])
+                elif r.status_code == HTTPStatus.OK:  # from the start
+                    offset = 0
+                    size = r.headers.get('Content-Length')
+                    size = int(size) if size is not None else None
+                    sha256 = hashlib.sha256()
+                else:
+                    return r
+                with open(des, 'r+b' if offset > 0 else 'wb') as f:
+                    f.seek(offset)
+                    f.truncate()
+                    for chunk in r.iter_content(chunk_size=self._get_chunk_size(size)):
+                        f.write(chunk)
+                        sha256.update(chunk)
+                        offset += len(chunk)
+            if size is not None and offset != size:
+                raise IncompleteTransferError(
+                    f'Download of {src} stopped at {offset}/{size} bytes', src,
+                )
+            return r
+
+        r = self._retry(send)
+        self._check_status(r, src, 'Download of')
+
+        if size is not None and size >= self.large_file_size:
+            checksum = self._get_checksum(src)
+            if checksum is not None and checksum != sha256.hexdigest():
+                os.remove(des)
+                raise ChecksumMismatchError(
+                    f'Download of {src} does not match its SHA-256 {checksum}', src,
+                )
 
     def create_folder(self, des: str, timeout=1000000):
-        _ = requests.request(
-            'MKCOL',
-            f'{self.url}:{self.port}/{des}',
-            auth=(self.user, self.password),
-            timeout=timeout,
-            stream=True,
-        )
+        self._retry(
+            lambda: self.session.request('MKCOL', f'{self.url}:{self.port}/{des}', timeout=timeout),
+        ).close()
 
     def upload(self, src: str, des: str):
-        return self._put(src, des)
+        """
+        Upload a file; raise a `TransferError` on failure
+        """
+        self._put(src, des)
 
-    def download(self, src: str, des: str, create_parent_folder=True):
+    def _get_cached(self, src: str, des: str, timeout=10):
+        # the file is identified by its path, its ETag (or last modification) and size
+        r = self._retry(lambda: self.session.head(self._get_url(src), timeout=timeout))
+        version = r.headers.get('ETag') or r.headers.get('Last-Modified')
+        size = r.headers.get('Content-Length')
+        if r.status_code != HTTPStatus.OK or version is None or size is None:
+            self._get(src, des)
+            return
+        key = f'{self.url}:{self.port}/{src}\n{version}\n{size}'
+        if self.cache.link(key, int(size), des):
+            print(f'[CACHED ] {src} -> {des}')
+            return
+
+        tmp_path = self.cache.new_temp_path()
+        try:
+            self._get(src, tmp_path)
+            # linked before being added, so that it cannot be evicted in the meantime
+            link_or_copy(tmp_path, des)
+            if os.path.getsize(tmp_path) == int(size):  # else changed since the HEAD
+                self.cache.add(key, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def download(self, src: str, des: str, create_parent_folder=True, cached=False):
+        """
+        Download a file; raise a `TransferError` on failure.
+        With `cached`, the file is linked from the cache of the host when it is there (and
+        added to it otherwise); only for files which are not modified in place
+        """
         if create_parent_folder:
             parent_dir = os.path.dirname(des)
             os.makedirs(parent_dir, exist_ok=True)
-        return self._get(src, des)
+        if cached and self.cache is not None:
+            self._get_cached(src, des)
+        else:
+            self._get(src, des)
+
+    def _transfer(
+        self,
+        transfer: t.Callable[[str, str], None],
+        src: str,
+        des: str,
+        local_path: str,
+    ) -> TransferResult:
+        try:
+            transfer(src, des)
+        except Exception as e:
+            return TransferResult(src, des, False, error=repr(e))
+        return TransferResult(src, des, True, num_bytes=os.path.getsize(local_path))
+
+    def _transfer_files(
+        self,
+        transfer: t.Callable[[str, str], None],
+        paths: t.List[t.Tuple[str, str, str]],
+        verbose: bool,
+    ) -> TransferReport:
+        # (src, des, local path) of every file, transferred by a pool of workers
+        start = time.perf_counter()
+        results = [None] * len(paths)
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as executor:
+            futures = {
+                executor.submit(self._transfer, transfer, *path): idx
+                for idx, path in enumerate(paths)
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                if verbose or not result.success:
+                    print(result)
+        report = TransferReport(results, time.perf_counter() - start)
+        print(report)
+        return report
+
+    def _bundle_report(
+        self,
+        manifest: t.Dict[str, t.Any],
+        src_folder: str,
+        des_folder: str,
+        start: float,
+        error: str = '',
+        local_folder: t.Optional[str] = None,
+    ) -> TransferReport:
+        # a result per file of the bundle; a downloaded file is checked against its size
+        results = []
+        for file in manifest['files']:
+            src = os.path.join(src_folder, file['path'])
+            des = os.path.join(des_folder, file['path'])
+            success = error == ''
+            file_error = error
+            if success and local_folder is not None:
+                local_path = os.path.join(local_folder, file['path'])
+                if not os.path.isfile(local_path) or os.path.getsize(local_path) != file['size']:
+                    success, file_error = False, 'missing from the bundle'
+            results.append(
+                TransferResult(src, des, success, file['size'] if success else 0, file_error),
+            )
+        report = TransferReport(results, time.perf_counter() - start)
+        for result in report.failed:
+            print(result)
+        print(f'{report} as a bundle of {manifest["archive_size"] / 1024 / 1024:.1f} MB')
+        return report
+
+    def _upload_bundle(
+        self,
+        src_folder: str,
+        des_folder: str,
+        compression: t.Optional[str],
+    ) -> TransferReport:
+        start = time.perf_counter()
+        # the archive is written next to the folder, on the same disk as the data
+        tmp_parent_dir = os.path.dirname(os.path.normpath(src_folder))
+        with tempfile.TemporaryDirectory(dir=tmp_parent_dir) as tmp_dir:
+            archive_path = os.path.join(tmp_dir, 'archive')
+            manifest = pack_folder(src_folder, archive_path, compression)
+            manifest_path = os.path.join(tmp_dir, MANIFEST_NAME)
+            dump_manifest(manifest, manifest_path)
+            error = ''
+            try:
+                # the manifest last, as it marks the bundle complete
+                self.upload(archive_path, des_folder + manifest['archive'])
+                self.upload(manifest_path, des_folder + MANIFEST_NAME)
+            except Exception as e:
+                error = repr(e)
+        return self._bundle_report(manifest, src_folder, des_folder, start, error)
 
-    def upload_folder(self, src_folder: str, des_folder: str, verbose: bool = False):
+    def _get_manifest(self, src_folder: str) -> t.Optional[t.Dict[str, t.Any]]:
+        manifest_url = f'{self.url}:{self.port}/{src_folder}{MANIFEST_NAME}'
+        r = self._retry(lambda: self.session.get(manifest_url))
+        if r.status_code == HTTPStatus.NOT_FOUND:
+            return None
+        r.raise_for_status()
+        return check_manifest(r.json())
+
+    def _download_bundle(
+        self,
+        src_folder: str,
+        des_folder: str,
+        manifest: t.Dict[str, t.Any],
+    ) -> TransferReport:
+        start = time.perf_counter()
+        parent_dir = os.path.dirname(os.path.normpath(des_folder))
+        os.makedirs(parent_dir, exist_ok=True)
+        error = ''
+        with tempfile.TemporaryDirectory(dir=parent_dir) as tmp_dir:
+            archive_path = os.path.join(tmp_dir, manifest['archive'])
+            try:
+                self._get(src_folder + manifest['archive'], archive_path)
+                unpack_folder(archive_path, des_folder, manifest['compression'])
+            except Exception as e:
+                error = repr(e)
+        return self._bundle_report(
+            manifest, src_folder, des_folder, start, error, local_folder=des_folder,
+        )
+
+    def upload_folder(
+        self,
+        src_folder: str,
+        des_folder: str,
+        verbose: bool = False,
+        bundle: bool = False,
+        compression: t.Optional[str] = None,
+    ) -> TransferReport:
+        """
+        Upload the files of a folder one by one, or with `bundle` as a single archive
+        (`compression` zstd or gzip, zstd if available by default) and its manifest
+        in `des_folder`
+        """
         if not self.is_folder(src_folder):
             raise ValueError(f'{src_folder} does not end with /')
         if not self.is_folder(des_folder):
             raise ValueError(f'{src_folder} does not end with /')
+        if bundle:
+            return self._upload_bundle(src_folder, des_folder, compression)
 
+        paths = []
         file_paths = glob.glob(os.path.join(src_folder, '**/*'), recursive=True)
         for file_path in file_paths:
             if os.path.isdir(file_path):
                 continue
             sub_file_path = file_path.replace(src_folder, '', 1)
             des_file_path = os.path.join(des_folder, sub_file_path)
-            is_success = self.upload(file_path, des_file_path)
-            if verbose:
-                status = 'SUCCEED'
-                if not is_success:
-                    status = 'FAIL'
-                print(f'[{status:<7}] {file_path} -> {des_file_path}')
-
-    def download_folder(self, src_folder: str, des_folder: str, verbose: bool = False):
+            paths.append((file_path, des_file_path, file_path))
+        return self._transfer_files(self.upload, paths, verbose)
+
+    def download_folder(
+        self,
+        src_folder: str,
+        des_folder: str,
+        verbose: bool = False,
+        bundle: bool = False,
+    ) -> TransferReport:
+        """
+        Download the files of a folder one by one, or unpack its archive if it was uploaded as a
+        bundle; `bundle` looks for the archive first, without listing the folder
+        """
         if not self.is_folder(src_folder):
             raise ValueError(f'{src_folder} does not end with /')
         if not self.is_folder(des_folder):
             raise ValueError(f'{src_folder} does not end with /')
+        if bundle:
+            manifest = self._get_manifest(src_folder)
+            if manifest is not None:
+                return self._download_bundle(src_folder, des_folder, manifest)
 
+        paths = []
         file_paths = self.parse_file_in_folder(src_folder)
-
+        if src_folder + MANIFEST_NAME in file_paths:
+            # never the archive and its manifest in place of the files
+            manifest = self._get_manifest(src_folder)
+            if manifest is not None:
+                return self._download_bundle(src_folder, des_folder, manifest)
         for file_path in file_paths:
             sub_file_path = file_path.replace(src_folder, '', 1)
             des_file_path = os.path.join(des_folder, sub_file_path)
-            is_success = self.download(file_path, des_file_path)
-            if verbose:
-                status = 'SUCCEED'
-                if not is_success:
-                    status = 'FAIL'
-                print(f'[{status:<7}] {file_path} -> {des_file_path}')
+            paths.append((file_path, des_file_path, des_file_path))
+        return self._transfer_files(self.download, paths, verbose)
+
+    def _list_folder(self, des_folder: str) -> t.List[t.Tuple[str, bool]]:
+        # (path, is folder) of the content of a folder
+        r = self._retry(lambda: self.session.get(f'{self.url}:{self.port}/{des_folder}?json'))
+        r.raise_for_status()
+        return [
+            (os.path.join(des_folder, path['name']), path['path_type'] == 'Dir')
+            for path in r.json()['paths']
+        ]
 
     def parse_file_in_folder(self, des_folder: str) -> t.List[str]:
-        r = requests.get(
-            f'{self.url}:{self.port}/{des_folder}?json',
-            auth=(self.user, self.password),
-        )
-        path_collection = []
-        paths = r.json()['paths']
-        for path in paths:
-            if path['path_type'] == 'Dir':
-                path_collection += self.parse_file_in_folder(os.path.join(des_folder, path['name']))
-            else:
-                path_collection.append(os.path.join(des_folder, path['name']))
-        return path_collection
+        # the sub folders are listed concurrently, level by level
+        listings = {}
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as executor:
+            pending = {executor.submit(self._list_folder, des_folder): des_folder}
+            while len(pending) > 0:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    folder = pending.pop(future)
+                    listings[folder] = future.result()
+                    for path, is_folder in listings[folder]:
+                        if is_folder:
+                            pending[executor.submit(self._list_folder, path)] = path
+
+        def collect(folder: str) -> t.List[str]:
+            # depth first, in the order of the listings
+            path_collection = []
+            for path, is_folder in listings[folder]:
+                if is_folder:
+                    path_collection += collect(path)
+                else:
+                    path_collection.append(path)
+            return path_collection
+
+        return collect(des_folder)
 
     def is_folder(self, path: str):
         return path[-1] == '/'